@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+AUR 并行构建模块
+多个 makepkg 进程并行构建，构建产物交给单一的安装队列串行安装
+"""
+
+import os
+import glob
+import time
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pacman_db import strip_version
+from stream_runner import run_streaming
+
+
+def read_mem_available_mb():
+    """读取 /proc/meminfo 中的可用内存 (MB)"""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def parse_srcinfo(text):
+    """解析 .SRCINFO，返回 pkgbase、pkgname 列表和依赖"""
+    info = {'pkgbase': '', 'pkgnames': [], 'depends': [], 'makedepends': [], 'checkdepends': []}
+    arch = os.uname().machine
+
+    for line in text.splitlines():
+        if '=' not in line:
+            continue
+        key, value = (part.strip() for part in line.split('=', 1))
+
+        if key == 'pkgbase':
+            info['pkgbase'] = value
+        elif key == 'pkgname':
+            info['pkgnames'].append(value)
+        else:
+            # depends_x86_64 之类的架构相关依赖
+            base, _, suffix = key.partition('_')
+            if base in ('depends', 'makedepends', 'checkdepends') and suffix in ('', arch):
+                info[base].append(strip_version(value))
+
+    return info
+
+
+class AurBuildPool:
+    """AUR 构建池
+
+    jobs       - 同时运行的 makepkg 数量
+    mem_cap_mb - 每个构建的内存上限 (MB)，0 表示不限制；
+                 可用内存低于该值时不会启动新的构建。硬上限通过
+                 systemd-run --user --scope -p MemoryMax= 施加 (按 cgroup 统计实际内存)，
+                 没有 systemd 用户会话时只做启动准入
+    timeouts   - {包名: 超时秒数}，未列出的包使用 timeout
+    durations  - {包名: 构建耗时秒数}，由 build 写入
+    """
+
+    def __init__(self, build_dir=os.path.expanduser("~/.cache/dotfiles/aur"),
+                 jobs=2, mem_cap_mb=0, timeout=3600):
+        self.build_dir = build_dir
+        self.jobs = max(1, jobs)
+        self.mem_cap_mb = mem_cap_mb
+        self.timeout = timeout
+        self.timeouts = {}
+        self.durations = {}
+
+    # ==================== 获取模块 ====================
+    def fetch(self, pkg_name):
+        """下载 PKGBUILD，返回构建目录"""
+        os.makedirs(self.build_dir, exist_ok=True)
+
+        pkg_dir = self.find_pkg_dir(pkg_name)
+        if pkg_dir and os.path.isdir(os.path.join(pkg_dir, ".git")):
+            cmd = ["git", "-C", pkg_dir, "pull", "--ff-only", "-q"]
+        else:
+            cmd = ["paru", "-G", pkg_name]
+
+        result = subprocess.run(cmd, cwd=self.build_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None, result.stderr.strip() or "获取 PKGBUILD 失败"
+
+        pkg_dir = self.find_pkg_dir(pkg_name)
+        if pkg_dir is None:
+            return None, f"未找到 {pkg_name} 的 PKGBUILD"
+        return pkg_dir, ""
+
+    def find_pkg_dir(self, pkg_name):
+        """查找包所在的构建目录 (拆分包的目录名是 pkgbase)"""
+        direct = os.path.join(self.build_dir, pkg_name)
+        if os.path.isfile(os.path.join(direct, "PKGBUILD")):
+            return direct
+
+        for srcinfo in glob.glob(os.path.join(self.build_dir, "*", ".SRCINFO")):
+            with open(srcinfo, 'r', encoding='utf-8') as f:
+                if pkg_name in parse_srcinfo(f.read())['pkgnames']:
+                    return os.path.dirname(srcinfo)
+        return None
+
+    def read_srcinfo(self, pkg_dir):
+        """读取 .SRCINFO，不存在时由 makepkg 生成"""
+        srcinfo = os.path.join(pkg_dir, ".SRCINFO")
+        if os.path.exists(srcinfo):
+            with open(srcinfo, 'r', encoding='utf-8') as f:
+                return parse_srcinfo(f.read())
+
+        result = subprocess.run(["makepkg", "--printsrcinfo"], cwd=pkg_dir,
+                                capture_output=True, text=True)
+        return parse_srcinfo(result.stdout)
+
+    # ==================== 构建模块 ====================
+    def build_env(self, pkg_dir):
+        """构建环境 - 产物输出到 out/，CPU 在并行构建之间平分"""
+        env = os.environ.copy()
+        env["PKGDEST"] = os.path.join(pkg_dir, "out")
+        cores = max(1, (os.cpu_count() or 1) // self.jobs)
+        env.setdefault("MAKEFLAGS", f"-j{cores}")
+        return env
+
+    def build_command(self, cmd):
+        """有内存上限时把构建放进带 MemoryMax 的 systemd 用户 scope"""
+        if not self.mem_cap_mb or not shutil.which("systemd-run"):
+            return cmd
+        runtime_dir = os.environ.get("XDG_RUNTIME_DIR", "")
+        if not runtime_dir or not os.path.exists(os.path.join(runtime_dir, "bus")):
+            return cmd
+        return ["systemd-run", "--user", "--scope", "--quiet", "--collect",
+                "-p", f"MemoryMax={self.mem_cap_mb}M", "--"] + cmd
+
+    def build(self, pkg_name, pkg_dir):
+        """构建单个包 (在工作线程中运行)，返回 (是否成功, 错误信息, 产物列表)"""
+        env = self.build_env(pkg_dir)
+        os.makedirs(env["PKGDEST"], exist_ok=True)
+
+        # 依赖已由安装队列提前装好，这里不再让 makepkg 调用 pacman
+        # 构建日志可能有几十 MB，只保留末尾用于错误报告
+        timeout = self.timeouts.get(pkg_name, self.timeout)
+        start = time.monotonic()
+        result = run_streaming(
+            self.build_command(["makepkg", "--noconfirm", "--nodeps", "--force", "--cleanbuild"]),
+            timeout=timeout, tail_lines=10, shell=False, cwd=pkg_dir, env=env
+        )
+        self.durations[pkg_name] = time.monotonic() - start
+        if result.timed_out:
+            return False, f"构建超时 ({timeout} 秒)", []
+
+        if result.returncode != 0:
+            return False, result.stderr_tail or result.stdout_tail or "构建失败", []
+
+        return True, "", self.artifacts(pkg_name, pkg_dir, env)
+
+    def artifacts(self, pkg_name, pkg_dir, env):
+        """列出构建产物，拆分包只取请求的那一个"""
+        result = subprocess.run(["makepkg", "--packagelist"], cwd=pkg_dir, env=env,
+                                capture_output=True, text=True)
+        files = [path for path in result.stdout.split() if os.path.exists(path)]
+
+        # 文件名格式: 包名-版本-发布号-架构.pkg.tar.zst
+        wanted = [path for path in files
+                  if os.path.basename(path).rsplit('-', 3)[0] == pkg_name]
+        return wanted or files
+
+    def can_start(self):
+        """内存准入 - 可用内存不足时推迟启动新构建"""
+        if not self.mem_cap_mb:
+            return True
+        available = read_mem_available_mb()
+        return available is None or available >= self.mem_cap_mb
+
+    # ==================== 调度模块 ====================
+    def run(self, plan, install, on_event=None, prebuilt=None):
+        """按依赖顺序并行构建
+
+        plan     - {包名: (构建目录, 依赖的其他 AUR 包)}
+        install  - 串行安装回调 install(包名, 产物列表) -> (是否成功, 错误信息)
+        prebuilt - {包名: 产物列表}，这些包跳过构建
+        返回 {包名: (是否成功, 错误信息)}
+        """
+        prebuilt = prebuilt or {}
+        results = {}
+        pending = dict(plan)
+        running = {}
+
+        def notify(message):
+            if on_event:
+                on_event(message)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                # 依赖构建失败的包直接判为失败
+                for name, (_, deps) in list(pending.items()):
+                    failed = [dep for dep in deps if dep in results and not results[dep][0]]
+                    if failed:
+                        results[name] = (False, f"依赖构建失败: {' '.join(failed)}")
+                        del pending[name]
+
+                # 启动依赖已满足的构建，已有构建产物的包直接进入安装
+                progressed = False
+                for name, (pkg_dir, deps) in list(pending.items()):
+                    if any(dep not in results or not results[dep][0] for dep in deps):
+                        continue
+                    if name in prebuilt:
+                        notify(f"使用缓存的构建产物 {name}，安装中")
+                        results[name] = install(name, prebuilt[name])
+                        del pending[name]
+                        progressed = True
+                        continue
+                    if len(running) >= self.jobs or (running and not self.can_start()):
+                        continue
+                    notify(f"开始构建 {name}")
+                    running[executor.submit(self.build, name, pkg_dir)] = name
+                    del pending[name]
+
+                if not running and progressed:
+                    continue
+                if not running:
+                    # 剩余的包存在循环依赖
+                    for name in pending:
+                        results[name] = (False, "AUR 依赖无法排序 (循环依赖)")
+                    break
+
+                done, _ = wait(running, timeout=5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    ok, error_msg, files = future.result()
+                    if not ok:
+                        results[name] = (False, error_msg)
+                        continue
+
+                    # 安装阶段在调度线程中串行执行，pacman 锁不会被争用
+                    notify(f"构建完成 {name}，安装中")
+                    results[name] = install(name, files)
+
+        return results
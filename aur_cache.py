@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+AUR 二进制缓存模块
+按 PKGBUILD、源码校验和与 makepkg.conf 的哈希保存构建产物，
+缓存目录同时是一个本地 pacman 仓库，可以放在共享挂载点上供多台机器使用:
+
+    [dotfiles-aur]
+    SigLevel = Optional TrustAll
+    Server = file:///path/to/cache
+
+索引和仓库数据库的读-改-写在 index.lock 的 flock 下进行，多台机器同时写入不会丢失条目
+"""
+
+import os
+import glob
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import subprocess
+import contextlib
+
+# .SRCINFO 中参与哈希的字段
+CHECKSUM_KEYS = ('source', 'md5sums', 'sha1sums', 'sha224sums', 'sha256sums',
+                 'sha384sums', 'sha512sums', 'b2sums', 'cksums')
+
+
+class BinaryPackageCache:
+    """内容寻址的 AUR 构建产物缓存，按大小进行 LRU 淘汰"""
+
+    def __init__(self, cache_dir=os.path.expanduser("~/.cache/dotfiles/aur-bincache"),
+                 max_size_mb=4096, repo_name="dotfiles-aur"):
+        self.cache_dir = cache_dir
+        self.max_size = max_size_mb * 1024 * 1024
+        self.repo_db = os.path.join(cache_dir, f"{repo_name}.db.tar.gz")
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.index = {}
+        self.hits = []
+        self.misses = []
+        self.load_index()
+
+    # ==================== 索引模块 ====================
+    def load_index(self):
+        """读取缓存索引"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def save_index(self):
+        """原子写入缓存索引"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_file, self.index_file)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """独占缓存目录: 重新读取索引，正常退出时写回"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, "index.lock"), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.load_index()
+            yield
+            self.save_index()
+
+    # ==================== 哈希模块 ====================
+    def makepkg_conf_files(self):
+        """影响构建结果的 makepkg 配置文件"""
+        files = ["/etc/makepkg.conf"]
+        files += sorted(glob.glob("/etc/makepkg.conf.d/*.conf"))
+        files.append(os.path.expanduser("~/.makepkg.conf"))
+        return [path for path in files if os.path.isfile(path)]
+
+    def build_key(self, pkg_dir):
+        """计算构建键: PKGBUILD + 源码校验和 + makepkg.conf"""
+        digest = hashlib.sha256()
+
+        with open(os.path.join(pkg_dir, "PKGBUILD"), 'rb') as f:
+            digest.update(f.read())
+
+        srcinfo = os.path.join(pkg_dir, ".SRCINFO")
+        if os.path.exists(srcinfo):
+            with open(srcinfo, 'r', encoding='utf-8') as f:
+                for line in f:
+                    key = line.split('=', 1)[0].strip().split('_', 1)[0]
+                    if key in CHECKSUM_KEYS:
+                        digest.update(line.strip().encode())
+
+        for path in self.makepkg_conf_files():
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+
+        return digest.hexdigest()
+
+    # ==================== 查询与存储模块 ====================
+    def lookup(self, pkg_name, key):
+        """查找缓存，命中时返回产物路径列表"""
+        with self.locked():
+            entry = self.index.get(key)
+            files = [os.path.join(self.cache_dir, name) for name in entry['files']] if entry else []
+
+            if not files or not all(os.path.exists(path) for path in files):
+                self.misses.append(pkg_name)
+                return None
+
+            entry['atime'] = time.time()
+        self.hits.append(pkg_name)
+        return files
+
+    def store(self, pkg_name, key, files):
+        """保存构建产物并加入本地仓库"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            names = []
+            for path in files:
+                shutil.copy2(path, self.cache_dir)
+                names.append(os.path.basename(path))
+        except OSError:
+            return False
+
+        with self.locked():
+            self.repo_add([os.path.join(self.cache_dir, name) for name in names])
+            self.index[key] = {
+                'pkgname': pkg_name,
+                'files': names,
+                'size': sum(os.path.getsize(os.path.join(self.cache_dir, name)) for name in names),
+                'atime': time.time(),
+            }
+            self.evict()
+        return True
+
+    def repo_add(self, paths):
+        """更新本地仓库数据库"""
+        if shutil.which("repo-add"):
+            subprocess.run(["repo-add", "-q", self.repo_db] + paths, capture_output=True)
+
+    def repo_remove(self, pkg_names):
+        """从本地仓库数据库移除"""
+        if shutil.which("repo-remove") and os.path.exists(self.repo_db):
+            subprocess.run(["repo-remove", "-q", self.repo_db] + pkg_names, capture_output=True)
+
+    def total_size(self):
+        """缓存占用 (字节)"""
+        return sum(entry['size'] for entry in self.index.values())
+
+    def evict(self):
+        """超出上限时淘汰最久未使用的条目"""
+        while self.index and self.total_size() > self.max_size:
+            key = min(self.index, key=lambda k: self.index[k]['atime'])
+            entry = self.index.pop(key)
+
+            # 同一文件可能被更新的构建键引用，只删除不再使用的文件
+            in_use = {name for other in self.index.values() for name in other['files']}
+            for name in entry['files']:
+                if name not in in_use:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+            if not any(other['pkgname'] == entry['pkgname'] for other in self.index.values()):
+                self.repo_remove([entry['pkgname']])
+
+    def summary(self):
+        """命中统计"""
+        return {
+            'hits': list(self.hits),
+            'misses': list(self.misses),
+            'size_mb': self.total_size() / 1024 / 1024,
+        }
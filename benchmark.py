@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+安装器性能基准测试
+在 PATH 前面放置伪造的 pacman/paru/systemctl/grub-mkconfig (可配置延迟和失败率)，
+用数千条合成配置端到端驱动 PackageInstaller、ServiceConfigurator 和 GrubThemeInstaller，
+不触碰真实的包管理器；mirror-rank 场景对注入了延迟和限速的本地 HTTP 镜像替身测速并检查排序。
+
+每个场景在独立的解释器中运行，报告每条目开销、每条目进程数和峰值 RSS，
+并可保存为基线，之后的运行与基线比较以发现性能回退:
+
+    python benchmark.py --entries 2000 --save-baseline
+    python benchmark.py --entries 2000            # 与基线比较，回退时退出码为 1
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import contextlib
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 导入日志模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from log import info, success, warning, error, section_header
+
+BASELINE_FILE = os.path.expanduser("~/.cache/dotfiles/bench_baseline.json")
+
+# 所有伪造命令共用的前导: 记录调用、模拟延迟和随机失败
+SHIM_PRELUDE = """#!/bin/bash
+echo "${0##*/} $*" >> "$BENCH_CALLS"
+[ "$BENCH_LATENCY" != "0" ] && sleep "$BENCH_LATENCY"
+fail() { [ "$BENCH_FAIL_PERMILLE" -gt 0 ] && [ $((RANDOM % 1000)) -lt "$BENCH_FAIL_PERMILLE" ]; }
+"""
+
+# pacman/paru: -Q 查询伪造的本地数据库，-S 安装时写入本地数据库
+FAKE_PACKAGE_MANAGER = SHIM_PRELUDE + """
+op="$1"; shift
+targets=()
+for arg in "$@"; do
+    case "$arg" in -*) ;; *) targets+=("$arg") ;; esac
+done
+case "$op" in
+    -Q)
+        for name in "${targets[@]}"; do
+            [ -d "$FAKE_DB/local/$name-1.0-1" ] || exit 1
+        done
+        ;;
+    -S|-Sy)
+        fail && { echo "error: failed to commit transaction (fake)" >&2; exit 1; }
+        for name in "${targets[@]}"; do
+            mkdir -p "$FAKE_DB/local/$name-1.0-1"
+            printf '%%NAME%%\\n%s\\n\\n%%VERSION%%\\n1.0-1\\n\\n' "$name" > "$FAKE_DB/local/$name-1.0-1/desc"
+        done
+        ;;
+esac
+exit 0
+"""
+
+FAKE_SYSTEMCTL = SHIM_PRELUDE + """
+fail && { echo "Failed to enable unit (fake)" >&2; exit 1; }
+exit 0
+"""
+
+# grub-mkconfig -o <文件>
+FAKE_GRUB_MKCONFIG = SHIM_PRELUDE + """
+fail && { echo "grub-mkconfig: error (fake)" >&2; exit 1; }
+exit 0
+"""
+
+FAKE_SUDO = """#!/bin/bash
+exec "$@"
+"""
+
+SHIMS = {
+    "pacman": FAKE_PACKAGE_MANAGER,
+    "paru": FAKE_PACKAGE_MANAGER,
+    "systemctl": FAKE_SYSTEMCTL,
+    "grub-mkconfig": FAKE_GRUB_MKCONFIG,
+    # 主机上若存在这两个命令，GrubThemeInstaller 会优先使用，同样替换掉
+    "update-grub": FAKE_GRUB_MKCONFIG,
+    "grub2-mkconfig": FAKE_GRUB_MKCONFIG,
+    "sudo": FAKE_SUDO,
+}
+
+SCENARIOS = ("packages", "packages-batch", "packages-rerun", "rerun-noindex",
+             "services", "services-persistent", "services-coalesce", "grub", "mirror-rank")
+
+# 本地镜像替身: (名称, 首字节延迟秒, 限速字节/秒)，限速为 0 表示不限速；
+# dead 不监听端口，hang 的延迟超过测速预算
+MIRROR_STAND_INS = [
+    ("hang", 5.0, 0),
+    ("throttled", 0.005, 1024 * 1024),
+    ("dead", 0, 0),
+    ("slow-start", 0.15, 0),
+    ("fast", 0.005, 0),
+]
+MIRROR_EXPECTED_ORDER = ["fast", "slow-start", "throttled", "hang", "dead"]
+MIRROR_RANK_BUDGET = 0.5
+MIRROR_DB_SIZE = 256 * 1024
+
+
+class SpawnCounter:
+    """统计 Python 层创建的子进程数"""
+
+    def __init__(self):
+        self.count = 0
+        self.original = subprocess.Popen._execute_child
+
+    def __enter__(self):
+        counter = self
+        original = self.original
+
+        def execute_child(popen, *args, **kwargs):
+            counter.count += 1
+            return original(popen, *args, **kwargs)
+
+        subprocess.Popen._execute_child = execute_child
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.Popen._execute_child = self.original
+
+
+class MirrorStandIn:
+    """本地 HTTP 镜像替身，按配置注入首字节延迟并限速返回伪造的 core.db"""
+
+    def __init__(self, delay, rate, size=MIRROR_DB_SIZE):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(stand_in.delay)
+                self.send_response(200)
+                self.send_header("Content-Length", str(stand_in.size))
+                self.end_headers()
+                chunk = b"\0" * 16384
+                for _ in range(stand_in.size // len(chunk)):
+                    self.wfile.write(chunk)
+                    if stand_in.rate:
+                        time.sleep(len(chunk) / stand_in.rate)
+
+            def log_message(self, *args):
+                pass
+
+        self.delay = delay
+        self.rate = rate
+        self.size = size
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/archlinux"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        """停止服务"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeSystem:
+    """伪造的系统: 命令目录、本地数据库和合成配置"""
+
+    def __init__(self, entries=2000, latency=0.0, fail_rate=0.0):
+        self.entries = entries
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.work_dir = None
+        self.db_dir = None
+        self.calls_file = None
+
+    def create(self):
+        """生成命令目录和空的本地数据库，并修改环境变量"""
+        self.work_dir = tempfile.mkdtemp(prefix="dotfiles-bench-")
+        bin_dir = os.path.join(self.work_dir, "bin")
+        self.db_dir = os.path.join(self.work_dir, "db")
+        os.makedirs(bin_dir)
+        os.makedirs(os.path.join(self.db_dir, "local"))
+
+        for name, script in SHIMS.items():
+            path = os.path.join(bin_dir, name)
+            with open(path, 'w') as f:
+                f.write(script)
+            os.chmod(path, 0o755)
+
+        self.calls_file = os.path.join(self.work_dir, "calls.log")
+        open(self.calls_file, 'w').close()
+
+        os.environ.update({
+            "FAKE_DB": self.db_dir,
+            "BENCH_CALLS": self.calls_file,
+            "BENCH_LATENCY": f"{self.latency:g}",
+            "BENCH_FAIL_PERMILLE": str(int(self.fail_rate * 1000)),
+            "PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        })
+
+    def cleanup(self):
+        """清理临时文件"""
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def path(self, *parts):
+        """工作目录下的路径"""
+        return os.path.join(self.work_dir, *parts)
+
+    def shim_calls(self):
+        """伪造命令被调用的次数"""
+        with open(self.calls_file, 'r') as f:
+            return sum(1 for _ in f)
+
+    def reset_calls(self):
+        """清空调用记录"""
+        open(self.calls_file, 'w').close()
+
+    # ==================== 合成配置 ====================
+    def write_pkgs_conf(self):
+        """每 20 个包一个部分"""
+        config_file = self.path("pkgs.conf")
+        with open(config_file, 'w', encoding='utf-8') as conf:
+            for index in range(self.entries):
+                if index % 20 == 0:
+                    conf.write(f"[Section {index // 20}]\n")
+                conf.write(f"bench-pkg{index}    # benchmark package\n")
+        return config_file
+
+    def install_all(self):
+        """直接写入本地数据库，模拟全部已安装"""
+        for index in range(self.entries):
+            entry = os.path.join(self.db_dir, "local", f"bench-pkg{index}-1.0-1")
+            os.makedirs(entry, exist_ok=True)
+            with open(os.path.join(entry, "desc"), 'w') as f:
+                f.write(f"%NAME%\nbench-pkg{index}\n\n%VERSION%\n1.0-1\n\n")
+
+    def write_actions_conf(self):
+        """每 50 条命令一个部分，前一半启用系统服务，后一半重启用户服务"""
+        config_file = self.path("actions.conf")
+        with open(config_file, 'w', encoding='utf-8') as conf:
+            for index in range(self.entries):
+                if index % 50 == 0:
+                    conf.write(f"[服务 {index // 50}]\n")
+                if index % 50 >= 25:
+                    conf.write(f"systemctl --user restart bench{index} # 重启 bench{index}\n")
+                else:
+                    conf.write(f"sudo systemctl enable bench{index}.service # 启用 bench{index}\n")
+        return config_file
+
+    def write_grub_theme(self):
+        """合成主题目录和 /etc/default/grub"""
+        origin = self.path("theme")
+        os.makedirs(os.path.join(origin, "icons"))
+        for index in range(self.entries):
+            subdir = "icons" if index % 2 else ""
+            with open(os.path.join(origin, subdir, f"item{index}.png"), 'wb') as f:
+                f.write(os.urandom(256))
+        with open(os.path.join(origin, "theme.txt"), 'w') as f:
+            f.write('title-text: ""\n')
+
+        grub_config = self.path("default-grub")
+        with open(grub_config, 'w') as f:
+            f.write('GRUB_TIMEOUT=5\nGRUB_THEME="/old/theme.txt"\nGRUB_CMDLINE_LINUX=""\n')
+        return origin, grub_config
+
+
+class InstallerBenchmark:
+    """在当前解释器中运行单个场景"""
+
+    def __init__(self, system):
+        self.system = system
+
+    def new_installer(self, use_index=True):
+        """创建指向伪造系统的 PackageInstaller"""
+        from pkg_installer import PackageInstaller
+        from duration_history import DurationHistory
+
+        installer = PackageInstaller()
+        installer.db_path = self.system.db_dir
+        installer.journal_file = self.system.path("journal.jsonl")
+        installer.run_as_root = True
+        installer.history = DurationHistory(path=self.system.path("history.json"))
+        if use_index:
+            installer.load_package_index()
+        return installer
+
+    def bench_packages(self, batch=False):
+        """全新安装全部包"""
+        config_file = self.system.write_pkgs_conf()
+        installer = self.new_installer()
+        installer.batch_mode = batch
+        installer.pkginstall(config_file)
+        return self.system.entries
+
+    def bench_rerun(self, use_index=True):
+        """全部已安装时的重复运行"""
+        config_file = self.system.write_pkgs_conf()
+        self.system.install_all()
+        installer = self.new_installer(use_index)
+        installer.journal_file = self.system.path(f"journal-{use_index}.jsonl")
+        installer.pkginstall(config_file)
+        return self.system.entries
+
+    def bench_services(self, persistent=False, coalesce=False):
+        """执行全部服务命令"""
+        from setup import ServiceConfigurator
+
+        configurator = ServiceConfigurator(self.system.write_actions_conf())
+        configurator.state_file = self.system.path("actions_state.json")
+        configurator.persistent = persistent
+        configurator.coalesce = coalesce
+        configurator.parse_config()
+        configurator.execute_all()
+        return self.system.entries
+
+    def bench_grub(self):
+        """复制主题文件并更新 GRUB 配置"""
+        from grub_setup import GrubThemeInstaller
+
+        origin, grub_config = self.system.write_grub_theme()
+        installer = GrubThemeInstaller()
+        installer.config.update({
+            'origin_name': origin,
+            'theme_dir': self.system.path("themes"),
+            'grub_config': grub_config,
+        })
+        for step in (installer.check_theme_files, installer.create_theme_directory,
+                     installer.copy_theme_files, installer.backup_grub_config,
+                     installer.update_grub_config, installer.update_grub):
+            step()
+        return self.system.entries + 1
+
+    def bench_mirror_rank(self):
+        """对本地镜像替身测速，检查排序和时间预算"""
+        from mirror_rank import rank_mirrors
+
+        stand_ins, urls = [], {}
+        try:
+            for name, delay, rate in MIRROR_STAND_INS:
+                if name == "dead":
+                    # 先占用端口再关闭，得到一个拒绝连接的地址
+                    stand_in = MirrorStandIn(0, 0)
+                    stand_in.close()
+                else:
+                    stand_in = MirrorStandIn(delay, rate)
+                    stand_ins.append(stand_in)
+                urls[stand_in.url] = name
+
+            start = time.monotonic()
+            results = rank_mirrors(list(urls), budget=MIRROR_RANK_BUDGET)
+            elapsed = time.monotonic() - start
+        finally:
+            for stand_in in stand_ins:
+                stand_in.close()
+
+        order = [urls[result.url] for result in results]
+        if order != MIRROR_EXPECTED_ORDER:
+            raise RuntimeError(f"镜像排序错误: {order}")
+        if elapsed > MIRROR_RANK_BUDGET + 0.3:
+            raise RuntimeError(f"测速超出时间预算: {elapsed:.2f}s")
+        return len(results)
+
+    def run(self, scenario):
+        """运行场景，返回度量结果"""
+        runners = {
+            "packages": lambda: self.bench_packages(batch=False),
+            "packages-batch": lambda: self.bench_packages(batch=True),
+            "packages-rerun": lambda: self.bench_rerun(use_index=True),
+            "rerun-noindex": lambda: self.bench_rerun(use_index=False),
+            "services": lambda: self.bench_services(persistent=False),
+            "services-persistent": lambda: self.bench_services(persistent=True),
+            "services-coalesce": lambda: self.bench_services(coalesce=True),
+            "grub": self.bench_grub,
+            "mirror-rank": self.bench_mirror_rank,
+        }
+
+        self.system.reset_calls()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                SpawnCounter() as spawns:
+            start = time.perf_counter()
+            entries = runners[scenario]()
+            elapsed = time.perf_counter() - start
+
+        calls = self.system.shim_calls()
+        overhead = max(0.0, elapsed - calls * self.system.latency)
+        return {
+            "entries": entries,
+            "latency": self.system.latency,
+            "fail_rate": self.system.fail_rate,
+            "elapsed": round(elapsed, 4),
+            "overhead_ms": round(overhead / entries * 1000, 4),
+            "forks_per_entry": round(spawns.count / entries, 4),
+            "calls_per_entry": round(calls / entries, 4),
+            # Linux 下 ru_maxrss 单位为 KiB
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+class BenchmarkSuite:
+    """为每个场景启动独立的解释器，汇总结果并与基线比较"""
+
+    def __init__(self, args):
+        self.args = args
+
+    def run_scenario(self, scenario):
+        """在子进程中运行场景，峰值 RSS 不受其他场景影响"""
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", scenario,
+               "--entries", str(self.args.entries), "--latency", str(self.args.latency),
+               "--fail-rate", str(self.args.fail_rate)]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            error(f"场景 {scenario} 失败: {result.stderr.strip()[-500:]}")
+            return None
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def load_baseline(self):
+        """读取基线"""
+        try:
+            with open(self.args.baseline, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_baseline(self, results):
+        """原子写入基线"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.args.baseline)), exist_ok=True)
+        tmp_file = self.args.baseline + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        os.replace(tmp_file, self.args.baseline)
+        success(f"基线已保存: {self.args.baseline}")
+
+    def regressions(self, current, base):
+        """与基线比较，返回回退说明列表"""
+        tolerance = 1 + self.args.tolerance
+        found = []
+        # 开销的绝对差异小于 0.05 毫秒时视为噪声
+        if (current["overhead_ms"] > base["overhead_ms"] * tolerance
+                and current["overhead_ms"] - base["overhead_ms"] > 0.05):
+            found.append(f"开销 {base['overhead_ms']:.3f} -> {current['overhead_ms']:.3f} 毫秒/条目")
+        if current["forks_per_entry"] > base["forks_per_entry"] + 0.01:
+            found.append(f"进程数 {base['forks_per_entry']:.2f} -> {current['forks_per_entry']:.2f} /条目")
+        if current["peak_rss_mb"] > base["peak_rss_mb"] * tolerance:
+            found.append(f"峰值 RSS {base['peak_rss_mb']:.1f} -> {current['peak_rss_mb']:.1f} MiB")
+        return found
+
+    def report(self, scenario, result):
+        """输出单个场景的结果"""
+        info(f"{scenario:<20} {result['overhead_ms']:>9.3f} 毫秒/条目  "
+             f"{result['forks_per_entry']:>5.2f} 进程/条目  "
+             f"{result['calls_per_entry']:>5.2f} 调用/条目  "
+             f"峰值 RSS {result['peak_rss_mb']:>6.1f} MiB  "
+             f"(共 {result['elapsed']:.2f} 秒)")
+
+    def run(self):
+        """运行全部场景，返回是否没有回退"""
+        section_header(f"基准测试 ({self.args.entries} 条目，延迟 {self.args.latency * 1000:g} 毫秒，"
+                       f"失败率 {self.args.fail_rate:g})")
+
+        baseline = self.load_baseline()
+        results = {}
+        regressed = False
+
+        for scenario in self.args.scenario or SCENARIOS:
+            result = self.run_scenario(scenario)
+            if result is None:
+                regressed = True
+                continue
+            results[scenario] = result
+            self.report(scenario, result)
+
+            base = baseline.get(scenario)
+            if base is None or self.args.save_baseline:
+                continue
+            if (base["entries"], base["latency"], base["fail_rate"]) != \
+                    (result["entries"], result["latency"], result["fail_rate"]):
+                warning(f"{scenario}: 基线的条目数/延迟/失败率不同，跳过比较")
+                continue
+            for message in self.regressions(result, base):
+                error(f"{scenario}: 性能回退 - {message}")
+                regressed = True
+
+        if "packages-rerun" in results and "rerun-noindex" in results:
+            speedup = results["rerun-noindex"]["elapsed"] / max(results["packages-rerun"]["elapsed"], 1e-9)
+            info(f"已安装包索引相对逐包 pacman -Q 的加速: {speedup:.1f}x")
+
+        if self.args.save_baseline:
+            self.save_baseline(dict(baseline, **results))
+        elif not baseline:
+            info("没有基线，使用 --save-baseline 保存本次结果")
+        elif not regressed:
+            success("没有发现性能回退")
+        return not regressed
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="安装器性能基准测试")
+    parser.add_argument("--entries", type=int, default=2000, help="每个场景的条目数")
+    parser.add_argument("--latency", type=float, default=0.0, metavar="SEC",
+                        help="伪造命令每次调用的延迟 (秒)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, metavar="RATE",
+                        help="伪造命令的失败概率 (0-1)")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="只运行指定场景 (可重复)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="允许的相对波动，超过视为回退")
+    parser.add_argument("--worker", choices=SCENARIOS, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    if args.worker:
+        system = FakeSystem(args.entries, args.latency, args.fail_rate)
+        system.create()
+        try:
+            result = InstallerBenchmark(system).run(args.worker)
+        finally:
+            system.cleanup()
+        print(json.dumps(result))
+        return
+
+    if not BenchmarkSuite(args).run():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+命令合并模块
+识别几类可以安全合并的命令，把相邻的同类命令合并为一次调用:
+
+    sudo systemctl enable a.service        sudo systemctl enable a.service b.service
+    sudo systemctl enable b.service   ->
+    sudo systemctl enable x.service        sudo systemctl enable --now x.service
+    sudo systemctl start x.service    ->
+    sudo cp -r a b /etc/                   sudo cp -r a b c /etc/
+    sudo cp -r c /etc/                ->   (目标目录相同)
+    fish -c "fisher install a"             fish -c 'fisher install a b'
+    fish -c "fisher install b"        ->
+
+含管道、重定向、命令替换、通配符或 $HOME 以外的变量的命令不参与合并:
+合并后的参数会被重新引用，变量不再展开；$HOME 由 setup.py 在执行前按文本替换，不受影响
+"""
+
+import re
+import glob
+import shlex
+
+from shell_worker import split_fish_command
+
+# 出现这些字符的命令不是单纯的一次调用；$HOME 以外的变量重新引用后不会展开
+SHELL_SYNTAX_RE = re.compile(r'[|&;<>`]|\$(?!HOME\b)')
+
+# 参数为单元列表、可以合并的 systemctl 动作
+SYSTEMCTL_VERBS = {"enable", "disable", "start", "stop", "restart", "mask", "unmask"}
+
+
+def parse_command(command):
+    """解析为 (类别键, 动作, 选项, 参数列表)，不可合并时返回 None"""
+    fish_command = split_fish_command(command)
+    if fish_command is not None:
+        if SHELL_SYNTAX_RE.search(fish_command):
+            return None
+        try:
+            tokens = shlex.split(fish_command)
+        except ValueError:
+            return None
+        if any(glob.has_magic(token) for token in tokens):
+            return None
+        if len(tokens) > 2 and tokens[:2] == ["fisher", "install"]:
+            return ("fisher",), "install", (), tokens[2:]
+        return None
+
+    if SHELL_SYNTAX_RE.search(command):
+        return None
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        return None
+    if any(glob.has_magic(token) for token in tokens):
+        return None
+
+    sudo = bool(tokens) and tokens[0] == "sudo"
+    if sudo:
+        tokens = tokens[1:]
+    if not tokens:
+        return None
+
+    if tokens[0] == "systemctl":
+        # systemctl [--user ...] 动作 [--now ...] 单元...
+        position = 1
+        while position < len(tokens) and tokens[position].startswith('-'):
+            position += 1
+        if position >= len(tokens) or tokens[position] not in SYSTEMCTL_VERBS:
+            return None
+        global_flags = tuple(tokens[1:position])
+        rest = tokens[position + 1:]
+        options = tuple(token for token in rest if token.startswith('-'))
+        units = [token for token in rest if not token.startswith('-')]
+        if not units:
+            return None
+        return ("systemctl", sudo, global_flags), tokens[position], options, units
+
+    if tokens[0] == "cp":
+        options = tuple(token for token in tokens[1:] if token.startswith('-'))
+        paths = [token for token in tokens[1:] if not token.startswith('-')]
+        # 只合并复制到同一目录 (以 / 结尾) 的命令
+        if len(paths) < 2 or not paths[-1].endswith('/'):
+            return None
+        return ("cp", sudo, options, paths[-1]), "cp", options, paths[:-1]
+
+    return None
+
+
+def merge_parsed(left, right):
+    """合并两条已解析的命令，不能合并时返回 None"""
+    if left[0] != right[0]:
+        return None
+    key, verb, options, args = left
+    _, other_verb, other_options, other_args = right
+
+    if verb == other_verb and options == other_options:
+        return key, verb, options, args + [arg for arg in other_args if arg not in args]
+
+    # enable 后紧跟 start 同一组单元，等价于 enable --now
+    if key[0] == "systemctl" and verb == "enable" and other_verb == "start" \
+            and not other_options and set(options) <= {"--now"} and args == other_args:
+        return key, "enable", ("--now",), args
+    return None
+
+
+def render(parsed):
+    """把解析结果还原为命令"""
+    key, verb, options, args = parsed
+    if key[0] == "fisher":
+        return "fish -c " + shlex.quote(shlex.join(["fisher", "install"] + args))
+
+    tokens = ["sudo"] if key[1] else []
+    if key[0] == "systemctl":
+        tokens += ["systemctl", *key[2], verb, *options, *args]
+    else:
+        tokens += ["cp", *options, *args, key[3]]
+    return shlex.join(tokens)
+
+
+def merge_commands(commands):
+    """把一组命令合并为一条，无法整体合并时返回 None"""
+    if len(commands) < 2:
+        return None
+    merged = parse_command(commands[0])
+    for command in commands[1:]:
+        parsed = parse_command(command)
+        if merged is None or parsed is None:
+            return None
+        merged = merge_parsed(merged, parsed)
+    return render(merged) if merged is not None else None
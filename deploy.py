@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+增量部署模块
+遍历一次源目录，与缓存的清单比较大小、修改时间和内容哈希，只复制变化的文件；
+清单中存在而源目录已删除的文件会从目标目录移除 (目标文件被手动修改过时保留)。
+
+复制优先使用 reflink (FICLONE)，其次 copy_file_range，最后普通读写。
+
+LinkFarm 是类似 stow 的链接模式: 目标中不存在的目录整体链接到源目录，
+已存在的目录逐层拆分，只为其中的文件建立链接；冲突在修改任何文件之前检查
+"""
+
+import os
+import stat
+import time
+import json
+import fcntl
+import errno
+import shutil
+import fnmatch
+import hashlib
+import threading
+from dataclasses import dataclass, field
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+MANIFEST_DIR = os.path.expanduser("~/.cache/dotfiles/deploy")
+
+
+def hash_file(path):
+    """文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_tree(root, exclude=()):
+    """遍历目录，返回 {相对路径: os.stat_result}，符号链接不跟随；
+    exclude 为 fnmatch 模式，相对路径匹配的文件或目录 (含其内容) 跳过"""
+    entries = {}
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as iterator:
+                for entry in iterator:
+                    if exclude:
+                        relpath = os.path.relpath(entry.path, root)
+                        if any(fnmatch.fnmatch(relpath, pattern) for pattern in exclude):
+                            continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        entries[os.path.relpath(entry.path, root)] = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+    return entries
+
+
+def copy_data(src, dst):
+    """复制文件内容，返回使用的方式: reflink / copy_file_range / copy"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return "reflink"
+        except OSError:
+            pass
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                size = os.fstat(fsrc.fileno()).st_size
+                copied = 0
+                while copied < size:
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+                if copied == size:
+                    return "copy_file_range"
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        return "copy"
+
+
+def install_copy(src, dst, st):
+    """写入临时文件后原子替换 dst，保留权限和修改时间；返回使用的复制方式"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.deploy-tmp")
+
+    try:
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(src), tmp)
+            method = "symlink"
+        else:
+            method = copy_data(src, tmp)
+            os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # 目标是目录时无法原子替换，交给调用方报告
+        os.replace(tmp, dst)
+    except OSError:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+    return method
+
+
+def content_hash(path, st):
+    """文件内容哈希，符号链接使用其指向"""
+    if stat.S_ISLNK(st.st_mode):
+        return "link:" + os.readlink(path)
+    return hash_file(path)
+
+
+class SourceIndex:
+    """源目录的一次扫描，部署到多个目标时共享；
+    每个文件最多哈希一次，哈希按 (大小, 修改时间) 缓存到磁盘供下次使用"""
+
+    def __init__(self, source, cache_dir=MANIFEST_DIR):
+        self.source = os.path.abspath(source)
+        self.files = scan_tree(self.source)
+        key = hashlib.sha1(self.source.encode()).hexdigest()
+        self.cache_file = os.path.join(cache_dir, f"source-{key}.json")
+        self.digests = {}
+        self.lock = threading.Lock()
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f)
+        except (OSError, ValueError):
+            self.cache = {}
+
+    def matches(self, relpath, st):
+        """st 是否与扫描时的状态一致"""
+        scanned = self.files.get(relpath)
+        return scanned is not None and scanned.st_size == st.st_size \
+            and scanned.st_mtime_ns == st.st_mtime_ns
+
+    def digest(self, relpath):
+        """返回 (哈希, 本次是否实际读取了文件)"""
+        with self.lock:
+            if relpath in self.digests:
+                return self.digests[relpath], False
+            st = self.files[relpath]
+            cached = self.cache.get(relpath)
+            if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                self.digests[relpath] = cached[2]
+                return cached[2], False
+            digest = content_hash(os.path.join(self.source, relpath), st)
+            self.digests[relpath] = digest
+            return digest, True
+
+    def save(self):
+        """写入哈希缓存，只保留仍存在的文件"""
+        with self.lock:
+            cache = {relpath: entry for relpath, entry in self.cache.items() if relpath in self.files}
+            for relpath, digest in self.digests.items():
+                st = self.files[relpath]
+                cache[relpath] = [st.st_size, st.st_mtime_ns, digest]
+            self.cache = cache
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(tmp_file, self.cache_file)
+
+
+@dataclass
+class DeployReport:
+    """部署结果统计"""
+    scanned: int = 0
+    hashed: int = 0
+    copied: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    kept: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    bytes_written: int = 0
+    methods: dict = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+class DeployEngine:
+    """增量部署: source 目录的内容同步到 target 目录"""
+
+    def __init__(self, source, target, manifest_dir=MANIFEST_DIR, dry_run=False, index=None):
+        self.source = os.path.abspath(source)
+        self.target = os.path.abspath(os.path.expanduser(target))
+        self.dry_run = dry_run
+        self.index = index
+        key = hashlib.sha1(f"{self.source}\0{self.target}".encode()).hexdigest()
+        self.manifest_file = os.path.join(manifest_dir, f"{key}.json")
+        self.manifest = {}
+
+    # ==================== 清单模块 ====================
+    def load_manifest(self):
+        """读取上次部署的清单"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.manifest = data.get('files', {})
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def save_manifest(self):
+        """原子写入清单"""
+        os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'target': self.target, 'files': self.manifest}, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    # ==================== 比较模块 ====================
+    def source_hash(self, relpath, st, report):
+        """源文件哈希，大小和修改时间未变时直接使用清单中的值"""
+        record = self.manifest.get(relpath)
+        if record and record['size'] == st.st_size and record['mtime'] == st.st_mtime_ns:
+            return record['sha256']
+        if self.index is not None and self.index.matches(relpath, st):
+            digest, computed = self.index.digest(relpath)
+            report.hashed += computed
+            return digest
+        report.hashed += 1
+        return content_hash(os.path.join(self.source, relpath), st)
+
+    def target_matches(self, relpath, record):
+        """目标文件是否仍是上次部署写入的版本 (只比较 stat，不读内容)"""
+        if record is None or 'target_mtime' not in record:
+            return False
+        try:
+            st = os.lstat(os.path.join(self.target, relpath))
+        except OSError:
+            return False
+        return st.st_size == record['target_size'] and st.st_mtime_ns == record['target_mtime']
+
+    # ==================== 写入模块 ====================
+    def install_file(self, relpath, st, report):
+        """写入单个目标文件并计入统计"""
+        dst = os.path.join(self.target, relpath)
+        method = install_copy(os.path.join(self.source, relpath), dst, st)
+        if method != "symlink":
+            report.bytes_written += st.st_size
+        report.methods[method] = report.methods.get(method, 0) + 1
+        return os.lstat(dst)
+
+    def remove_deleted(self, current, report):
+        """删除源目录中已不存在的文件，目标被修改过时保留"""
+        for relpath in sorted(set(self.manifest) - set(current)):
+            self.remove_file(relpath, report)
+
+    def remove_file(self, relpath, report):
+        """删除清单中的一个目标文件并移出清单"""
+        record = self.manifest.pop(relpath)
+        dst = os.path.join(self.target, relpath)
+        if not os.path.lexists(dst):
+            return
+        if not self.target_matches(relpath, record):
+            report.kept.append(relpath)
+            return
+        if not self.dry_run:
+            os.remove(dst)
+            self.prune_empty_dirs(os.path.dirname(dst))
+        report.removed += 1
+
+    def prune_empty_dirs(self, directory):
+        """向上删除空目录，直到目标根目录"""
+        while directory.startswith(self.target + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    # ==================== 主流程 ====================
+    def deploy(self):
+        """执行部署，返回 DeployReport"""
+        start = time.monotonic()
+        report = DeployReport()
+        self.load_manifest()
+
+        # 多目标部署时由调用方传入共享的扫描结果
+        if self.index is None:
+            self.index = SourceIndex(self.source)
+        current = self.index.files
+        report.scanned = len(current)
+
+        for relpath, st in sorted(current.items()):
+            self.sync_file(relpath, st, report)
+
+        self.remove_deleted(current, report)
+        if not self.dry_run:
+            self.save_manifest()
+            self.index.save()
+
+        report.elapsed = time.monotonic() - start
+        return report
+
+    def sync_file(self, relpath, st, report):
+        """比较并在需要时写入单个文件"""
+        record = self.manifest.get(relpath)
+        digest = self.source_hash(relpath, st, report)
+
+        if record and record['sha256'] == digest and self.target_matches(relpath, record):
+            report.unchanged += 1
+            record['size'], record['mtime'] = st.st_size, st.st_mtime_ns
+            return
+
+        if os.path.realpath(os.path.join(self.target, relpath)) == \
+                os.path.realpath(os.path.join(self.source, relpath)):
+            # 链接模式部署过的路径，目标就是源文件本身
+            report.unchanged += 1
+            return
+
+        if self.dry_run:
+            report.copied += 1
+            report.bytes_written += st.st_size
+            return
+
+        try:
+            target_st = self.install_file(relpath, st, report)
+        except OSError as e:
+            report.failed.append((relpath, str(e)))
+            return
+
+        report.copied += 1
+        self.manifest[relpath] = {
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'sha256': digest,
+            'target_size': target_st.st_size,
+            'target_mtime': target_st.st_mtime_ns,
+        }
+
+    def sync_paths(self, relpaths):
+        """只同步给定的相对路径 (文件或目录)，用于监视模式；清单需已读取"""
+        start = time.monotonic()
+        report = DeployReport()
+
+        for relpath in sorted(set(relpaths)):
+            path = os.path.join(self.source, relpath)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                st = None
+
+            if st is not None and stat.S_ISDIR(st.st_mode):
+                current = {os.path.join(relpath, sub): sub_st
+                           for sub, sub_st in scan_tree(path).items()}
+            elif st is not None:
+                current = {relpath: st}
+            else:
+                current = {}
+
+            report.scanned += len(current)
+            for item, item_st in sorted(current.items()):
+                self.sync_file(item, item_st, report)
+            # 已删除的文件或目录中已删除的文件
+            prefix = relpath + os.sep
+            for item in sorted(self.manifest):
+                if (item == relpath or item.startswith(prefix)) and item not in current:
+                    self.remove_file(item, report)
+
+        if not self.dry_run:
+            self.save_manifest()
+        report.elapsed = time.monotonic() - start
+        return report
+
+
+@dataclass
+class LinkReport:
+    """链接模式的统计"""
+    linked: int = 0
+    folded: int = 0
+    replaced: int = 0
+    existing: int = 0
+    removed: int = 0
+    conflicts: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+class LinkFarm:
+    """stow 式链接部署: 用尽量少的符号链接把 source 映射到 target"""
+
+    def __init__(self, source, target, dry_run=False):
+        self.source = os.path.realpath(source)
+        self.target = os.path.abspath(os.path.expanduser(target))
+        self.dry_run = dry_run
+
+    # ==================== 判断模块 ====================
+    def link_source(self, path):
+        """path 是指向源目录内的链接时返回其指向的源路径，否则返回 None"""
+        if not os.path.islink(path):
+            return None
+        pointed = os.path.normpath(os.path.join(os.path.realpath(os.path.dirname(path)),
+                                                os.readlink(path)))
+        if pointed == self.source or pointed.startswith(self.source + os.sep):
+            return pointed
+        return None
+
+    def same_content(self, src, dst):
+        """目标是源文件的副本 (如复制模式部署的文件)，可以安全替换为链接"""
+        if os.path.islink(src) or os.path.islink(dst):
+            return os.path.islink(src) and os.path.islink(dst) and \
+                os.readlink(src) == os.readlink(dst)
+        if not os.path.isfile(dst):
+            return False
+        return os.path.getsize(src) == os.path.getsize(dst) and hash_file(src) == hash_file(dst)
+
+    def foldable(self, src, dst):
+        """目标目录中没有外来文件: 全部是指向对应源路径的链接或源文件的副本"""
+        for name in os.listdir(dst):
+            s, d = os.path.join(src, name), os.path.join(dst, name)
+            if not os.path.lexists(s):
+                return False
+            if self.link_source(d) == s:
+                continue
+            if os.path.isdir(d) and not os.path.islink(d):
+                if not os.path.isdir(s) or os.path.islink(s) or not self.foldable(s, d):
+                    return False
+            elif not self.same_content(s, d):
+                return False
+        return True
+
+    # ==================== 计划模块 ====================
+    def plan(self, src=None, dst=None, operations=None, report=None):
+        """生成操作列表 [(动作, 目标路径, 源路径)]，冲突记入 report.conflicts"""
+        src = src or self.source
+        dst = dst or self.target
+        operations = [] if operations is None else operations
+        report = report or LinkReport()
+
+        for name in sorted(os.listdir(src)):
+            s, d = os.path.join(src, name), os.path.join(dst, name)
+            source_dir = os.path.isdir(s) and not os.path.islink(s)
+
+            if not os.path.lexists(d):
+                operations.append(("fold" if source_dir else "link", d, s))
+            elif self.link_source(d) == s:
+                report.existing += 1
+            elif os.path.islink(d):
+                if os.path.exists(d) or self.link_source(d) is None:
+                    report.conflicts.append(f"{d} 是指向 {os.readlink(d)} 的链接")
+                else:
+                    # 源目录中已删除的路径留下的失效链接
+                    operations.append(("replace", d, s))
+            elif source_dir and os.path.isdir(d):
+                if self.foldable(s, d):
+                    operations.append(("replace", d, s))
+                else:
+                    self.plan(s, d, operations, report)
+            elif not source_dir and self.same_content(s, d):
+                operations.append(("replace", d, s))
+            else:
+                report.conflicts.append(f"{d} 已存在且内容与 {s} 不同")
+
+        return operations, report
+
+    # ==================== 执行模块 ====================
+    def make_link(self, dst, src):
+        """建立相对路径的符号链接，先建临时链接再原子替换"""
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.link-tmp")
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.symlink(os.path.relpath(src, os.path.realpath(os.path.dirname(dst))), tmp)
+        if os.path.isdir(dst) and not os.path.islink(dst):
+            # 目录无法被原子替换，先移开再删除
+            aside = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.link-old")
+            os.rename(dst, aside)
+            os.replace(tmp, dst)
+            shutil.rmtree(aside)
+        else:
+            os.replace(tmp, dst)
+
+    def link(self):
+        """建立链接；存在冲突时不做任何修改，返回 LinkReport"""
+        start = time.monotonic()
+        operations, report = self.plan()
+
+        if not report.conflicts:
+            for action, dst, src in operations:
+                if not self.dry_run:
+                    self.make_link(dst, src)
+                if action == "fold":
+                    report.folded += 1
+                elif action == "replace":
+                    report.replaced += 1
+                else:
+                    report.linked += 1
+
+        report.elapsed = time.monotonic() - start
+        return report
+
+    def unlink(self, src=None, dst=None, report=None):
+        """删除指向源目录的链接 (含源文件已删除的失效链接)，以及因此变空的目录"""
+        src = src or self.source
+        dst = dst or self.target
+        report = report or LinkReport()
+        start = time.monotonic()
+
+        try:
+            names = os.listdir(dst)
+        except OSError:
+            return report
+
+        for name in names:
+            s, d = os.path.join(src, name), os.path.join(dst, name)
+            if self.link_source(d) is not None:
+                if not self.dry_run:
+                    os.remove(d)
+                report.removed += 1
+            elif os.path.isdir(d) and not os.path.islink(d) and os.path.isdir(s):
+                self.unlink(s, d, report)
+                if not self.dry_run and not os.listdir(d):
+                    os.rmdir(d)
+
+        report.elapsed = time.monotonic() - start
+        return report
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+安装耗时历史模块
+记录每个包最近若干次的安装/构建耗时，据此计算超时时间并找出异常耗时
+"""
+
+import os
+import json
+import math
+
+
+def percentile(samples, fraction):
+    """最近秩法计算分位数"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+class DurationHistory:
+    """包耗时历史
+
+    超时 = p99 x safety_factor，限制在 [min_timeout, max_timeout] 之间；
+    没有历史记录的包使用 default_timeout (仓库包) 或 aur_timeout (AUR 包)
+    """
+
+    def __init__(self, path=os.path.expanduser("~/.cache/dotfiles/pkg_history.json"),
+                 max_samples=20, safety_factor=3.0, min_timeout=60, max_timeout=7200,
+                 default_timeout=200, aur_timeout=1800):
+        self.path = path
+        self.max_samples = max_samples
+        self.safety_factor = safety_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.default_timeout = default_timeout
+        self.aur_timeout = aur_timeout
+        self.samples = {}
+        self.outliers = []
+
+    def load(self):
+        """读取历史记录"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.samples = json.load(f)
+        except (OSError, ValueError):
+            self.samples = {}
+
+    def save(self):
+        """原子写入历史记录，失败时忽略"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_file = self.path + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.samples, f)
+            os.replace(tmp_file, self.path)
+        except OSError:
+            pass
+
+    def timeout_for(self, pkg_name, is_aur=False):
+        """根据历史计算超时时间 (秒)"""
+        samples = self.samples.get(pkg_name)
+        if not samples:
+            return self.aur_timeout if is_aur else self.default_timeout
+
+        timeout = percentile(samples, 0.99) * self.safety_factor
+        return int(min(self.max_timeout, max(self.min_timeout, timeout)))
+
+    def estimate(self, pkg_name):
+        """预计耗时 (中位数)，没有历史时返回 None"""
+        samples = self.samples.get(pkg_name)
+        return percentile(samples, 0.5) if samples else None
+
+    def record(self, pkg_name, duration):
+        """记录一次耗时，与历史相比明显偏慢时记为异常"""
+        samples = self.samples.get(pkg_name, [])
+
+        # 至少 3 个样本才判断，且忽略几秒内的抖动
+        if len(samples) >= 3:
+            median = percentile(samples, 0.5)
+            if duration > median * self.safety_factor and duration - median > 10:
+                self.outliers.append((pkg_name, duration, median))
+
+        samples.append(round(duration, 2))
+        self.samples[pkg_name] = samples[-self.max_samples:]
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+硬件检测模块
+直接读取 /sys 和 /proc 判断 pkgs.conf 部分头中的条件，每次运行只检测一次:
+
+    [Graphics Drivers @ pci:nvidia]    存在 NVIDIA 的 PCI 设备
+    [Microcode @ cpu:amd]              AMD 处理器
+    [Bluetooth @ bluetooth]            存在蓝牙控制器
+    [Laptop Tools @ battery]           存在电池
+    [Desktop Only @ !battery]          条件前加 ! 表示取反
+
+多个条件用空格分隔，全部满足时才安装该部分。
+检测结果可以用 overrides 覆盖 (pkg_installer.py --hardware pci:nvidia --hardware '!battery')，
+用于为其他机器准备安装或检测不准确的情况
+"""
+
+import os
+
+# 常用 PCI 厂商 ID
+PCI_VENDORS = {
+    "nvidia": "0x10de",
+    "amd": "0x1002",
+    "intel": "0x8086",
+    "broadcom": "0x14e4",
+    "realtek": "0x10ec",
+}
+
+# /proc/cpuinfo 中的 vendor_id
+CPU_VENDORS = {
+    "GenuineIntel": "intel",
+    "AuthenticAMD": "amd",
+}
+
+
+def split_section_header(header):
+    """拆分部分头，返回 (部分名, 条件列表)"""
+    name, _, condition = header.partition('@')
+    return name.strip(), condition.split()
+
+
+def parse_overrides(values):
+    """把 ["pci:nvidia", "!battery"] 转换为 {"pci:nvidia": True, "battery": False}"""
+    overrides = {}
+    for value in values or ():
+        condition = value.strip().lower()
+        if condition.startswith('!'):
+            overrides[condition[1:]] = False
+        elif condition:
+            overrides[condition] = True
+    return overrides
+
+
+class HardwareProbe:
+    """硬件检测，root 可指向伪造的 sysfs/procfs 目录树，overrides 覆盖检测结果"""
+
+    def __init__(self, root="/", overrides=None):
+        self.root = root
+        self.overrides = overrides or {}
+        self.cache = {}
+
+    def path(self, *parts):
+        """root 下的路径"""
+        return os.path.join(self.root, *parts)
+
+    def cached(self, key, probe):
+        """每个检测项只执行一次"""
+        if key not in self.cache:
+            self.cache[key] = probe()
+        return self.cache[key]
+
+    # ==================== 检测模块 ====================
+    def pci_vendors(self):
+        """全部 PCI 设备的厂商 ID"""
+        def probe():
+            vendors = set()
+            devices = self.path("sys", "bus", "pci", "devices")
+            try:
+                entries = os.listdir(devices)
+            except OSError:
+                return vendors
+            for entry in entries:
+                try:
+                    with open(os.path.join(devices, entry, "vendor"), 'r') as f:
+                        vendors.add(f.read().strip().lower())
+                except OSError:
+                    continue
+            return vendors
+        return self.cached("pci", probe)
+
+    def cpu_vendor(self):
+        """处理器厂商 (intel/amd)，无法识别时返回原始 vendor_id"""
+        def probe():
+            try:
+                with open(self.path("proc", "cpuinfo"), 'r') as f:
+                    for line in f:
+                        key, _, value = line.partition(':')
+                        if key.strip() == "vendor_id":
+                            value = value.strip()
+                            return CPU_VENDORS.get(value, value.lower())
+            except OSError:
+                pass
+            return ""
+        return self.cached("cpu", probe)
+
+    def has_bluetooth(self):
+        """是否存在蓝牙控制器"""
+        def probe():
+            try:
+                return any(entry.startswith("hci")
+                           for entry in os.listdir(self.path("sys", "class", "bluetooth")))
+            except OSError:
+                return False
+        return self.cached("bluetooth", probe)
+
+    def has_battery(self):
+        """是否存在电池"""
+        def probe():
+            supplies = self.path("sys", "class", "power_supply")
+            try:
+                entries = os.listdir(supplies)
+            except OSError:
+                return False
+            for entry in entries:
+                try:
+                    with open(os.path.join(supplies, entry, "type"), 'r') as f:
+                        if f.read().strip() == "Battery":
+                            return True
+                except OSError:
+                    continue
+            return False
+        return self.cached("battery", probe)
+
+    # ==================== 条件模块 ====================
+    def check(self, condition):
+        """判断单个条件，未知条件抛出 ValueError"""
+        if condition.startswith('!'):
+            return not self.check(condition[1:])
+        if condition.lower() in self.overrides:
+            return self.overrides[condition.lower()]
+
+        kind, _, value = condition.partition(':')
+        value = value.lower()
+        if kind == "pci" and value:
+            vendor_id = PCI_VENDORS.get(value, value if value.startswith("0x") else "0x" + value)
+            return vendor_id in self.pci_vendors()
+        if kind == "cpu" and value:
+            return self.cpu_vendor() == value
+        if kind == "bluetooth" and not value:
+            return self.has_bluetooth()
+        if kind == "battery" and not value:
+            return self.has_battery()
+        raise ValueError(f"未知的硬件条件: {condition}")
+
+    def matches(self, conditions):
+        """全部条件是否满足"""
+        return all(self.check(condition) for condition in conditions)
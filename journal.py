@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+安装日志模块
+以 JSON 行追加记录每个包的安装结果，每条记录写入后立即 fsync，
+中断后重新运行可以直接跳过已完成的包；全部成功的运行结束时写入 complete 标记，
+之后的运行重新检查每个包，日志只用于从中断或失败处继续
+"""
+
+import os
+import json
+import time
+import hashlib
+
+# 视为已完成的状态
+FINISHED_STATUS = ("DONE", "SKIP")
+
+
+def fingerprint_file(path):
+    """配置文件指纹"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+class InstallJournal:
+    """追加写入的安装日志"""
+
+    # 超过该大小时，只保留当前配置的记录
+    COMPACT_SIZE = 1024 * 1024
+
+    def __init__(self, path=os.path.expanduser("~/.cache/dotfiles/pkg_journal.jsonl")):
+        self.path = path
+        self.fingerprint = None
+        self.finished = {}
+        self.failures = 0
+        self.handle = None
+
+    def read_records(self):
+        """读取全部记录，忽略中断时写了一半的行"""
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return records
+
+    def open(self, fingerprint, from_scratch=False):
+        """打开日志，恢复与当前配置指纹一致的已完成记录"""
+        self.fingerprint = fingerprint
+        self.finished = {}
+        self.failures = 0
+
+        records = self.read_records()
+        for record in records:
+            if record.get('fingerprint') != fingerprint:
+                continue
+            if record.get('event') in ('reset', 'complete'):
+                self.finished.clear()
+            elif record.get('status') in FINISHED_STATUS:
+                self.finished[record['package']] = record
+            else:
+                self.finished.pop(record.get('package'), None)
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.COMPACT_SIZE:
+                self.compact(records)
+            self.handle = open(self.path, 'a', encoding='utf-8')
+        except OSError:
+            self.handle = None
+            return False
+
+        if from_scratch:
+            self.finished.clear()
+            self.write({'event': 'reset'})
+        return True
+
+    def compact(self, records):
+        """压缩日志，只保留当前配置的记录"""
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for record in records:
+                if record.get('fingerprint') == self.fingerprint:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.path)
+
+    def write(self, record, sync=True):
+        """写入一条记录，sync 为真时立即落盘"""
+        if self.handle is None:
+            return
+        record = dict(record, fingerprint=self.fingerprint, time=time.time())
+        self.handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.handle.flush()
+        if sync:
+            os.fsync(self.handle.fileno())
+
+    def record(self, section, pkg_name, status, duration=0.0):
+        """记录一个包的结果
+
+        SKIP 可以随时从本地数据库重新得出，不必逐条 fsync
+        """
+        if status == "SKIP" and pkg_name in self.finished:
+            return
+        self.write({
+            'section': section,
+            'package': pkg_name,
+            'status': status,
+            'duration': round(duration, 3),
+        }, sync=status != "SKIP")
+        if status in FINISHED_STATUS:
+            self.finished[pkg_name] = {'section': section, 'status': status}
+        else:
+            self.failures += 1
+            self.finished.pop(pkg_name, None)
+
+    def complete(self):
+        """本次运行全部成功，之后的运行不再从日志恢复"""
+        self.write({'event': 'complete'})
+        self.finished.clear()
+
+    def is_finished(self, pkg_name):
+        """该包是否已在之前的运行中完成"""
+        return pkg_name in self.finished
+
+    def close(self):
+        """关闭日志"""
+        if self.handle is not None:
+            self.handle.flush()
+            os.fsync(self.handle.fileno())
+            self.handle.close()
+            self.handle = None
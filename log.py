@@ -33,7 +33,7 @@ class Logger:
         """清除当前行"""
         print('\r\033[K', end='', flush=True)
 
-    def _print_package_line(self, index, total, status, pkg_name, comment=""):
+    def _print_package_line(self, index, total, status, pkg_name, comment="", progress=""):
         """打印包安装行（支持在同一行更新）"""
         # 状态颜色映射
         status_colors = {
@@ -52,6 +52,8 @@ class Logger:
         pkg_display = f"{pkg_name:<70}"
 
         line_content = f"{index_display} [{status_display}] {pkg_display} {comment_display}"
+        if progress:
+            line_content += f" {Colors.CYAN}{progress}{Colors.NC}"
 
         # 清除当前行并打印新内容
         self._clear_current_line()
@@ -143,6 +145,15 @@ class Logger:
             # 清除当前包信息，因为已经完成了
             self.current_package_line = None
 
+    def package_progress(self, progress):
+        """在当前包行末尾显示进度（百分比、速率等）"""
+        if not self.current_package_line:
+            return
+
+        line = self.current_package_line
+        self._print_package_line(line['index'], line['total'], "EXEC",
+                                 line['pkg_name'], line['comment'], progress)
+
     # 便捷方法
     def package_skip(self, index, total, pkg_name, comment=""):
         """包跳过安装"""
@@ -172,6 +183,7 @@ error = log.error
 section_header = log.section_header
 package_start = log.package_start
 package_update = log.package_update
+package_progress = log.package_progress
 package_skip = log.package_skip
 package_done = log.package_done
 package_fail = log.package_fail
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+本地缓存镜像代理
+按 pacman 镜像布局 ($repo/os/$arch/<文件>) 提供服务，每个文件只从上游下载一次，
+多台机器装机时把它放在 mirrorlist 的第一行即可:
+
+    Server = http://<代理地址>:8080/$repo/os/$arch
+
+数据库文件 (.db/.files 及其签名) 会变化，超过 db_max_age 后向上游重新验证；
+包文件内容不变，命中后直接从磁盘返回。缓存超过上限时淘汰最久未访问的包文件。
+
+未命中时在后台线程下载，边写入 .part 文件边转发给客户端，同一文件的并发请求
+读取同一个正在增长的文件，首字节时间与直连上游相同，不会触发 pacman 的低速超时
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import posixpath
+import urllib.error
+import urllib.request
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 导入日志模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from log import info, success, warning, error, section_header
+
+DEFAULT_UPSTREAMS = [
+    "https://mirrors.ustc.edu.cn/archlinux",
+    "https://mirrors.tuna.tsinghua.edu.cn/archlinux",
+    "https://mirrors.bfsu.edu.cn/archlinux",
+]
+
+# 会随仓库更新而变化的文件
+DATABASE_SUFFIXES = (".db", ".files", ".db.sig", ".files.sig")
+
+CHUNK_SIZE = 256 * 1024
+
+
+def is_database(path):
+    """是否是会变化的数据库文件"""
+    return path.endswith(DATABASE_SUFFIXES)
+
+
+class Download:
+    """正在进行的上游下载，读者跟随写入进度读取 .part 文件"""
+
+    def __init__(self, path, tmp_file, target, response):
+        self.path = path
+        self.tmp_file = tmp_file
+        self.target = target
+        self.response = response
+        self.total = response.headers.get("Content-Length")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.written = 0
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def open(self):
+        """打开正在下载的文件；已完成时打开最终文件"""
+        with self.condition:
+            return open(self.target if self.done else self.tmp_file, 'rb')
+
+    def wait(self, position):
+        """等待写入超过 position 或下载结束，返回 (已写入字节数, 是否结束)"""
+        with self.condition:
+            while self.written <= position and not self.done and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise OSError(f"上游下载中断: {self.error}")
+            return self.written, self.done
+
+
+class MirrorCache:
+    """镜像文件缓存
+
+    每个路径一把锁，同一文件的并发请求只触发一次上游下载；
+    索引记录大小、最近访问时间和数据库的 Last-Modified
+    """
+
+    def __init__(self, cache_dir=os.path.expanduser("~/.cache/dotfiles/mirror"),
+                 upstreams=None, max_size_mb=20480, db_max_age=300, timeout=30):
+        self.cache_dir = cache_dir
+        self.upstreams = [url.rstrip("/") for url in (upstreams or DEFAULT_UPSTREAMS)]
+        self.max_size = max_size_mb * 1024 * 1024
+        self.db_max_age = db_max_age
+        self.timeout = timeout
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.index = {}
+        self.index_lock = threading.Lock()
+        self.path_locks = {}
+        self.active = {}
+        self.stats = {"hit": 0, "miss": 0, "revalidated": 0, "evicted": 0}
+        self.load_index()
+
+    # ==================== 索引模块 ====================
+    def load_index(self):
+        """读取缓存索引，丢弃磁盘上已不存在的条目"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+        self.index = {path: entry for path, entry in self.index.items()
+                      if os.path.exists(self.local_path(path))}
+
+    def save_index(self):
+        """原子写入缓存索引 (调用方持有 index_lock)"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_file, self.index_file)
+
+    def local_path(self, path):
+        """请求路径对应的缓存文件"""
+        return os.path.join(self.cache_dir, "files", path)
+
+    def lock_for(self, path):
+        """取得路径对应的锁"""
+        with self.index_lock:
+            return self.path_locks.setdefault(path, threading.Lock())
+
+    def touch(self, path):
+        """更新最近访问时间"""
+        with self.index_lock:
+            if path in self.index:
+                self.index[path]['atime'] = time.time()
+
+    # ==================== 上游模块 ====================
+    def open_upstream(self, path, last_modified=None):
+        """依次尝试上游镜像，返回 (响应, 是否未修改)；全部失败时返回 (None, False)"""
+        for upstream in self.upstreams:
+            request = urllib.request.Request(f"{upstream}/{path}")
+            if last_modified:
+                request.add_header("If-Modified-Since", last_modified)
+            try:
+                return urllib.request.urlopen(request, timeout=self.timeout), False
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    return None, True
+                warning(f"{upstream}: {path} 返回 {e.code}")
+            except (OSError, ValueError) as e:
+                warning(f"{upstream}: {path} 下载失败: {e}")
+        return None, False
+
+    def start_download(self, path, response):
+        """在后台线程中把上游响应写入缓存，返回 Download (调用方持有路径锁)"""
+        target = self.local_path(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        download = Download(path, f"{target}.part.{threading.get_ident()}", target, response)
+        # 先创建文件，读者可以立即打开
+        open(download.tmp_file, 'wb').close()
+        self.active[path] = download
+        threading.Thread(target=self.download, args=(download,), daemon=True).start()
+        return download
+
+    def download(self, download):
+        """写入临时文件，每块写完通知读者，完成后改名为缓存文件"""
+        digest = hashlib.sha256()
+        response = download.response
+
+        try:
+            with response, open(download.tmp_file, 'wb') as f:
+                while True:
+                    # read1 返回已到达的数据，不等凑满一整块
+                    chunk = response.read1(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    f.flush()
+                    digest.update(chunk)
+                    with download.condition:
+                        download.written += len(chunk)
+                        download.condition.notify_all()
+            if download.total is not None and download.written != int(download.total):
+                raise OSError(f"长度不符 ({download.written}/{download.total})")
+            # 保留上游的修改时间，pacman 同步数据库时据此判断是否需要更新
+            if download.last_modified:
+                try:
+                    mtime = parsedate_to_datetime(download.last_modified).timestamp()
+                    os.utime(download.tmp_file, (mtime, mtime))
+                except (TypeError, ValueError):
+                    pass
+            with download.condition:
+                os.replace(download.tmp_file, download.target)
+                download.done = True
+                download.condition.notify_all()
+        except (OSError, ValueError) as e:
+            error(f"下载 {download.path} 失败: {e}")
+            with download.condition:
+                download.error = str(e) or type(e).__name__
+                download.condition.notify_all()
+            if os.path.exists(download.tmp_file):
+                os.remove(download.tmp_file)
+            with self.index_lock:
+                self.active.pop(download.path, None)
+            return
+
+        now = time.time()
+        with self.index_lock:
+            self.active.pop(download.path, None)
+            self.index[download.path] = {
+                'size': download.written,
+                'sha256': digest.hexdigest(),
+                'atime': now,
+                'checked': now,
+                'last_modified': download.last_modified,
+            }
+            self.evict()
+            self.save_index()
+
+    # ==================== 缓存模块 ====================
+    def is_fresh(self, path):
+        """缓存是否可直接使用: 包文件只要存在即可，数据库文件需在有效期内"""
+        entry = self.index.get(path)
+        if entry is None:
+            return False
+        if not is_database(path):
+            return True
+        return time.time() - entry['checked'] < self.db_max_age
+
+    def fetch(self, path):
+        """确保文件在缓存中或正在下载，返回 (本地路径, Download)，二者之一为 None；
+        上游不可用时返回旧缓存或 (None, None)"""
+        if self.is_fresh(path):
+            self.stats['hit'] += 1
+            self.touch(path)
+            return self.local_path(path), None
+
+        with self.lock_for(path):
+            # 等锁期间可能已被其他请求下载，或正在下载
+            if self.is_fresh(path):
+                self.stats['hit'] += 1
+                self.touch(path)
+                return self.local_path(path), None
+            with self.index_lock:
+                download = self.active.get(path)
+            if download is not None:
+                self.stats['hit'] += 1
+                return None, download
+
+            entry = self.index.get(path)
+            response, not_modified = self.open_upstream(
+                path, entry.get('last_modified') if entry else None)
+
+            if not_modified:
+                self.stats['revalidated'] += 1
+                with self.index_lock:
+                    entry['checked'] = entry['atime'] = time.time()
+                return self.local_path(path), None
+
+            if response is None:
+                # 上游全部失败时，过期的数据库也比没有好
+                return (self.local_path(path) if entry else None), None
+
+            self.stats['miss'] += 1
+            with self.index_lock:
+                return None, self.start_download(path, response)
+
+    def evict(self):
+        """超过上限时按最近访问时间淘汰包文件 (调用方持有 index_lock)
+
+        数据库文件很小且每次同步都需要，不参与淘汰
+        """
+        total = sum(entry['size'] for entry in self.index.values())
+        if total <= self.max_size:
+            return
+
+        candidates = sorted((entry['atime'], path) for path, entry in self.index.items()
+                            if not is_database(path))
+        for _, path in candidates:
+            if total <= self.max_size:
+                break
+            # 跳过正在重新下载的文件；已打开的文件删除后仍可继续读取
+            if path in self.active:
+                continue
+            try:
+                os.remove(self.local_path(path))
+            except OSError:
+                pass
+            total -= self.index.pop(path)['size']
+            self.stats['evicted'] += 1
+
+    def summary(self):
+        """缓存统计"""
+        with self.index_lock:
+            total = sum(entry['size'] for entry in self.index.values())
+            return dict(self.stats, files=len(self.index), size=total)
+
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    """pacman 镜像请求处理"""
+
+    server_version = "dotfiles-mirror/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def normalize_path(self):
+        """规范化请求路径，拒绝越出缓存目录的路径"""
+        path = posixpath.normpath(self.path.split('?', 1)[0]).lstrip("/")
+        if not path or path.startswith("..") or path == ".":
+            return None
+        return path
+
+    def send_file(self, local_file, head_only=False):
+        """返回缓存文件，支持 If-Modified-Since 和断点续传"""
+        stat = os.stat(local_file)
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+        since = self.headers.get("If-Modified-Since")
+        if since:
+            try:
+                if int(stat.st_mtime) <= parsedate_to_datetime(since).timestamp():
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+            except (TypeError, ValueError):
+                pass
+
+        start, end = 0, stat.st_size - 1
+        status = 200
+        range_header = self.headers.get("Range", "")
+        if range_header.startswith("bytes=") and stat.st_size:
+            first, _, last = range_header[6:].split(",", 1)[0].partition("-")
+            try:
+                start = int(first) if first else max(0, stat.st_size - int(last))
+                end = int(last) if first and last else stat.st_size - 1
+            except ValueError:
+                start, end = 0, stat.st_size - 1
+            if start >= stat.st_size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{stat.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            end = min(end, stat.st_size - 1)
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Last-Modified", last_modified)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+        self.end_headers()
+        if head_only:
+            return
+
+        with open(local_file, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def send_download(self, download, head_only=False):
+        """边下载边转发；带 Range 的请求等下载完成后按缓存文件处理"""
+        if self.headers.get("Range"):
+            download.wait(float("inf"))
+            self.send_file(download.target, head_only)
+            return
+
+        source = download.open()
+        with source:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            if download.total is not None:
+                self.send_header("Content-Length", download.total)
+            else:
+                # 长度未知时以关闭连接表示结束
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            if download.last_modified:
+                self.send_header("Last-Modified", download.last_modified)
+            self.end_headers()
+            if head_only:
+                return
+
+            position = 0
+            while True:
+                written, done = download.wait(position)
+                while position < written:
+                    chunk = source.read(min(CHUNK_SIZE, written - position))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    position += len(chunk)
+                if done and position >= written:
+                    break
+
+    def handle_request(self, head_only):
+        """GET/HEAD 公共处理"""
+        path = self.normalize_path()
+        if path is None:
+            self.send_error(400)
+            return
+
+        try:
+            local_file, download = self.server.cache.fetch(path)
+        except OSError as e:
+            error(f"缓存 {path} 失败: {e}")
+            self.send_error(502)
+            return
+
+        if local_file is None and download is None:
+            self.send_error(404)
+            return
+
+        try:
+            if download is not None:
+                self.send_download(download, head_only)
+            else:
+                self.send_file(local_file, head_only)
+        except FileNotFoundError:
+            # 发送前恰好被淘汰
+            self.send_error(503)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except OSError as e:
+            # 上游在转发途中断开，关闭连接让客户端换下一个镜像
+            warning(f"{path}: {e}")
+            self.close_connection = True
+
+    def do_GET(self):
+        self.handle_request(head_only=False)
+
+    def do_HEAD(self):
+        self.handle_request(head_only=True)
+
+    def log_message(self, format, *args):
+        """访问日志只写入 verbose 模式"""
+        if self.server.verbose:
+            info(f"{self.address_string()} {format % args}")
+
+
+class MirrorProxy(ThreadingHTTPServer):
+    """多线程镜像代理服务器"""
+
+    daemon_threads = True
+
+    def __init__(self, address, cache, verbose=False):
+        super().__init__(address, MirrorRequestHandler)
+        self.cache = cache
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        """代理地址"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="本地缓存镜像代理")
+    parser.add_argument("--bind", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口")
+    parser.add_argument("--cache-dir", default=os.path.expanduser("~/.cache/dotfiles/mirror"),
+                        help="缓存目录")
+    parser.add_argument("--upstream", action="append", metavar="URL",
+                        help="上游镜像根地址 (可重复，按顺序尝试)，例如 https://mirrors.ustc.edu.cn/archlinux")
+    parser.add_argument("--max-size", type=int, default=20480, metavar="MB",
+                        help="缓存上限，超出时淘汰最久未访问的包文件")
+    parser.add_argument("--db-max-age", type=int, default=300, metavar="SEC",
+                        help="数据库文件的有效期，过期后向上游重新验证")
+    parser.add_argument("--verbose", action="store_true", help="输出访问日志")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    cache = MirrorCache(args.cache_dir, args.upstream, args.max_size, args.db_max_age)
+    server = MirrorProxy((args.bind, args.port), cache, args.verbose)
+
+    section_header("镜像代理")
+    info(f"缓存目录: {args.cache_dir} ({len(cache.index)} 个文件)")
+    info(f"上游: {', '.join(cache.upstreams)}")
+    success(f"mirrorlist: Server = {server.url}/$repo/os/$arch")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stats = cache.summary()
+        info(f"命中 {stats['hit']}，下载 {stats['miss']}，重新验证 {stats['revalidated']}，"
+             f"淘汰 {stats['evicted']}，缓存 {stats['files']} 个文件 / {stats['size'] // 1024 // 1024} MiB")
+
+
+if __name__ == "__main__":
+    main()
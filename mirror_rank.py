@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+镜像测速模块
+在限定的时间内并发探测候选镜像: 先测 TCP 建连延迟，再下载 core.db 测首字节时间和吞吐量，
+按下载一个典型大小的包预计耗时排序，生成 mirrorlist 并给出合适的 ParallelDownloads。
+
+超出时间预算仍未完成的镜像视为失败，排在最后作为兜底
+"""
+
+import os
+import re
+import sys
+import time
+import socket
+import argparse
+import http.client
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# 导入日志模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from log import info, success, warning, section_header
+from mirror_proxy import DEFAULT_UPSTREAMS
+from pkg_plan import format_size
+
+CANDIDATE_MIRRORS = DEFAULT_UPSTREAMS + [
+    "https://mirrors.aliyun.com/archlinux",
+    "https://mirror.sjtu.edu.cn/archlinux",
+    "https://mirrors.nju.edu.cn/archlinux",
+]
+
+# 排序时按下载这么大的包估算耗时
+REFERENCE_SIZE = 2 * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class MirrorResult:
+    """单个镜像的测速结果，失败时 error 非空"""
+    url: str
+    connect: float = None       # TCP 建连耗时 (秒)
+    first_byte: float = None    # 发出请求到收到响应头 (秒)
+    throughput: float = None    # 字节/秒
+    downloaded: int = 0
+    error: str = ""
+
+    @property
+    def usable(self):
+        """测速是否成功"""
+        return not self.error and self.throughput is not None
+
+    @property
+    def score(self):
+        """下载 REFERENCE_SIZE 字节的预计耗时，越小越好"""
+        return self.first_byte + REFERENCE_SIZE / max(self.throughput, 1.0)
+
+
+def probe_mirror(url, deadline, repo="core", arch="x86_64", max_bytes=4 * 1024 * 1024):
+    """探测一个镜像，deadline 为 time.monotonic() 的截止时间"""
+    result = MirrorResult(url)
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+
+    try:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("超出时间预算")
+        start = time.monotonic()
+        with socket.create_connection((parts.hostname, port), timeout=remaining):
+            result.connect = time.monotonic() - start
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("超出时间预算")
+        start = time.monotonic()
+        with urllib.request.urlopen(f"{url.rstrip('/')}/{repo}/os/{arch}/{repo}.db",
+                                    timeout=remaining) as response:
+            read_start = time.monotonic()
+            result.first_byte = read_start - start
+            # 预算用完时按已下载的部分计算吞吐量；read1 收到数据即返回，慢速镜像不会拖过截止时间
+            while result.downloaded < max_bytes and time.monotonic() < deadline:
+                chunk = response.read1(CHUNK_SIZE)
+                if not chunk:
+                    break
+                result.downloaded += len(chunk)
+            elapsed = max(time.monotonic() - read_start, 1e-6)
+        if result.downloaded == 0:
+            raise ValueError("没有收到数据")
+        result.throughput = result.downloaded / elapsed
+    except (OSError, ValueError, urllib.error.URLError, http.client.HTTPException) as e:
+        # 返回非 HTTP 内容的服务器会引发 BadStatusLine 等 HTTPException
+        result.error = str(getattr(e, "reason", e)) or type(e).__name__
+    return result
+
+
+def rank_mirrors(mirrors=None, budget=5.0, max_bytes=4 * 1024 * 1024, repo="core", arch="x86_64"):
+    """并发测速并排序: 成功的按预计耗时升序，失败的保持原顺序排在后面；budget 为 0 时不测速"""
+    mirrors = [url.rstrip("/") for url in (mirrors or CANDIDATE_MIRRORS)]
+    if budget <= 0:
+        return [MirrorResult(url) for url in mirrors]
+    deadline = time.monotonic() + budget
+    pool = ThreadPoolExecutor(max_workers=max(1, len(mirrors)))
+    futures = {pool.submit(probe_mirror, url, deadline, repo, arch, max_bytes): url for url in mirrors}
+    done, _ = wait(futures, timeout=budget + 0.2)
+    # 不等待超时的探测线程，它们的每次读写都受同一截止时间限制
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for future, url in futures.items():
+        if future not in done:
+            results.append(MirrorResult(url, error="超出时间预算"))
+            continue
+        try:
+            results.append(future.result())
+        except Exception as e:
+            # 单个镜像的意外错误不影响其他镜像的排序
+            results.append(MirrorResult(url, error=str(e) or type(e).__name__))
+
+    usable = sorted((result for result in results if result.usable), key=lambda result: result.score)
+    return usable + [result for result in results if not result.usable]
+
+
+def suggest_parallel_downloads(results):
+    """单连接越慢，并行下载收益越大；没有可用镜像时返回 None"""
+    usable = [result for result in results if result.usable]
+    if not usable:
+        return None
+    best = usable[0].throughput
+    if best < 1024 * 1024:
+        return 10
+    if best < 5 * 1024 * 1024:
+        return 6
+    return 4
+
+
+def describe(result):
+    """测速结果的简短说明"""
+    if result.error:
+        return f"测速失败: {result.error}"
+    if not result.usable:
+        return "未测速"
+    return (f"建连 {result.connect * 1000:.0f} ms，首字节 {result.first_byte * 1000:.0f} ms，"
+            f"{format_size(result.throughput)}/s")
+
+
+def render_mirrorlist(results, proxy=""):
+    """生成 mirrorlist，代理 (如果有) 始终在第一行"""
+    lines = ["# 由 mirror_rank.py 按实测速度排序生成"]
+    if proxy:
+        lines.append(f"Server = {proxy.rstrip('/')}/$repo/os/$arch")
+    for result in results:
+        if result.error or result.usable:
+            lines.append(f"# {describe(result)}")
+        lines.append(f"Server = {result.url}/$repo/os/$arch")
+    return "\n".join(lines) + "\n"
+
+
+def set_parallel_downloads(pacman_conf, count):
+    """修改 pacman.conf 文本中的 ParallelDownloads，没有该项时加到 [options] 之后"""
+    text, replaced = re.subn(r'^#?\s*ParallelDownloads\s*=.*$', f"ParallelDownloads = {count}",
+                             pacman_conf, flags=re.M)
+    if replaced:
+        return text
+    return re.sub(r'^\[options\]\s*$', f"[options]\nParallelDownloads = {count}",
+                  pacman_conf, count=1, flags=re.M)
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="镜像测速排序")
+    parser.add_argument("--mirror", action="append", metavar="URL",
+                        help="候选镜像根地址 (可重复)，默认使用内置的国内镜像列表")
+    parser.add_argument("--budget", type=float, default=5.0, metavar="SEC",
+                        help="测速的总时间预算")
+    parser.add_argument("--max-bytes", type=int, default=4 * 1024 * 1024,
+                        help="每个镜像最多下载的字节数")
+    parser.add_argument("--proxy", default=os.environ.get("DOTFILES_MIRROR_PROXY", ""),
+                        help="本地缓存镜像代理，写在 mirrorlist 第一行")
+    parser.add_argument("--write", metavar="FILE",
+                        help="把排序后的 mirrorlist 写入文件，默认只输出结果")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    section_header("镜像测速")
+    start = time.monotonic()
+    results = rank_mirrors(args.mirror, args.budget, args.max_bytes)
+    for position, result in enumerate(results, 1):
+        (info if result.usable else warning)(f"{position}. {result.url}  {describe(result)}")
+    info(f"用时 {time.monotonic() - start:.2f}s，建议 ParallelDownloads = "
+         f"{suggest_parallel_downloads(results) or '不变'}")
+
+    if args.write:
+        with open(args.write, 'w') as f:
+            f.write(render_mirrorlist(results, args.proxy))
+        success(f"已写入 {args.write}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+pacman 数据库读取模块
+直接解析 /var/lib/pacman 下的数据库文件，避免逐个包调用 pacman
+"""
+
+import io
+import os
+import glob
+import json
+import shutil
+import tarfile
+import subprocess
+
+
+def parse_desc(text):
+    """解析 desc 文件内容，返回 {字段: [值, ...]}"""
+    fields = {}
+    current = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            current = None
+            continue
+
+        if line.startswith('%') and line.endswith('%'):
+            current = line[1:-1]
+            fields[current] = []
+        elif current is not None:
+            fields[current].append(line)
+
+    return fields
+
+
+def strip_version(dep):
+    """去掉依赖中的版本约束，如 'glibc>=2.38' -> 'glibc'"""
+    for op in ('>=', '<=', '=', '>', '<'):
+        if op in dep:
+            return dep.split(op, 1)[0]
+    return dep
+
+
+class LocalPackageIndex:
+    """已安装包索引 - 一次读取本地数据库，之后全部为集合查询"""
+
+    def __init__(self, db_path="/var/lib/pacman"):
+        self.local_dir = os.path.join(db_path, "local")
+        self.entries = {}      # 目录名 -> 包名
+        self.versions = {}     # 包名 -> 版本
+        self.provides = {}     # 虚拟包名 -> {提供者}
+        self.groups = {}       # 组名 -> {成员}
+        self.explicit = set()  # 显式安装的包
+        self.depends = {}      # 包名 -> [依赖名]
+
+    def available(self):
+        """本地数据库是否可读"""
+        return os.path.isdir(self.local_dir)
+
+    def load(self):
+        """读取全部本地数据库"""
+        self.entries.clear()
+        self.versions.clear()
+        self.provides.clear()
+        self.groups.clear()
+        self.explicit.clear()
+        self.depends.clear()
+        return self.refresh()
+
+    def refresh(self):
+        """增量刷新 - 只解析新增的目录，移除已删除的目录"""
+        try:
+            current = set(os.listdir(self.local_dir))
+        except OSError:
+            return False
+
+        for entry in set(self.entries) - current:
+            self._remove(entry)
+
+        for entry in current - set(self.entries):
+            desc_file = os.path.join(self.local_dir, entry, "desc")
+            try:
+                with open(desc_file, 'r', encoding='utf-8') as f:
+                    fields = parse_desc(f.read())
+            except OSError:
+                continue
+            self._add(entry, fields)
+
+        return True
+
+    def _add(self, entry, fields):
+        """加入一个包"""
+        name = fields.get('NAME', [None])[0]
+        if not name:
+            return
+
+        self.entries[entry] = name
+        self.versions[name] = fields.get('VERSION', [''])[0]
+        self.depends[name] = [strip_version(dep) for dep in fields.get('DEPENDS', [])]
+
+        for provide in fields.get('PROVIDES', []):
+            self.provides.setdefault(strip_version(provide), set()).add(name)
+
+        for group in fields.get('GROUPS', []):
+            self.groups.setdefault(group, set()).add(name)
+
+        # REASON 为 1 表示作为依赖安装，缺省为显式安装
+        if fields.get('REASON', ['0'])[0] != '1':
+            self.explicit.add(name)
+
+    def _remove(self, entry):
+        """移除一个包"""
+        name = self.entries.pop(entry)
+        self.versions.pop(name, None)
+        self.depends.pop(name, None)
+        self.explicit.discard(name)
+
+        for table in (self.provides, self.groups):
+            for key in list(table):
+                table[key].discard(name)
+                if not table[key]:
+                    del table[key]
+
+    def is_installed(self, pkg_name, group_members=None):
+        """包名、虚拟包或组是否已满足
+
+        本地数据库只记录已安装的组成员，无法判断组是否完整；group_members 为同步数据库中
+        该组的全部成员，全部已安装才视为满足，否则交给 pacman --needed 判断
+        """
+        if pkg_name in self.versions or pkg_name in self.provides:
+            return True
+        return bool(group_members) and all(member in self.versions for member in group_members)
+
+    def __len__(self):
+        return len(self.versions)
+
+
+class SyncDatabase:
+    """同步数据库索引 - 读取 sync/*.db 一次并缓存到磁盘
+
+    分类结果:
+        repo    - 官方/第三方仓库中的包
+        group   - 包组
+        provide - 虚拟包 (由其他包提供)
+        aur     - 本地同步数据库中不存在，只能从 AUR 获取
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self, db_path="/var/lib/pacman",
+                 cache_file=os.path.expanduser("~/.cache/dotfiles/syncdb.json"),
+                 pacman_conf="/etc/pacman.conf"):
+        self.sync_dir = os.path.join(db_path, "sync")
+        self.cache_file = cache_file
+        self.pacman_conf = pacman_conf
+        self.packages = {}   # 包名 -> 元数据
+        self.provides = {}   # 虚拟包名 -> [提供者]
+        self.groups = {}     # 组名 -> [成员]
+
+    # ==================== 加载模块 ====================
+    def repo_order(self):
+        """按 pacman.conf 中的顺序列出仓库名"""
+        repos = []
+        try:
+            with open(self.pacman_conf, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('[') and line.endswith(']') and line != '[options]':
+                        repos.append(line[1:-1])
+        except OSError:
+            pass
+        return repos
+
+    def db_files(self):
+        """列出全部同步数据库文件，同名包以靠前的仓库为准"""
+        files = glob.glob(os.path.join(self.sync_dir, "*.db"))
+        order = self.repo_order()
+
+        def priority(path):
+            repo = os.path.basename(path)[:-len(".db")]
+            return (order.index(repo) if repo in order else len(order), repo)
+
+        return sorted(files, key=priority)
+
+    def signature(self):
+        """同步数据库的指纹 (路径、大小、修改时间)"""
+        sig = []
+        for path in self.db_files():
+            stat = os.stat(path)
+            sig.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        return sig
+
+    def load(self):
+        """加载索引，优先使用缓存"""
+        signature = self.signature()
+        if not signature:
+            return False
+
+        if self.load_cache(signature):
+            return True
+
+        self.packages.clear()
+        for path in self.db_files():
+            repo = os.path.basename(path)[:-len(".db")]
+            self.load_repo(repo, path)
+
+        self.build_lookup_tables()
+        self.save_cache(signature)
+        return True
+
+    def open_db(self, path):
+        """打开数据库压缩包，zstd 压缩时借助 zstd 命令解压"""
+        try:
+            return tarfile.open(path, "r:*")
+        except tarfile.ReadError:
+            if not shutil.which("zstd"):
+                raise
+            data = subprocess.run(["zstd", "-dc", path], capture_output=True, check=True).stdout
+            return tarfile.open(fileobj=io.BytesIO(data), mode="r:")
+
+    def load_repo(self, repo, path):
+        """解析单个仓库数据库"""
+        try:
+            archive = self.open_db(path)
+        except (tarfile.TarError, OSError, subprocess.CalledProcessError):
+            return
+
+        with archive:
+            for member in archive:
+                if not member.isfile() or not member.name.endswith("/desc"):
+                    continue
+                text = archive.extractfile(member).read().decode('utf-8', 'replace')
+                fields = parse_desc(text)
+                name = fields.get('NAME', [None])[0]
+                # 多个仓库存在同名包时，以 pacman.conf 中靠前的为准
+                if not name or name in self.packages:
+                    continue
+                self.packages[name] = {
+                    'repo': repo,
+                    'version': fields.get('VERSION', [''])[0],
+                    'filename': fields.get('FILENAME', [''])[0],
+                    'csize': int(fields.get('CSIZE', ['0'])[0]),
+                    'isize': int(fields.get('ISIZE', ['0'])[0]),
+                    'depends': fields.get('DEPENDS', []),
+                    'provides': fields.get('PROVIDES', []),
+                    'groups': fields.get('GROUPS', []),
+                }
+
+    def build_lookup_tables(self):
+        """建立虚拟包和包组查找表"""
+        self.provides.clear()
+        self.groups.clear()
+        for name, meta in self.packages.items():
+            for provide in meta['provides']:
+                self.provides.setdefault(strip_version(provide), []).append(name)
+            for group in meta['groups']:
+                self.groups.setdefault(group, []).append(name)
+
+    def load_cache(self, signature):
+        """读取缓存，指纹不一致时视为失效"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if cache.get('version') != self.CACHE_VERSION or cache.get('signature') != signature:
+            return False
+
+        self.packages = cache['packages']
+        self.build_lookup_tables()
+        return True
+
+    def save_cache(self, signature):
+        """写入缓存，失败时忽略"""
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': self.CACHE_VERSION,
+                    'signature': signature,
+                    'packages': self.packages,
+                }, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            pass
+
+    # ==================== 查询模块 ====================
+    def classify(self, pkg_name):
+        """判断包来源: repo / group / provide / aur"""
+        if pkg_name in self.packages:
+            return "repo"
+        if pkg_name in self.groups:
+            return "group"
+        if strip_version(pkg_name) in self.provides:
+            return "provide"
+        return "aur"
+
+    def is_repo_target(self, pkg_name):
+        """是否可以直接交给 pacman 安装"""
+        return self.classify(pkg_name) != "aur"
+
+    def resolve(self, pkg_name):
+        """把条目解析为具体的包名列表"""
+        kind = self.classify(pkg_name)
+        if kind == "repo":
+            return [pkg_name]
+        if kind == "group":
+            return list(self.groups[pkg_name])
+        if kind == "provide":
+            return self.provides[strip_version(pkg_name)][:1]
+        return []
+
+    def __len__(self):
+        return len(self.packages)
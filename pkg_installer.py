@@ -6,23 +6,60 @@
 import os
 import sys
 import subprocess
+import shlex
+import shutil
 import signal
+import argparse
+import contextlib
 import tempfile
 import time
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入日志模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from log import info, success, warning, error, section_header, package_start, package_update
+from log import package_skip, package_done, package_fail, package_progress
+from pacman_db import LocalPackageIndex, SyncDatabase
+from aur_builder import AurBuildPool
+from aur_cache import BinaryPackageCache
+from journal import InstallJournal, fingerprint_file
+from stream_runner import run_streaming
+from duration_history import DurationHistory
+from pkg_plan import PackagePlanner
+from pkg_reconcile import PackageReconciler
+from hardware import HardwareProbe, split_section_header, parse_overrides
 
 class PackageInstaller:
     """包安装管理器"""
 
     def __init__(self):
         self.interrupted = False
+        self.last_progress_time = 0.0
         self.default_timeout = 200
         self.manager = "paru"
         self.run_as_root = False
+        self.config_file = os.path.join("lib", "pkgs.conf")
+        self.db_path = "/var/lib/pacman"
+        self.package_index = None
+        self.sync_db = None
+        self.batch_mode = False
+        self.aur_jobs = 1
+        self.aur_mem_cap_mb = 0
+        self.aur_cache_dir = None
+        self.aur_cache_size_mb = 4096
+        self.aur_cache = None
+        self.history = None
+        self.journal = None
+        self.journal_file = os.path.expanduser("~/.cache/dotfiles/pkg_journal.jsonl")
+        self.from_scratch = False
+        self.pipeline = False
+        self.prefetch_jobs = 2
+        self.prefetch_depth = 2
+        self.cache_dir = "/var/cache/pacman/pkg"
+        self.prefetch_cache_dir = None
+        self.cache_reserve_mb = 1024
+        self.hardware = HardwareProbe()
 
         # 注册信号处理器
         signal.signal(signal.SIGINT, self.handle_interrupt)
@@ -32,6 +69,9 @@ class PackageInstaller:
         """处理中断信号"""
         error("检测到中断信号 (Ctrl+C)，正在退出...")
         self.interrupted = True
+        if self.journal is not None:
+            self.journal.close()
+            info("进度已记录，重新运行将从中断处继续 (使用 --from-scratch 从头开始)")
         sys.exit(1)
 
     def check_interrupted(self):
@@ -46,8 +86,62 @@ class PackageInstaller:
         """检查root权限"""
         return os.geteuid() == 0
 
+    def load_package_index(self):
+        """一次性读取本地数据库，建立已安装包索引"""
+        index = LocalPackageIndex(self.db_path)
+        if not index.available() or not index.load():
+            warning("无法读取本地包数据库，回退到逐个 pacman -Q 查询")
+            self.package_index = None
+            return False
+
+        self.package_index = index
+        info(f"已安装包索引: {len(index)} 个包")
+        return True
+
+    def load_sync_database(self):
+        """读取同步数据库，用于区分仓库包和 AUR 包"""
+        sync_db = SyncDatabase(self.db_path)
+        if not sync_db.load():
+            warning("无法读取同步数据库，所有包交给 " + self.manager)
+            self.sync_db = None
+            return False
+
+        self.sync_db = sync_db
+        info(f"同步数据库索引: {len(sync_db)} 个包")
+        return True
+
+    def is_repo_package(self, pkg_name):
+        """是否为仓库包 (含包组和虚拟包)"""
+        return self.sync_db is not None and self.sync_db.is_repo_target(pkg_name)
+
+    def refresh_package_index(self):
+        """事务成功后增量刷新索引"""
+        if self.package_index is not None:
+            self.package_index.refresh()
+
+    def check_package_finished(self, pkg_name):
+        """日志记录已完成或已安装 - 日志命中时不再查询 pacman"""
+        if self.journal is not None and self.journal.is_finished(pkg_name):
+            return True
+        return self.check_package_installed(pkg_name)
+
+    def record_result(self, section_name, pkg_name, status, duration=None):
+        """写入安装日志和耗时历史
+
+        duration 为 None 表示没有该包单独的耗时 (如多包事务)，不写入历史，
+        否则平摊的耗时会把慢包的超时压低
+        """
+        if self.journal is not None:
+            self.journal.record(section_name, pkg_name, status, duration or 0.0)
+        if self.history is not None and status == "DONE" and duration is not None:
+            self.history.record(pkg_name, duration)
+
     def check_package_installed(self, pkg_name):
         """检查包是否已安装"""
+        if self.package_index is not None:
+            group_members = self.sync_db.groups.get(pkg_name) if self.sync_db is not None else None
+            return self.package_index.is_installed(pkg_name, group_members)
+
         try:
             result = subprocess.run(
                 ["pacman", "-Q", pkg_name],
@@ -66,27 +160,76 @@ class PackageInstaller:
             return False
         return True
 
+    # ==================== 超时模块 ====================
+    def load_history(self):
+        """读取耗时历史，用于计算每个包的超时"""
+        self.history = DurationHistory(default_timeout=self.default_timeout)
+        self.history.load()
+
+    def package_timeout(self, pkg_names):
+        """一个或一组包的超时时间 - 各包超时之和
+
+        没有同步数据库时无法区分 AUR 包，按仓库包的默认超时计算
+        """
+        if isinstance(pkg_names, str):
+            pkg_names = [pkg_names]
+        if self.history is None:
+            return self.default_timeout * len(pkg_names)
+
+        return sum(self.history.timeout_for(
+            name, is_aur=self.sync_db is not None and not self.is_repo_package(name))
+            for name in pkg_names)
+
+    def report_history(self):
+        """保存耗时历史并报告异常耗时的包"""
+        if self.history is None:
+            return
+
+        self.history.save()
+        for pkg_name, duration, median in self.history.outliers:
+            warning(f"耗时异常: {pkg_name} 用时 {duration:.0f} 秒 (历史中位数 {median:.0f} 秒)")
+
     # ==================== 命令执行模块 ====================
-    def run_with_timeout(self, cmd, timeout=None):
-        """带超时的命令执行"""
+    def run_with_timeout(self, cmd, timeout=None, show_progress=True):
+        """带超时的命令执行 - 流式读取输出，只保留末尾用于错误报告"""
         if timeout is None:
             timeout = self.default_timeout
 
         try:
-            result = subprocess.run(
+            result = run_streaming(
                 cmd,
-                shell=True,
                 timeout=timeout,
-                capture_output=True,
-                text=True
+                on_progress=self.show_progress if show_progress else None
             )
-            return result.returncode == 0, result.stderr
-        except subprocess.TimeoutExpired:
-            return False, f"命令执行超时 ({timeout} 秒)"
         except Exception as e:
             return False, str(e)
 
+        if result.timed_out:
+            return False, f"命令执行超时 ({timeout} 秒)"
+        if result.returncode != 0:
+            return False, result.stderr_tail or result.stdout_tail
+        return True, result.stderr_tail
+
+    def show_progress(self, progress):
+        """把进度显示在当前包行上，限制刷新频率"""
+        now = time.monotonic()
+        if now - self.last_progress_time < 0.1 and not progress.endswith("100%"):
+            return
+        self.last_progress_time = now
+        package_progress(progress)
+
     # ==================== 包命令构建模块 ====================
+    def as_root(self, cmd):
+        """需要 root 权限的命令"""
+        return cmd if self.run_as_root else "sudo " + cmd
+
+    def cache_options(self):
+        """流水线模式下 pacman -S 同时查找预取目录，新下载仍写入主缓存"""
+        if not self.prefetch_cache_dir:
+            return ""
+        return (f"--cachedir {shlex.quote(self.cache_dir)} "
+                f"--cachedir {shlex.quote(self.prefetch_cache_dir)} ")
+
     def build_install_command(self, pkg_name):
         """构建安装命令"""
         # 特殊处理 archlinuxcn-keyring
@@ -96,16 +239,29 @@ class PackageInstaller:
             else:
                 return "sudo pacman -Sy --noconfirm archlinuxcn-keyring"
 
-        if self.manager == "pacman":
+        # 仓库包直接使用 pacman，AUR 助手只负责 AUR 包
+        if self.manager == "pacman" or self.is_repo_package(pkg_name):
             if self.run_as_root:
-                return f"pacman -S --noconfirm {pkg_name}"
+                return f"pacman -S {self.cache_options()}--noconfirm {pkg_name}"
             else:
-                return f"sudo pacman -S --noconfirm {pkg_name}"
+                return f"sudo pacman -S {self.cache_options()}--noconfirm {pkg_name}"
         elif self.manager == "yay":
             return f"yay -S --noconfirm {pkg_name}"
         else:  # 默认使用 paru
             return f"paru -S --noconfirm --skipreview {pkg_name}"
 
+    def build_batch_command(self, pkg_names, manager=None):
+        """构建批量安装命令 - 一次事务安装多个包"""
+        targets = " ".join(pkg_names)
+        manager = manager or self.manager
+
+        if manager == "pacman":
+            return self.as_root(f"pacman -S --needed {self.cache_options()}--noconfirm {targets}")
+        elif manager == "yay":
+            return f"yay -S --needed --noconfirm {targets}"
+        else:  # 默认使用 paru
+            return f"paru -S --needed --noconfirm --skipreview {targets}"
+
     # ==================== 配置解析模块 ====================
     def parse_config_file(self, config_file):
         """解析配置文件"""
@@ -124,9 +280,12 @@ class PackageInstaller:
                     if not line or line.startswith('#'):
                         continue
 
-                    # 检测部分头
+                    # 检测部分头，条件不满足的部分整体跳过
                     if line.startswith('[') and line.endswith(']'):
-                        current_section = line[1:-1].strip()
+                        current_section, conditions = split_section_header(line[1:-1])
+                        if not self.section_enabled(current_section, conditions):
+                            current_section = None
+                            continue
                         sections[current_section] = []
                     elif current_section is not None:
                         # 跳过被注释的命令
@@ -142,6 +301,19 @@ class PackageInstaller:
 
         return sections
 
+    def section_enabled(self, section_name, conditions):
+        """部分头中的硬件条件是否满足，未知条件视为满足"""
+        if not conditions:
+            return True
+        try:
+            if self.hardware.matches(conditions):
+                return True
+        except ValueError as e:
+            warning(f"{section_name}: {e}，按满足处理")
+            return True
+        info(f"跳过部分 {section_name} (条件 {' '.join(conditions)} 不满足)")
+        return False
+
     def parse_package_line(self, cmd_line):
         """解析包命令行"""
         if '#' in cmd_line:
@@ -155,21 +327,26 @@ class PackageInstaller:
         return pkg_name, comment
 
     # ==================== 包安装处理模块 ====================
-    def install_single_package(self, index, total, pkg_name, comment=""):
+    def install_single_package(self, index, total, pkg_name, comment="", section_name=""):
         """安装单个包"""
         # 显示开始安装状态
         package_start(index, total, pkg_name, comment)
 
         # 检查包是否已安装
-        if self.check_package_installed(pkg_name):
+        if self.check_package_finished(pkg_name):
+            self.record_result(section_name, pkg_name, "SKIP")
             package_update("SKIP")
             return True
 
         # 构建并执行安装命令
         install_cmd = self.build_install_command(pkg_name)
-        success, error_msg = self.run_with_timeout(install_cmd)
+        start = time.monotonic()
+        success, error_msg = self.run_with_timeout(install_cmd, self.package_timeout(pkg_name))
+        duration = time.monotonic() - start
 
         if success:
+            self.refresh_package_index()
+            self.record_result(section_name, pkg_name, "DONE", duration)
             package_update("DONE")
             return True
         else:
@@ -177,30 +354,417 @@ class PackageInstaller:
                 error(f"命令被中断: {pkg_name}")
                 return False
 
+            self.record_result(section_name, pkg_name, "FAIL", duration)
             package_update("FAIL", error_msg)
             return False
 
+    def install_batch(self, pkg_names, manager=None):
+        """批量安装，失败时二分查找出错的包
+
+        返回 {包名: (是否成功, 错误信息)}
+        """
+        if self.check_interrupted():
+            return {name: (False, "操作被用户中断") for name in pkg_names}
+
+        ok, error_msg = self.run_with_timeout(
+            self.build_batch_command(pkg_names, manager),
+            self.package_timeout(pkg_names)
+        )
+        self.refresh_package_index()
+
+        if ok:
+            return {name: (True, "") for name in pkg_names}
+
+        if len(pkg_names) == 1:
+            return {pkg_names[0]: (False, error_msg)}
+
+        # 部分包可能已在失败的事务中装上 (如 AUR 助手分阶段安装)
+        results = {}
+        remaining = []
+        for name in pkg_names:
+            if self.check_package_installed(name):
+                results[name] = (True, "")
+            else:
+                remaining.append(name)
+
+        if len(remaining) == len(pkg_names):
+            middle = len(remaining) // 2
+            info(f"批量安装失败，拆分为 {middle} + {len(remaining) - middle} 个包重试")
+            results.update(self.install_batch(remaining[:middle], manager))
+            results.update(self.install_batch(remaining[middle:], manager))
+        elif remaining:
+            results.update(self.install_batch(remaining, manager))
+
+        return results
+
+    # ==================== AUR 并行构建模块 ====================
+    def install_built_package(self, pkg_name, files):
+        """安装队列 - 串行安装构建好的包"""
+        targets = " ".join(shlex.quote(path) for path in files)
+        ok, error_msg = self.run_with_timeout(self.as_root(f"pacman -U --needed --noconfirm {targets}"))
+        if ok:
+            self.refresh_package_index()
+        return ok, error_msg
+
+    def lookup_aur_cache(self, plan):
+        """查询二进制缓存，返回 (命中的产物, 构建键)"""
+        if self.aur_cache is None:
+            if self.aur_cache_dir:
+                self.aur_cache = BinaryPackageCache(self.aur_cache_dir, self.aur_cache_size_mb)
+            else:
+                self.aur_cache = BinaryPackageCache(max_size_mb=self.aur_cache_size_mb)
+
+        prebuilt = {}
+        keys = {}
+        for name, (pkg_dir, _) in plan.items():
+            keys[name] = self.aur_cache.build_key(pkg_dir)
+            files = self.aur_cache.lookup(name, keys[name])
+            if files:
+                prebuilt[name] = files
+        return prebuilt, keys
+
+    def report_aur_cache(self):
+        """输出二进制缓存命中统计"""
+        if self.aur_cache is None:
+            return
+
+        summary = self.aur_cache.summary()
+        total = len(summary['hits']) + len(summary['misses'])
+        if not total:
+            return
+        info(f"AUR 二进制缓存: 命中 {len(summary['hits'])}/{total}，"
+             f"缓存占用 {summary['size_mb']:.1f} MB ({self.aur_cache.cache_dir})")
+        if summary['misses']:
+            info(f"  未命中: {' '.join(summary['misses'])}")
+
+    def use_aur_pool(self):
+        """是否使用 AUR 构建池 - 并行构建或指定了二进制缓存时启用
+
+        二进制缓存只在构建池中查询和写入，AUR 助手 (paru/yay) 自行构建的包不经过缓存
+        """
+        return self.aur_jobs > 1 or bool(self.aur_cache_dir)
+
+    def install_aur_packages(self, pkg_names, durations=None):
+        """AUR 包并行构建，构建产物串行安装
+
+        durations - 传入时写入构建池构建的每个包的耗时 (构建 + 安装)
+        返回 {包名: (是否成功, 错误信息)}
+        """
+        pool = AurBuildPool(jobs=self.aur_jobs, mem_cap_mb=self.aur_mem_cap_mb)
+        pool.timeouts = {name: self.package_timeout(name) for name in pkg_names}
+        results = {}
+
+        # 获取 PKGBUILD
+        sources = {}
+        for name in pkg_names:
+            pkg_dir, error_msg = pool.fetch(name)
+            if pkg_dir is None:
+                results[name] = (False, error_msg)
+            else:
+                sources[name] = (pkg_dir, pool.read_srcinfo(pkg_dir))
+
+        # 拆分包名 -> 请求的目标
+        providers = {}
+        for name, (_, srcinfo) in sources.items():
+            for pkgname in srcinfo['pkgnames'] or [name]:
+                providers[pkgname] = name
+
+        # 依赖分类: 其他 AUR 目标 / 仓库依赖 / 无法处理
+        plan = {}
+        repo_deps = set()
+        fallback = []
+        for name, (pkg_dir, srcinfo) in sources.items():
+            aur_deps = set()
+            resolvable = True
+            for dep in srcinfo['depends'] + srcinfo['makedepends'] + srcinfo['checkdepends']:
+                if dep in providers:
+                    if providers[dep] != name:
+                        aur_deps.add(providers[dep])
+                elif self.check_package_installed(dep):
+                    continue
+                elif self.is_repo_package(dep):
+                    repo_deps.add(dep)
+                else:
+                    resolvable = False
+            if resolvable:
+                plan[name] = (pkg_dir, aur_deps)
+            else:
+                fallback.append(name)
+
+        # 依赖了交给 AUR 助手的包时，构建池等不到依赖的结果，一并交给 AUR 助手
+        outside = set(fallback)
+        changed = True
+        while changed:
+            changed = False
+            for name, (_, aur_deps) in list(plan.items()):
+                if aur_deps & outside:
+                    del plan[name]
+                    fallback.append(name)
+                    outside.add(name)
+                    changed = True
+
+        # 仓库依赖一次装完，之后构建过程不再需要 pacman 锁
+        if repo_deps:
+            info(f"安装 {len(repo_deps)} 个构建依赖")
+            targets = " ".join(sorted(repo_deps))
+            ok, error_msg = self.run_with_timeout(
+                self.as_root(f"pacman -S --needed --asdeps {self.cache_options()}--noconfirm {targets}")
+            )
+            self.refresh_package_index()
+            if not ok:
+                warning(f"构建依赖安装失败，交给 {self.manager} 处理")
+                fallback.extend(plan)
+                plan = {}
+
+        if plan:
+            prebuilt, keys = self.lookup_aur_cache(plan)
+            if prebuilt:
+                info(f"二进制缓存命中 {len(prebuilt)} 个包: {' '.join(prebuilt)}")
+
+            def install(name, files):
+                # 新构建的产物先入缓存再安装
+                if self.aur_cache is not None and name not in prebuilt:
+                    self.aur_cache.store(name, keys[name], files)
+                start = time.monotonic()
+                result = self.install_built_package(name, files)
+                if durations is not None and name in pool.durations:
+                    durations[name] = pool.durations[name] + time.monotonic() - start
+                return result
+
+            info(f"并行构建 {len(plan) - len(prebuilt)} 个 AUR 包 (并行数 {pool.jobs})")
+            results.update(pool.run(plan, install, on_event=info, prebuilt=prebuilt))
+
+        # 依赖了未列出的 AUR 包，交给 AUR 助手解决
+        if fallback:
+            info(f"{len(fallback)} 个包交给 {self.manager}: {' '.join(fallback)}")
+            results.update(self.install_batch(fallback))
+
+        return results
+
+    def process_section_batch(self, section_name, commands):
+        """批量处理单个配置部分 - 所有缺失的包在一个事务中安装"""
+        total_commands = len(commands)
+
+        entries = []
+        for index, cmd_line in enumerate(commands, 1):
+            pkg_name, comment = self.parse_package_line(cmd_line)
+            if pkg_name:
+                entries.append((index, pkg_name, comment))
+
+        missing = [pkg_name for _, pkg_name, _ in entries
+                   if not self.check_package_finished(pkg_name)]
+
+        # 仓库包交给 pacman 一次装完，剩余的交给 AUR 助手
+        repo_targets = [name for name in missing if self.is_repo_package(name)]
+        aur_targets = [name for name in missing if name not in repo_targets]
+
+        results = {}
+        durations = {}
+
+        def timed(targets, install):
+            # 只有单包事务的耗时属于该包，多包事务不记录耗时
+            start = time.monotonic()
+            results.update(install())
+            if len(targets) == 1:
+                durations[targets[0]] = time.monotonic() - start
+
+        if repo_targets:
+            info(f"批量安装 {len(repo_targets)} 个仓库包: {' '.join(repo_targets)}")
+            timed(repo_targets, lambda: self.install_batch(repo_targets, "pacman"))
+        if aur_targets and self.use_aur_pool() and self.sync_db is not None:
+            # 构建池自己记录每个包的构建耗时，缓存命中的包不记录
+            results.update(self.install_aur_packages(aur_targets, durations))
+        elif aur_targets:
+            info(f"批量安装 {len(aur_targets)} 个包 ({self.manager}): {' '.join(aur_targets)}")
+            timed(aur_targets, lambda: self.install_batch(aur_targets))
+
+        # 按原顺序输出每个包的最终结果
+        for index, pkg_name, comment in entries:
+            if pkg_name not in results:
+                self.record_result(section_name, pkg_name, "SKIP")
+                package_skip(index, total_commands, pkg_name, comment)
+                continue
+
+            ok, error_msg = results[pkg_name]
+            self.record_result(section_name, pkg_name, "DONE" if ok else "FAIL", durations.get(pkg_name))
+            if ok:
+                package_done(index, total_commands, pkg_name, comment)
+            else:
+                package_fail(index, total_commands, pkg_name, comment, error_msg or "安装失败")
+
     def process_section(self, section_name, commands):
-        """处理单个配置部分"""
+        """处理单个配置部分，结束时 (包括中断) 保存耗时历史，与安装日志一样按部分落盘"""
         total_commands = len(commands)
 
         # 显示部分标题
         section_header(section_name, self.manager)
 
-        for index, cmd_line in enumerate(commands, 1):
-            # 检查是否中断
-            if self.check_interrupted():
+        try:
+            if self.batch_mode or self.use_aur_pool():
+                self.process_section_batch(section_name, commands)
                 return
 
-            # 解析包信息
-            pkg_name, comment = self.parse_package_line(cmd_line)
+            for index, cmd_line in enumerate(commands, 1):
+                # 检查是否中断
+                if self.check_interrupted():
+                    return
+
+                # 解析包信息
+                pkg_name, comment = self.parse_package_line(cmd_line)
+
+                # 跳过空行
+                if not pkg_name:
+                    continue
+
+                # 安装包
+                self.install_single_package(index, total_commands, pkg_name, comment, section_name)
+        finally:
+            if self.history is not None:
+                self.history.save()
+
+    # ==================== 下载预取模块 ====================
+    def section_repo_targets(self, commands):
+        """列出某个部分中尚未安装的仓库包"""
+        targets = []
+        for cmd_line in commands:
+            pkg_name, _ = self.parse_package_line(cmd_line)
+            if pkg_name and self.is_repo_package(pkg_name) and not self.check_package_finished(pkg_name):
+                targets.append(pkg_name)
+        return targets
+
+    def prefetch_size(self, targets):
+        """估算下载大小 (字节)，依赖不计入"""
+        total = 0
+        for pkg_name in targets:
+            for name in self.sync_db.resolve(pkg_name):
+                total += self.sync_db.packages[name]['csize']
+        return total
+
+    def check_cache_space(self, targets):
+        """检查缓存目录剩余空间是否足够"""
+        try:
+            free = shutil.disk_usage(self.cache_dir).free
+        except OSError:
+            return False
+        return self.prefetch_size(targets) + self.cache_reserve_mb * 1024 * 1024 <= free
+
+    def create_prefetch_dbpath(self):
+        """预取使用独立的 dbpath，锁文件与正在安装的 pacman 互不干扰"""
+        dbpath = tempfile.mkdtemp(prefix="dotfiles-prefetch-")
+        os.symlink(os.path.join(self.db_path, "local"), os.path.join(dbpath, "local"))
+        os.symlink(os.path.join(self.db_path, "sync"), os.path.join(dbpath, "sync"))
+        return dbpath
+
+    def open_prefetch_cache(self):
+        """创建预取目录 (主缓存下的子目录)
+
+        预取只写入这个目录，与正在安装的事务不共用下载目录；安装命令通过 cache_options
+        额外查找这里的包
+        """
+        prefetch_dir = os.path.join(self.cache_dir, "prefetch")
+        ok, _ = self.run_with_timeout(self.as_root(f"install -d {shlex.quote(prefetch_dir)}"),
+                                      show_progress=False)
+        if ok:
+            self.prefetch_cache_dir = prefetch_dir
+        return ok
+
+    def close_prefetch_cache(self):
+        """把预取的包移入主缓存并删除预取目录"""
+        prefetch_dir, cache_dir = shlex.quote(self.prefetch_cache_dir), shlex.quote(self.cache_dir)
+        script = (f"find {prefetch_dir} -maxdepth 1 -name '*.pkg.tar*' ! -name '*.part' "
+                  f"-exec mv -f -t {cache_dir} {{}} +; rm -rf {prefetch_dir}")
+        self.run_with_timeout(self.as_root(f"sh -c {shlex.quote(script)}"), show_progress=False)
+        self.prefetch_cache_dir = None
+
+    def prefetch(self, dbpath, targets):
+        """下载到预取目录 (在工作线程中运行)，返回 (开始时间, 结束时间, 是否成功)
+
+        主缓存列在预取目录之后，只用于查找已下载的包
+        """
+        start = time.monotonic()
+        cmd = (f"pacman -Sw --needed --noconfirm --dbpath {shlex.quote(dbpath)} "
+               f"--cachedir {shlex.quote(self.prefetch_cache_dir)} "
+               f"--cachedir {shlex.quote(self.cache_dir)} {' '.join(targets)}")
+        ok, _ = self.run_with_timeout(self.as_root(cmd), self.package_timeout(targets),
+                                      show_progress=False)
+        return start, time.monotonic(), ok
+
+    def pkginstall_pipelined(self, sections):
+        """流水线安装 - 安装当前部分时预取后续部分；无法创建预取目录时返回 False"""
+        items = [(name, commands) for name, commands in sections.items() if commands]
+        if not self.open_prefetch_cache():
+            warning("无法创建预取目录，按顺序安装")
+            return False
+        dbpath = self.create_prefetch_dbpath()
+        executor = ThreadPoolExecutor(max_workers=max(1, self.prefetch_jobs))
+        futures = {}
+        install_spans = []
+        wait_time = 0.0
 
-            # 跳过空行
-            if not pkg_name:
-                continue
+        try:
+            for position, (section_name, commands) in enumerate(items):
+                if self.check_interrupted():
+                    break
+
+                # 提交后续部分的预取
+                for ahead in range(position + 1, min(position + 1 + self.prefetch_depth, len(items))):
+                    if ahead in futures:
+                        continue
+                    targets = self.section_repo_targets(items[ahead][1])
+                    if not targets:
+                        futures[ahead] = None
+                    elif not self.check_cache_space(targets):
+                        warning(f"缓存空间不足，跳过预取: {items[ahead][0]}")
+                        futures[ahead] = None
+                    else:
+                        futures[ahead] = executor.submit(self.prefetch, dbpath, targets)
+
+                # 等待本部分的预取完成，避免重复下载
+                future = futures.get(position)
+                if future is not None and not future.done():
+                    start = time.monotonic()
+                    future.result()
+                    wait_time += time.monotonic() - start
+
+                start = time.monotonic()
+                self.process_section(section_name, commands)
+                install_spans.append((start, time.monotonic()))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(dbpath, ignore_errors=True)
+            self.close_prefetch_cache()
+
+        self.report_prefetch(futures, install_spans, wait_time)
+        return True
 
-            # 安装包
-            self.install_single_package(index, total_commands, pkg_name, comment)
+    def report_prefetch(self, futures, install_spans, wait_time):
+        """统计被安装过程掩盖的下载时间"""
+        records = [future.result() for future in futures.values()
+                   if future is not None and future.done() and not future.cancelled()]
+        if not records:
+            return
+
+        download_time = sum(end - start for start, end, _ in records)
+        hidden = 0.0
+        for start, end, _ in records:
+            for span_start, span_end in install_spans:
+                hidden += max(0.0, min(end, span_end) - max(start, span_start))
+
+        failed = sum(1 for _, _, ok in records if not ok)
+        info(f"预取 {len(records)} 个部分 (失败 {failed})，下载耗时 {download_time:.1f} 秒，"
+             f"其中 {hidden:.1f} 秒与安装重叠，等待预取 {wait_time:.1f} 秒")
+
+    # ==================== 安装日志模块 ====================
+    def open_journal(self, config_file):
+        """打开安装日志，恢复上次未完成的进度"""
+        journal = InstallJournal(self.journal_file)
+        if not journal.open(fingerprint_file(config_file), self.from_scratch):
+            warning("无法打开安装日志，不记录进度")
+            return
+
+        self.journal = journal
+        if journal.finished:
+            info(f"从安装日志恢复: {len(journal.finished)} 个包已完成 (使用 --from-scratch 从头开始)")
 
     # ==================== 主安装模块 ====================
     def pkginstall(self, config_file):
@@ -221,6 +785,24 @@ class PackageInstaller:
             warning("配置文件中没有找到有效的部分")
             return
 
+        self.open_journal(config_file)
+        try:
+            self.install_sections(sections)
+            # 没有失败也没有中断时标记完成，日志只用于从中断处继续
+            if self.journal is not None and not self.interrupted and not self.journal.failures:
+                self.journal.complete()
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+
+    def install_sections(self, sections):
+        """依次处理每个部分"""
+        if self.pipeline:
+            if self.sync_db is None:
+                warning("没有同步数据库索引，无法预取，按顺序安装")
+            elif self.pkginstall_pipelined(sections):
+                return
+
         # 处理每个部分
         for section_name, commands in sections.items():
             if self.check_interrupted():
@@ -262,14 +844,51 @@ class PackageInstaller:
             if not self.run_as_root:
                 cmd = "sudo " + cmd
 
-            success, error_msg = self.run_with_timeout(cmd)
-            if success:
+            ok, error_msg = self.run_with_timeout(cmd)
+            if ok:
+                self.refresh_package_index()
                 success("archlinuxcn-keyring 安装成功")
             else:
                 error(f"archlinuxcn-keyring 安装失败: {error_msg}")
                 return False
         return True
 
+    # ==================== 安装计划模块 ====================
+    def plan(self, as_json=False):
+        """离线输出安装计划，不执行任何事务"""
+        # JSON 模式下 stdout 只输出 JSON，加载信息和解析配置时的提示 (如跳过的部分) 转到 stderr
+        with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+            self.load_package_index()
+            loaded = self.load_sync_database()
+            self.load_history()
+            if not loaded:
+                error("没有可用的同步数据库，请先运行 pacman -Sy")
+                sys.exit(1)
+
+            planner = PackagePlanner(self)
+            plan = planner.build(self.config_file)
+
+        if as_json:
+            planner.print_json(plan)
+        else:
+            planner.print_table(plan)
+
+    def reconcile(self, prune=False, dry_run=False, assume_yes=False):
+        """让显式安装的包与配置一致"""
+        if not dry_run:
+            self.setup_environment()
+
+        self.load_package_index()
+        self.load_sync_database()
+        self.load_history()
+        if self.package_index is None:
+            error("无法读取本地数据库，reconcile 需要已安装包索引")
+            sys.exit(1)
+
+        reconciler = PackageReconciler(self)
+        if not reconciler.run(self.config_file, prune, dry_run, assume_yes):
+            sys.exit(1)
+
     # ==================== 主入口模块 ====================
     def setup(self):
         """主设置函数"""
@@ -277,18 +896,25 @@ class PackageInstaller:
             # 环境设置
             self.setup_environment()
 
+            # 建立已安装包索引和同步数据库索引
+            self.load_package_index()
+            self.load_sync_database()
+            self.load_history()
+
             # 安装 archlinuxcn-keyring
             if not self.install_archlinuxcn_keyring():
                 error("archlinuxcn-keyring 安装失败，无法继续")
                 return
 
             # 执行包安装
-            config_path = os.path.join("lib", "pkgs.conf")
-            self.pkginstall(config_path)
+            self.pkginstall(self.config_file)
 
             # 可以在这里添加其他设置脚本
             # self.run_additional_scripts()
 
+            self.report_aur_cache()
+            self.report_history()
+
             success("包安装完成！")
 
         except Exception as e:
@@ -308,9 +934,70 @@ class PackageInstaller:
                 except subprocess.CalledProcessError as e:
                     error(f"{script} 执行失败: {e}")
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="包安装管理器")
+    parser.add_argument("command", nargs="?", default="install", choices=["install", "plan", "reconcile"],
+                        help="install: 安装 (默认)；plan: 只输出安装计划；"
+                             "reconcile: 安装缺失的包并移除配置中被注释掉的包")
+    parser.add_argument("--config", default=os.path.join("lib", "pkgs.conf"),
+                        help="软件包列表配置文件")
+    parser.add_argument("--json", action="store_true",
+                        help="plan 以 JSON 格式输出")
+    parser.add_argument("--prune", action="store_true",
+                        help="reconcile 时同时移除不在配置中的显式安装包")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="reconcile 只输出差异，不执行事务")
+    parser.add_argument("--yes", action="store_true",
+                        help="reconcile 不再确认，直接执行")
+    parser.add_argument("--batch", action="store_true",
+                        help="每个部分的缺失包合并为一个事务安装，失败时自动二分定位")
+    parser.add_argument("--aur-jobs", type=int, default=1, metavar="N",
+                        help="并行构建的 AUR 包数量 (大于 1 时启用构建池，隐含 --batch)")
+    parser.add_argument("--aur-mem", type=int, default=0, metavar="MB",
+                        help="每个 AUR 构建的内存上限 (MB，通过 systemd-run 的 MemoryMax 施加)，0 表示不限制")
+    parser.add_argument("--aur-cache", metavar="DIR",
+                        help="AUR 二进制缓存目录 (可以是共享挂载点)；指定后启用构建池 (隐含 --batch)，"
+                             "--aur-jobs 大于 1 时默认使用 ~/.cache/dotfiles/aur-bincache")
+    parser.add_argument("--aur-cache-size", type=int, default=4096, metavar="MB",
+                        help="AUR 二进制缓存上限，超出时淘汰最久未使用的包")
+    parser.add_argument("--from-scratch", action="store_true",
+                        help="忽略安装日志，重新检查全部包")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="安装当前部分时预取后续部分的仓库包 (pacman -Sw)")
+    parser.add_argument("--prefetch-jobs", type=int, default=2, metavar="N",
+                        help="同时进行的预取数量")
+    parser.add_argument("--prefetch-depth", type=int, default=2, metavar="N",
+                        help="预取当前部分之后的几个部分")
+    parser.add_argument("--hardware", action="append", metavar="COND",
+                        help="覆盖部分头的硬件检测结果 (可重复)，例如 pci:nvidia 或 '!battery'")
+    return parser.parse_args()
+
 def main():
     """主函数"""
+    args = parse_args()
+
     installer = PackageInstaller()
+    installer.config_file = args.config
+    installer.hardware = HardwareProbe(overrides=parse_overrides(args.hardware))
+
+    if args.command == "plan":
+        installer.plan(args.json)
+        return
+
+    if args.command == "reconcile":
+        installer.reconcile(args.prune, args.dry_run, args.yes)
+        return
+
+    installer.batch_mode = args.batch
+    installer.aur_jobs = args.aur_jobs
+    installer.aur_mem_cap_mb = args.aur_mem
+    installer.aur_cache_dir = args.aur_cache
+    installer.aur_cache_size_mb = args.aur_cache_size
+    installer.from_scratch = args.from_scratch
+    installer.pipeline = args.pipeline
+    installer.prefetch_jobs = args.prefetch_jobs
+    installer.prefetch_depth = args.prefetch_depth
     installer.setup()
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+安装计划模块
+根据本地数据库和同步数据库离线计算 pkgs.conf 的安装计划，不执行任何事务
+"""
+
+import json
+import unicodedata
+
+from log import info, success
+from pacman_db import strip_version
+
+# 没有历史记录时的预计耗时 (秒)
+DEFAULT_ESTIMATE = {"repo": 5, "group": 15, "provide": 5, "aur": 120}
+
+
+def format_size(size):
+    """字节数转换为易读格式"""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+def format_duration(seconds):
+    """秒数转换为易读格式"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+def pad(text, width, right=False):
+    """按显示宽度补齐 (中文字符占两列)"""
+    display = sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+    fill = " " * max(0, width - display)
+    return fill + text if right else text + fill
+
+
+class PackagePlanner:
+    """安装计划 - 复用 PackageInstaller 已加载的索引"""
+
+    def __init__(self, installer):
+        self.installer = installer
+        self.index = installer.package_index
+        self.sync_db = installer.sync_db
+        self.history = installer.history
+
+    def is_satisfied(self, name):
+        """依赖是否已由本地安装的包满足"""
+        if self.index is not None:
+            return self.index.is_installed(name)
+        return self.installer.check_package_installed(name)
+
+    def resolve_dependency(self, dep):
+        """把依赖名解析为同步数据库中的包"""
+        if dep in self.sync_db.packages:
+            return dep
+        providers = self.sync_db.provides.get(dep)
+        return providers[0] if providers else None
+
+    def dependency_closure(self, roots):
+        """计算需要额外安装的依赖，返回 (依赖包集合, 无法解析的依赖集合)"""
+        closure = set()
+        unresolved = set()
+        visited = set(roots)
+        queue = list(roots)
+
+        while queue:
+            name = queue.pop()
+            for dep in self.sync_db.packages[name]['depends']:
+                dep = strip_version(dep)
+                if self.is_satisfied(dep):
+                    continue
+                resolved = self.resolve_dependency(dep)
+                if resolved is None:
+                    unresolved.add(dep)
+                elif resolved not in visited:
+                    visited.add(resolved)
+                    closure.add(resolved)
+                    queue.append(resolved)
+
+        return closure - set(roots), unresolved
+
+    def estimate(self, pkg_name, kind):
+        """预计耗时，优先使用历史中位数"""
+        if self.history is not None:
+            estimate = self.history.estimate(pkg_name)
+            if estimate is not None:
+                return estimate, True
+        return DEFAULT_ESTIMATE[kind], False
+
+    def build(self, config_file):
+        """生成安装计划"""
+        sections = self.installer.parse_config_file(config_file)
+        plan = {"sections": [], "dependencies": [], "unresolved": [], "totals": {}}
+        roots = set()
+        estimate_total = 0.0
+
+        for section_name, commands in sections.items():
+            entries = []
+            for cmd_line in commands:
+                pkg_name, _ = self.installer.parse_package_line(cmd_line)
+                if not pkg_name:
+                    continue
+
+                kind = self.sync_db.classify(pkg_name)
+                installed = self.is_satisfied(pkg_name)
+                entry = {"package": pkg_name, "kind": kind, "installed": installed,
+                         "download": 0, "installed_size": 0, "estimate": 0, "from_history": False}
+
+                if not installed:
+                    targets = [name for name in self.sync_db.resolve(pkg_name)
+                               if not self.is_satisfied(name)]
+                    roots.update(targets)
+                    for name in targets:
+                        entry["download"] += self.sync_db.packages[name]['csize']
+                        entry["installed_size"] += self.sync_db.packages[name]['isize']
+                    entry["estimate"], entry["from_history"] = self.estimate(pkg_name, kind)
+                    estimate_total += entry["estimate"]
+
+                entries.append(entry)
+            plan["sections"].append({"name": section_name, "packages": entries})
+
+        dependencies, unresolved = self.dependency_closure(roots)
+        plan["dependencies"] = sorted(dependencies)
+        plan["unresolved"] = sorted(unresolved)
+
+        explicit = [entry for section in plan["sections"] for entry in section["packages"]]
+        missing = [entry for entry in explicit if not entry["installed"]]
+        dep_download = sum(self.sync_db.packages[name]['csize'] for name in dependencies)
+        dep_installed = sum(self.sync_db.packages[name]['isize'] for name in dependencies)
+
+        plan["totals"] = {
+            "entries": len(explicit),
+            "to_install": len(missing),
+            "aur": sum(1 for entry in missing if entry["kind"] == "aur"),
+            "dependencies": len(dependencies),
+            "download": sum(entry["download"] for entry in missing) + dep_download,
+            "installed_size": sum(entry["installed_size"] for entry in missing) + dep_installed,
+            "estimate": round(estimate_total, 1),
+        }
+        return plan
+
+    def print_table(self, plan):
+        """以表格形式输出计划"""
+        header = (pad("包名", 38) + pad("来源", 10) + pad("下载", 12, True)
+                  + pad("安装后", 12, True) + pad("预计", 10, True))
+
+        for section in plan["sections"]:
+            pending = [entry for entry in section["packages"] if not entry["installed"]]
+            if not pending:
+                success(f"{section['name']}: 全部 {len(section['packages'])} 个包已安装")
+                continue
+
+            info(f"{section['name']}: 待安装 {len(pending)}/{len(section['packages'])}")
+            print("    " + header)
+            for entry in pending:
+                estimate = format_duration(entry["estimate"])
+                if not entry["from_history"]:
+                    estimate = "~" + estimate
+                print("    " + pad(entry["package"], 38) + pad(entry["kind"], 10)
+                      + pad(format_size(entry["download"]), 12, True)
+                      + pad(format_size(entry["installed_size"]), 12, True)
+                      + pad(estimate, 10, True))
+
+        totals = plan["totals"]
+        print()
+        info(f"条目 {totals['entries']}，待安装 {totals['to_install']} (其中 AUR {totals['aur']})，"
+             f"额外依赖 {totals['dependencies']}")
+        info(f"下载 {format_size(totals['download'])}，安装后占用 {format_size(totals['installed_size'])}，"
+             f"预计耗时 {format_duration(totals['estimate'])} (~ 表示无历史记录)")
+        if plan["unresolved"]:
+            info(f"同步数据库中找不到的依赖 (可能来自 AUR): {' '.join(plan['unresolved'])}")
+
+    def print_json(self, plan):
+        """以 JSON 输出计划"""
+        print(json.dumps(plan, ensure_ascii=False, indent=2))
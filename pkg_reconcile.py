@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+声明式同步模块
+比较本地数据库中显式安装的包与 pkgs.conf，用最少的事务补齐缺失的包、
+移除被注释掉的包；差异完全由索引计算，不逐包调用 pacman
+"""
+
+import re
+
+from log import info, success, warning, error, section_header, package_start, package_update
+from system_installer import InstallConfig
+from hardware import split_section_header
+
+# 被注释掉的包行: "# hyprpicker    # Color picker"
+COMMENTED_PACKAGE_RE = re.compile(r'^#\s*([a-z0-9@_+][a-z0-9@._+-]*)\s*(?:#.*)?$')
+
+
+class PackageReconciler:
+    """声明式同步 - 复用 PackageInstaller 已加载的索引"""
+
+    def __init__(self, installer):
+        self.installer = installer
+        self.index = installer.package_index
+        self.sync_db = installer.sync_db
+        # 系统安装脚本装入的基础包不在 pkgs.conf 中，永远不当作多余的包
+        self.protected = set(InstallConfig().base_packages)
+
+    # ==================== 配置解析模块 ====================
+    def read_intentions(self, config_file):
+        """读取配置，返回 (需要的包列表, 被注释掉的包集合)"""
+        wanted = []
+        for commands in self.installer.parse_config_file(config_file).values():
+            for cmd_line in commands:
+                pkg_name, _ = self.installer.parse_package_line(cmd_line)
+                if pkg_name:
+                    wanted.append(pkg_name)
+
+        # parse_config_file 会丢弃注释行，这里单独扫描部分内被注释的包；
+        # 硬件条件不满足的部分跳过，"# fonts" 之类的说明文字不是已知的包名，也跳过
+        commented = set()
+        in_section = False
+        with open(config_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('[') and line.endswith(']'):
+                    _, conditions = split_section_header(line[1:-1])
+                    in_section = self.section_active(conditions)
+                    continue
+                match = COMMENTED_PACKAGE_RE.match(line)
+                if in_section and match and self.is_known_package(match.group(1)):
+                    commented.add(match.group(1))
+
+        return wanted, commented - set(wanted)
+
+    def section_active(self, conditions):
+        """部分的硬件条件是否满足 (与 parse_config_file 一致，未知条件视为满足)"""
+        try:
+            return self.installer.hardware.matches(conditions)
+        except ValueError:
+            return True
+
+    def is_known_package(self, pkg_name):
+        """是否为本地数据库或同步数据库中的真实包名 (不含包组和虚拟包)"""
+        if pkg_name in self.index.versions:
+            return True
+        return self.sync_db is not None and pkg_name in self.sync_db.packages
+
+    # ==================== 差异计算模块 ====================
+    def satisfying(self, pkg_name):
+        """满足配置条目的已安装包 (包名、组成员或虚拟包的提供者)"""
+        if pkg_name in self.index.versions:
+            return {pkg_name}
+        if pkg_name in self.index.groups:
+            return set(self.index.groups[pkg_name])
+        return set(self.index.provides.get(pkg_name, ()))
+
+    def is_aur(self, pkg_name):
+        """是否需要 AUR 助手安装"""
+        if self.sync_db is not None:
+            return self.sync_db.classify(pkg_name) == "aur"
+        return not self.installer.is_repo_package(pkg_name)
+
+    def required_by_others(self, removing):
+        """removing 中仍被其他已安装包依赖的包 (迭代到不动点)"""
+        provided = {}
+        for virtual, providers in self.index.provides.items():
+            for name in providers:
+                provided.setdefault(name, set()).add(virtual)
+
+        blocked = set()
+        while True:
+            needed = set()
+            for name in set(self.index.versions) - (removing - blocked):
+                needed.update(self.index.depends.get(name, ()))
+
+            newly_blocked = {name for name in removing - blocked
+                             if ({name} | provided.get(name, set())) & needed}
+            if not newly_blocked:
+                return blocked
+            blocked |= newly_blocked
+
+    def diff(self, config_file, prune=False):
+        """计算差异
+
+        install_repo / install_aur - 缺失的包
+        mark_explicit              - 已作为依赖安装、需标记为显式安装的包
+        remove                     - 可以直接 -Rns 的包
+        mark_deps                  - 想移除但仍被依赖的包，标记为依赖，留给以后清理孤儿包
+        unmanaged                  - 不在配置中的显式安装包 (prune 时一并移除)
+        """
+        wanted, commented = self.read_intentions(config_file)
+        result = {key: [] for key in ("install_repo", "install_aur", "mark_explicit",
+                                      "remove", "mark_deps", "unmanaged")}
+
+        keep = set()
+        for pkg_name in dict.fromkeys(wanted):
+            installed = self.satisfying(pkg_name)
+            if not installed:
+                result["install_aur" if self.is_aur(pkg_name) else "install_repo"].append(pkg_name)
+                continue
+            keep |= installed
+            if not installed & self.index.explicit:
+                result["mark_explicit"].extend(sorted(installed))
+
+        # 只移除按名字精确对应的显式安装包，不展开包组和虚拟包
+        removing = (commented & self.index.explicit) - keep
+
+        unmanaged = self.index.explicit - keep - removing - self.protected
+        result["unmanaged"] = sorted(unmanaged)
+        if prune:
+            removing |= unmanaged
+
+        blocked = self.required_by_others(removing)
+        result["remove"] = sorted(removing - blocked)
+        result["mark_deps"] = sorted(blocked)
+        return result
+
+    def print_diff(self, diff, prune=False):
+        """输出差异"""
+        section_header("配置与本地数据库的差异")
+
+        rows = [
+            ("+", "安装 (仓库)", diff["install_repo"]),
+            ("+", "安装 (AUR)", diff["install_aur"]),
+            ("*", "标记为显式安装", diff["mark_explicit"]),
+            ("-", "移除", diff["remove"]),
+            ("~", "仍被依赖，标记为依赖", diff["mark_deps"]),
+        ]
+        for sign, label, names in rows:
+            if names:
+                info(f"{label} ({len(names)}):")
+                for name in names:
+                    print(f"    {sign} {name}")
+
+        if diff["unmanaged"] and not prune:
+            warning(f"不在配置中的显式安装包 ({len(diff['unmanaged'])})，使用 --prune 一并移除:")
+            print("    " + " ".join(diff["unmanaged"]))
+
+        if not self.has_changes(diff):
+            success("本地系统与配置一致")
+
+    @staticmethod
+    def has_changes(diff):
+        """是否有需要执行的事务"""
+        return any(diff[key] for key in ("install_repo", "install_aur", "mark_explicit",
+                                         "remove", "mark_deps"))
+
+    # ==================== 执行模块 ====================
+    def transactions(self, diff):
+        """差异对应的事务列表 [(说明, 命令 或 (包列表, 包管理器))]
+
+        顺序: 先改安装原因和移除 (避免与新包冲突)，再安装仓库包，最后 AUR 包
+        """
+        as_root = self.installer.as_root
+        steps = []
+        if diff["mark_deps"]:
+            steps.append(("标记为依赖", as_root("pacman -D --asdeps " + " ".join(diff["mark_deps"]))))
+        if diff["mark_explicit"]:
+            steps.append(("标记为显式安装",
+                          as_root("pacman -D --asexplicit " + " ".join(diff["mark_explicit"]))))
+        if diff["remove"]:
+            steps.append(("移除", as_root("pacman -Rns --noconfirm " + " ".join(diff["remove"]))))
+        if diff["install_repo"]:
+            steps.append(("安装仓库包", (diff["install_repo"], "pacman")))
+        if diff["install_aur"]:
+            steps.append(("安装 AUR 包", (diff["install_aur"], self.installer.manager)))
+        return steps
+
+    def apply(self, diff):
+        """执行事务，返回是否全部成功"""
+        steps = self.transactions(diff)
+        all_ok = True
+
+        for index, (label, action) in enumerate(steps, 1):
+            if self.installer.check_interrupted():
+                return False
+
+            if isinstance(action, str):
+                package_start(index, len(steps), label, action)
+                ok, error_msg = self.installer.run_with_timeout(action)
+                self.index.refresh()
+                package_update("DONE" if ok else "FAIL", "" if ok else error_msg)
+                all_ok = all_ok and ok
+                continue
+
+            pkg_names, manager = action
+            package_start(index, len(steps), label, f"{len(pkg_names)} 个包")
+            results = self.installer.install_batch(pkg_names, manager)
+            failed = [name for name, (ok, _) in results.items() if not ok]
+            if failed:
+                package_update("FAIL", "失败: " + " ".join(failed))
+                all_ok = False
+            else:
+                package_update("DONE")
+
+        return all_ok
+
+    def run(self, config_file, prune=False, dry_run=False, assume_yes=False):
+        """计算并应用差异"""
+        diff = self.diff(config_file, prune)
+        self.print_diff(diff, prune)
+
+        if dry_run or not self.has_changes(diff):
+            return True
+
+        if not assume_yes:
+            answer = input(f"执行以上 {len(self.transactions(diff))} 个事务? [y/N] ").strip().lower()
+            if answer not in ("y", "yes"):
+                info("已取消")
+                return True
+
+        if self.apply(diff):
+            success("同步完成")
+            return True
+        error("部分事务失败，重新运行 reconcile 查看剩余差异")
+        return False
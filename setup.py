@@ -1,15 +1,124 @@
 #!/usr/bin/env python3
 """
 系统服务配置器 - 严格遵循日志模块格式
+
+actions.conf 中的节和命令可以声明依赖，执行时按依赖图并行:
+
+    [节名 @ after=节A,节B]          只依赖列出的节 (after= 为空表示没有依赖)；
+                                    不写时依赖上一节，保持原有的顺序执行
+    {id=fisher} curl ... | source   # 备注    为命令命名
+    {after=fisher} fish -c "..."    # 备注    只依赖列出的命令或节，可与同节其他命令并行
+
+未写 after 的命令排在同节上一条命令之后；这类隐式顺序只约束先后，
+前一条失败不影响后一条执行。显式声明的依赖失败时，依赖它的命令不再执行
+
+重复运行时已完成的命令标记为 SKIP:
+
+    {check=exists:$HOME/.config.bak}          路径存在即视为已完成
+    {check=hash:/etc/pacman.conf:<sha256>}    文件哈希一致即视为已完成
+    {check="cmd:command -v yarn"}             快速命令成功即视为已完成
+    {inputs=lib/etc}                          指定输入文件 (默认取命令中仓库内的路径)
+    {always=true}                             每次都执行
+    {timeout=600}                             单条命令的超时 (秒)
+    {scope=host}                              多目标模式下只执行一次 (scope=target 为每个目标执行)
+
+没有 check 的命令使用自动指纹 (命令文本 + 输入文件内容)，与上次成功时一致则跳过
+
+--coalesce 把同节中相邻、隐式排序的同类命令 (systemctl 的同一动作或 enable+start、
+复制到同一目录的 cp、fisher install) 在跳过检查之后合并为一次调用，合并命令失败时
+逐条执行；每条命令仍单独显示状态，--explain 输出合并了哪些命令 (见 coalesce.py)
+
+--persistent 模式下每节使用一个常驻 bash (fish -c "..." 使用常驻 fish)，
+同一节的命令共享环境 (如 nvm 修改的 PATH)，同一个 shell 中的命令依次执行；
+常驻 shell 不读取 ~/.bashrc，nvm 需要先 source $HOME/.nvm/nvm.sh
+
+deploy 子命令增量部署配置目录 (见 deploy.py)，只写入变化的文件:
+
+    python setup.py deploy --source lib/.config --target $HOME/.config
+    python setup.py deploy --link      链接模式: 用尽量少的符号链接指向仓库，不复制文件
+    python setup.py unlink             删除链接模式建立的链接
+    python setup.py watch [--reload]   监视 lib/.config 和 lib/etc，保存后立即同步 (见 watcher.py)
+    python setup.py capture            把 ~/.config 中 BACKUP_FILES 列出的配置增量同步回仓库
+
+--root DIR (可重复) 同时处理多个目标: run 对每个 DIR 以其作为 $HOME 执行动作配置，
+deploy 部署到 DIR/<源目录名> (如 lib/.config -> DIR/.config)；源目录只扫描、哈希一次，
+--jobs 是全部目标共享的并发上限，结果按目标分别输出。其他子命令不支持 --root。
+run 的多目标模式中，不引用 $HOME 的 sudo 命令和系统级 systemctl 视为主机级命令，
+只由第一个执行到它的目标执行一次，其他目标等待并复用结果 (可用 scope 注解覆盖)；
+动作中的 python3 setup.py deploy 在进程内执行，全部目标共用一份源目录索引
+
+backup/restore/snapshots/prune 子命令管理按内容去重的配置快照 (见 snapshot.py):
+
+    python setup.py backup --source $HOME/.config
+    python setup.py restore --snapshot latest [--target DIR]
+    python setup.py prune --days 30
 """
 
 import os
+import re
 import sys
+import glob
+import time
+import json
+import shlex
+import heapq
+import shutil
+import hashlib
+import argparse
+import threading
 import subprocess
+from dataclasses import dataclass, field
+from typing import List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # 导入日志模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from log import info, success, warning, error, section_header, package_start, package_update
+from log import package_done, package_fail, package_skip
+from hardware import split_section_header
+from shell_worker import ShellWorker, split_fish_command
+from coalesce import merge_commands
+from deploy import DeployEngine, LinkFarm, SourceIndex, scan_tree, install_copy, content_hash
+from snapshot import SnapshotStore
+from pkg_plan import format_size
+
+
+@dataclass
+class Action:
+    """actions.conf 中的一条命令"""
+    section: str
+    index: int
+    command: str
+    description: str
+    id: str = ""
+    after: Optional[List[str]] = None
+    check: str = ""
+    inputs: Optional[List[str]] = None
+    always: bool = False
+    timeout: Optional[int] = None
+    scope: str = ""
+
+    @property
+    def key(self):
+        """状态文件中的键"""
+        return f"{self.section}\0{self.command}"
+
+
+@dataclass
+class ActionResult:
+    """命令执行结果，节完成后统一输出"""
+    status: str
+    message: str = ""
+    fingerprint: str = ""
+
+
+@dataclass
+class Task:
+    """依赖图中的节点"""
+    action: Action
+    order: int
+    hard: List[int] = field(default_factory=list)   # 必须成功的依赖
+    soft: List[int] = field(default_factory=list)   # 只约束先后的依赖
 
 
 class ServiceConfigurator:
@@ -18,8 +127,34 @@ class ServiceConfigurator:
     def __init__(self, config_file="lib/actions.conf"):
         self.config_file = config_file
         self.sections = {}
+        self.section_after = {}
         self.home_dir = os.path.expanduser("~")
         self.current_dir = os.getcwd()
+        self.state_file = os.path.expanduser("~/.cache/dotfiles/actions_state.json")
+        self.state = {}
+        self.force = False
+        self.persistent = False
+        self.command_timeout = None
+        self.workers = {}
+        self.workers_lock = threading.Lock()
+        self.env = None              # 命令的环境变量，None 表示继承当前环境
+        self.label = ""              # 多目标模式下的目标名，显示在节标题中
+        self.limit = None            # 多目标共享的并发上限 (threading.Semaphore)
+        self.fingerprints = None     # 多目标共享的指纹缓存 (dict, Lock)
+        self.shared_actions = None   # 多目标共享的主机级命令结果 (dict, Lock)
+        self.source_indexes = None   # 多目标共享的部署源目录索引 (dict, Lock)
+        self.output_lock = None      # 多目标模式下延迟到结束时统一输出
+        self.coalesce = False        # 合并相邻的同类命令
+        self.explain = False         # 输出合并说明
+        self.explanations = []
+    
+    def use_root(self, root):
+        """以 root 作为 $HOME 执行 (多目标模式)，状态文件按目标区分"""
+        self.home_dir = os.path.abspath(root)
+        self.env = dict(os.environ, HOME=self.home_dir)
+        self.label = self.home_dir
+        key = hashlib.sha1(self.home_dir.encode()).hexdigest()[:12]
+        self.state_file = os.path.expanduser(f"~/.cache/dotfiles/actions_state-{key}.json")
     
     def parse_config(self):
         """解析配置文件 - 只识别 [] 作为节标题"""
@@ -42,8 +177,9 @@ class ServiceConfigurator:
                 
                 # 只识别 [节标题] 作为节分隔
                 if stripped_line.startswith('[') and stripped_line.endswith(']'):
-                    current_section = stripped_line[1:-1].strip()
+                    current_section, options = split_section_header(stripped_line[1:-1])
                     self.sections[current_section] = []
+                    self.section_after[current_section] = self.parse_options(options).get('after')
                     continue
                 
                 # 如果当前不在任何节中，跳过
@@ -63,43 +199,415 @@ class ServiceConfigurator:
                 
                 # 跳过空命令
                 if command:
-                    self.sections[current_section].append((command, description))
+                    self.sections[current_section].append(
+                        self.parse_action(current_section, command, description))
             
             return True
-            
+        
         except Exception as e:
             error(f"解析配置文件失败: {str(e)}")
             return False
     
-    def run_command(self, index, total, command, description):
-        """运行单个命令 - 使用 package_update 显示状态"""
-        # 开始执行命令
-        package_start(index, total, command, description)
+    def parse_options(self, tokens):
+        """解析 key=value 选项，after 的值按逗号拆分"""
+        options = {}
+        for token in tokens:
+            key, sep, value = token.partition('=')
+            if not sep:
+                raise ValueError(f"无法识别的选项: {token}")
+            options[key] = value
+        for key in ('after', 'inputs'):
+            if key in options:
+                options[key] = [name.strip() for name in options[key].split(',') if name.strip()]
+        return options
+    
+    def parse_action(self, section, command, description):
+        """解析命令前的 {key=value ...} 注解"""
+        index = len(self.sections[section]) + 1
+        options = {}
+        if command.startswith('{') and '}' in command:
+            annotation, command = command[1:].split('}', 1)
+            options = self.parse_options(shlex.split(annotation))
+            command = command.strip()
+        if options.get('scope', "host") not in ("host", "target"):
+            raise ValueError(f"无法识别的 scope: {options['scope']}")
         
+        return Action(
+            section=section,
+            index=index,
+            command=command,
+            description=description,
+            id=options.get('id', ""),
+            after=options.get('after'),
+            check=options.get('check', ""),
+            inputs=options.get('inputs'),
+            always=options.get('always', "").lower() in ("1", "true", "yes"),
+            timeout=int(options['timeout']) if 'timeout' in options else None,
+            scope=options.get('scope', ""),
+        )
+    
+    def expand(self, text):
+        """替换路径变量"""
+        return text.replace('$HOME', self.home_dir).replace('~', self.home_dir)
+    
+    def execute_command(self, command, timeout=None):
+        """执行命令，返回 (是否成功, 错误信息)"""
         # 替换路径变量
-        command = command.replace('$HOME', self.home_dir)
-        command = command.replace('~', self.home_dir)
+        command = self.expand(command)
         
         try:
             result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
+                command,
+                shell=True,
+                capture_output=True,
                 text=True,
-                cwd=self.current_dir
+                cwd=self.current_dir,
+                env=self.env,
+                timeout=timeout
             )
             
             if result.returncode == 0:
-                package_update("DONE")
-                return True
-            else:
-                error_msg = result.stderr.strip() if result.stderr else "命令执行失败"
-                package_update("FAIL", error_msg)
-                return False
-                
+                return True, ""
+            return False, result.stderr.strip() if result.stderr else "命令执行失败"
+        
+        except subprocess.TimeoutExpired:
+            return False, f"命令执行超时 ({timeout} 秒)"
         except Exception as e:
-            package_update("FAIL", str(e))
+            return False, str(e)
+    
+    # ==================== 常驻 shell 模块 ====================
+    def worker_for(self, section, shell):
+        """取得节对应的常驻 shell 及其锁，首次使用时启动"""
+        with self.workers_lock:
+            key = (section, shell)
+            if key not in self.workers:
+                self.workers[key] = (ShellWorker(shell, cwd=self.current_dir, env=self.env),
+                                     threading.Lock())
+            return self.workers[key]
+    
+    def close_workers(self):
+        """关闭全部常驻 shell"""
+        with self.workers_lock:
+            for worker, _ in self.workers.values():
+                worker.stop()
+            self.workers.clear()
+    
+    def execute_persistent(self, section, command, timeout=None):
+        """在节的常驻 shell 中执行命令，超时后 shell 会被重启"""
+        command = self.expand(command)
+        shell = "bash"
+        fish_command = split_fish_command(command)
+        if fish_command is not None and shutil.which("fish"):
+            shell, command = "fish", fish_command
+        
+        worker, lock = self.worker_for(section, shell)
+        with lock:
+            try:
+                result = worker.run(command, timeout)
+            except OSError as e:
+                return False, str(e)
+        
+        if result.timed_out:
+            return False, f"命令执行超时 ({timeout} 秒)，{shell} 已重启"
+        if result.returncode == 0:
+            return True, ""
+        return False, result.stderr.strip() or result.stdout.strip() or "命令执行失败"
+    
+    def execute_action(self, action):
+        """按当前模式执行一条命令"""
+        if self.source_indexes is not None:
+            deploy = self.parse_deploy(action.command)
+            if deploy is not None:
+                return self.deploy_inline(*deploy)
+        timeout = action.timeout or self.command_timeout
+        if self.persistent:
+            return self.execute_persistent(action.section, action.command, timeout)
+        return self.execute_command(action.command, timeout)
+    
+    # ==================== 多目标模块 ====================
+    def is_host_action(self, action):
+        """是否为与目标无关的主机级命令: 按 scope 注解，未注解时取不引用 $HOME 的
+        sudo 命令和系统级 systemctl"""
+        if action.scope:
+            return action.scope == "host"
+        text = " ".join([action.command, action.check] + (action.inputs or []))
+        if '$HOME' in text or '~' in text:
+            return False
+        try:
+            tokens = shlex.split(action.command)
+        except ValueError:
             return False
+        if tokens[:1] == ["sudo"]:
+            return True
+        return tokens[:1] == ["systemctl"] and "--user" not in tokens
+    
+    def run_once(self, key, run):
+        """多目标共享: 第一个调用者执行 run，其余调用者等待并复用它的结果"""
+        cache, lock = self.shared_actions
+        with lock:
+            future = cache.get(key)
+            owner = future is None
+            if owner:
+                future = cache[key] = Future()
+        if owner:
+            try:
+                future.set_result(run())
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+        return future.result()
+    
+    def parse_deploy(self, command):
+        """识别 python3 setup.py deploy [--source DIR] [--target DIR] [--dry-run]，
+        返回 (源目录, 目标目录, 是否预览)，其他形式返回 None"""
+        try:
+            tokens = shlex.split(self.expand(command))
+        except ValueError:
+            return None
+        if len(tokens) < 3 or os.path.basename(tokens[0]) not in ("python", "python3") \
+                or tokens[1:3] != ["setup.py", "deploy"]:
+            return None
+        paths = {"--source": os.path.join("lib", ".config"),
+                 "--target": os.path.join(self.home_dir, ".config")}
+        dry_run = False
+        rest = tokens[3:]
+        while rest:
+            token = rest.pop(0)
+            if token == "--dry-run":
+                dry_run = True
+            elif token in paths and rest:
+                paths[token] = rest.pop(0)
+            else:
+                return None
+        return (os.path.join(self.current_dir, paths["--source"]),
+                os.path.join(self.current_dir, paths["--target"]), dry_run)
+    
+    def deploy_inline(self, source, target, dry_run=False):
+        """在进程内增量部署，全部目标共用同一源目录的索引，返回 (是否成功, 错误信息)"""
+        if not os.path.isdir(source):
+            return False, f"源目录不存在: {source}"
+        indexes, lock = self.source_indexes
+        with lock:
+            if source not in indexes:
+                indexes[source] = SourceIndex(source)
+            index = indexes[source]
+        try:
+            report = DeployEngine(source, target, dry_run=dry_run, index=index).deploy()
+        except OSError as e:
+            return False, str(e)
+        if report.failed:
+            relpath, message = report.failed[0]
+            return False, f"{len(report.failed)} 个文件部署失败，如 {relpath}: {message}"
+        return True, ""
+    
+    # ==================== 幂等检查模块 ====================
+    def load_state(self):
+        """读取上次成功执行的指纹"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+    
+    def save_state(self):
+        """原子写入指纹，失败时忽略"""
+        try:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_file, self.state_file)
+        except OSError:
+            pass
+    
+    def hash_file(self, path):
+        """文件内容的 sha256"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def check_action(self, check):
+        """执行廉价检查，返回是否已完成"""
+        kind, _, argument = check.partition(':')
+        argument = self.expand(argument)
+        if kind == "exists":
+            return os.path.lexists(argument)
+        if kind == "hash":
+            path, _, expected = argument.rpartition(':')
+            try:
+                return self.hash_file(path) == expected.lower()
+            except OSError:
+                return False
+        if kind == "cmd":
+            try:
+                return subprocess.run(argument, shell=True, cwd=self.current_dir, env=self.env,
+                                      timeout=10, stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL).returncode == 0
+            except subprocess.TimeoutExpired:
+                return False
+        raise ValueError(f"未知的检查: {check}")
+    
+    def action_inputs(self, action):
+        """命令的输入文件: 显式声明的，或命令中出现的仓库内相对路径"""
+        if action.inputs is not None:
+            patterns = [self.expand(path) for path in action.inputs]
+        else:
+            try:
+                tokens = shlex.split(action.command)
+            except ValueError:
+                tokens = action.command.split()
+            # 绝对路径多半是目标位置 (如 $HOME/.config)，其内容随使用变化，不作为输入
+            patterns = [token for token in tokens
+                        if not token.startswith(('-', '/', '$', '~')) and '/' in token]
+        
+        paths = []
+        for pattern in patterns:
+            full = os.path.join(self.current_dir, pattern)
+            paths.extend(sorted(glob.glob(full)) if glob.has_magic(full) else [full])
+        return [path for path in paths if os.path.exists(path)]
+    
+    def fingerprint(self, action):
+        """自动指纹，多目标模式下同一命令只计算一次"""
+        if self.fingerprints is None:
+            return self.compute_fingerprint(action)
+        cache, lock = self.fingerprints
+        with lock:
+            if action.key not in cache:
+                cache[action.key] = self.compute_fingerprint(action)
+            return cache[action.key]
+    
+    def compute_fingerprint(self, action):
+        """自动指纹: 命令文本 + 输入文件的路径和内容"""
+        digest = hashlib.sha256(action.command.encode())
+        for path in self.action_inputs(action):
+            files = [path]
+            if os.path.isdir(path):
+                files = sorted(os.path.join(root, name)
+                               for root, _, names in os.walk(path) for name in names)
+            for file_path in files:
+                digest.update(os.path.relpath(file_path, self.current_dir).encode())
+                try:
+                    digest.update(self.hash_file(file_path).encode())
+                except OSError:
+                    continue
+        return digest.hexdigest()
+    
+    def precheck(self, action):
+        """执行前的检查，返回 (已确定的结果或 None, 指纹)"""
+        fingerprint = ""
+        if not self.force and not action.always:
+            try:
+                if action.check:
+                    if self.check_action(action.check):
+                        return ActionResult("SKIP"), fingerprint
+                else:
+                    fingerprint = self.fingerprint(action)
+                    if self.state.get(action.key) == fingerprint:
+                        return ActionResult("SKIP"), fingerprint
+            except ValueError as e:
+                return ActionResult("FAIL", str(e)), fingerprint
+        return None, fingerprint
+    
+    def execute_limited(self, action):
+        """执行命令，多目标模式下受共享的并发上限约束"""
+        if self.limit is None:
+            return self.execute_action(action)
+        with self.limit:
+            return self.execute_action(action)
+    
+    def run_action(self, action):
+        """检查后执行一条命令 (可在工作线程中调用)"""
+        result, fingerprint = self.precheck(action)
+        if result is not None:
+            return result
+        
+        ok, error_msg = self.execute_limited(action)
+        if ok:
+            return ActionResult("DONE", fingerprint=fingerprint)
+        return ActionResult("FAIL", error_msg)
+    
+    # ==================== 命令合并模块 ====================
+    def coalesce_groups(self, tasks):
+        """找出可合并的相邻命令: 同节、依次隐式排序、超时相同且整体可合并，
+        返回 {首个任务编号: [组内任务编号]}"""
+        groups = {}
+        for section_name, actions in self.sections.items():
+            group = []
+            for action in actions:
+                task_index = next(task.order for task in tasks if task.action is action)
+                if group and action.after is None \
+                        and action.timeout == tasks[group[0]].action.timeout \
+                        and (self.shared_actions is None or self.is_host_action(action)
+                             == self.is_host_action(tasks[group[0]].action)) \
+                        and merge_commands([tasks[index].action.command for index in group]
+                                           + [action.command]) is not None:
+                    group.append(task_index)
+                    continue
+                if len(group) > 1:
+                    groups[group[0]] = group
+                group = [task_index]
+            if len(group) > 1:
+                groups[group[0]] = group
+        return groups
+    
+    def run_group(self, actions):
+        """执行一组命令；多目标模式下主机级命令只执行一次，各目标共用结果"""
+        if self.shared_actions is not None and all(self.is_host_action(action) for action in actions):
+            return self.run_once(tuple(action.key for action in actions),
+                                 lambda: self.execute_group(actions))
+        return self.execute_group(actions)
+    
+    def execute_group(self, actions):
+        """检查后合并执行一组命令，合并命令失败时逐条执行；返回各命令的结果"""
+        results = [None] * len(actions)
+        pending = []
+        for position, action in enumerate(actions):
+            result, fingerprint = self.precheck(action)
+            if result is not None:
+                results[position] = result
+            else:
+                pending.append((position, action, fingerprint))
+        
+        merged = merge_commands([action.command for _, action, _ in pending])
+        if merged is not None:
+            leader = pending[0][1]
+            merged_action = Action(leader.section, leader.index, merged, leader.description,
+                                   timeout=leader.timeout)
+            ok, error_msg = self.execute_limited(merged_action)
+            explanation = f"[{leader.section}] {len(pending)} 条命令合并为: {merged}"
+            if ok:
+                self.explanations.append(explanation)
+                for position, _, fingerprint in pending:
+                    results[position] = ActionResult("DONE", fingerprint=fingerprint)
+                return results
+            self.explanations.append(f"{explanation} (失败，改为逐条执行: {error_msg})")
+        
+        for position, action, fingerprint in pending:
+            ok, error_msg = self.execute_limited(action)
+            results[position] = ActionResult("DONE", fingerprint=fingerprint) if ok \
+                else ActionResult("FAIL", error_msg)
+        return results
+    
+    def record_result(self, action, result):
+        """记录成功执行的指纹；执行失败时清除旧指纹"""
+        if result.status == "DONE" and result.fingerprint:
+            self.state[action.key] = result.fingerprint
+        elif result.status == "FAIL":
+            self.state.pop(action.key, None)
+    
+    def run_command(self, index, total, command, description):
+        """运行单个命令 - 使用 package_update 显示状态"""
+        # 开始执行命令
+        package_start(index, total, command, description)
+        
+        ok, error_msg = self.execute_command(command)
+        if ok:
+            package_update("DONE")
+        else:
+            package_update("FAIL", error_msg)
+        return ok
     
     def execute_section(self, section_name):
         """执行特定节的命令"""
@@ -109,32 +617,221 @@ class ServiceConfigurator:
         
         section_header(section_name)
         
-        commands = self.sections[section_name]
+        actions = self.sections[section_name]
         success_count = 0
         
-        for index, (command, description) in enumerate(commands, 1):
-            if self.run_command(index, len(commands), command, description):
+        self.load_state()
+        for action in actions:
+            package_start(action.index, len(actions), action.command, action.description)
+            result = self.run_action(action)
+            self.record_result(action, result)
+            package_update(result.status, result.message)
+            if result.status != "FAIL":
                 success_count += 1
+        self.save_state()
+        self.close_workers()
         
-        return success_count == len(commands)
+        return success_count == len(actions)
     
-    def execute_all(self):
-        """执行所有配置节的命令"""
+    # ==================== 依赖图模块 ====================
+    def build_graph(self):
+        """建立依赖图，返回 (任务列表, 错误列表)"""
+        tasks = []
+        by_section = {}
+        by_id = {}
+        
+        for section_name, actions in self.sections.items():
+            by_section[section_name] = []
+            for action in actions:
+                task_index = len(tasks)
+                tasks.append(Task(action=action, order=task_index))
+                by_section[section_name].append(task_index)
+                if action.id:
+                    by_id[action.id] = task_index
+        
+        errors = []
+        
+        def resolve(names, owner):
+            """依赖名 (命令 id 或节名) 转为任务编号"""
+            resolved = []
+            for name in names:
+                if name in by_id:
+                    resolved.append(by_id[name])
+                elif name in by_section:
+                    resolved.extend(by_section[name])
+                else:
+                    errors.append(f"{owner}: 依赖 '{name}' 不存在")
+            return resolved
+        
+        previous_section = []
+        for section_name, members in by_section.items():
+            after = self.section_after.get(section_name)
+            if after is None:
+                section_hard, section_soft = [], previous_section
+            else:
+                section_hard, section_soft = resolve(after, f"[{section_name}]"), []
+            
+            previous = None
+            for task_index in members:
+                task = tasks[task_index]
+                task.hard.extend(section_hard)
+                task.soft.extend(section_soft)
+                if task.action.after is not None:
+                    owner = f"[{section_name}] {task.action.id or task.action.command}"
+                    task.hard.extend(resolve(task.action.after, owner))
+                elif previous is not None:
+                    task.soft.append(previous)
+                previous = task_index
+            
+            if members:
+                previous_section = members
+        
+        errors.extend(self.find_cycle(tasks))
+        return tasks, errors
+    
+    def find_cycle(self, tasks):
+        """拓扑排序检查环，返回错误列表"""
+        indegree = [0] * len(tasks)
+        dependents = [[] for _ in tasks]
+        for task in tasks:
+            for dep in set(task.hard + task.soft):
+                indegree[task.order] += 1
+                dependents[dep].append(task.order)
+        
+        ready = [task.order for task in tasks if indegree[task.order] == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for dependent in dependents[current]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    ready.append(dependent)
+        
+        if visited == len(tasks):
+            return []
+        cycle = [f"[{task.action.section}] {task.action.id or task.action.command}"
+                 for task in tasks if indegree[task.order] > 0]
+        return ["存在循环依赖: " + " -> ".join(cycle)]
+    
+    # ==================== 并行执行模块 ====================
+    def flush_sections(self, results, flushed):
+        """按配置顺序输出已全部完成的节，保证每节输出集中、顺序稳定"""
+        for section_name, actions in self.sections.items():
+            if section_name in flushed:
+                continue
+            if any((section_name, action.index) not in results for action in actions):
+                return
+            
+            flushed.add(section_name)
+            if not actions:
+                continue
+            section_header(f"{section_name} @ {self.label}" if self.label else section_name)
+            for action in actions:
+                result = results[(section_name, action.index)]
+                if result.status == "DONE":
+                    package_done(action.index, len(actions), action.command, action.description)
+                elif result.status == "SKIP":
+                    package_skip(action.index, len(actions), action.command, action.description)
+                else:
+                    package_fail(action.index, len(actions), action.command, action.description,
+                                 result.message)
+    
+    def execute_all(self, jobs=4):
+        """按依赖图并行执行所有配置节的命令"""
         if not self.sections:
             error("没有可执行的配置节")
             return False
         
-        total_success = 0
-        total_commands = 0
+        tasks, errors = self.build_graph()
+        if errors:
+            for message in errors:
+                error(message)
+            error("依赖声明有误，未执行任何命令")
+            return False
+        
+        dependents = [[] for _ in tasks]
+        waiting = []
+        for task in tasks:
+            deps = set(task.hard + task.soft)
+            waiting.append(len(deps))
+            for dep in deps:
+                dependents[dep].append(task.order)
         
-        for section_name in self.sections:
-            commands_count = len(self.sections[section_name])
-            total_commands += commands_count
-            
-            if self.execute_section(section_name):
-                total_success += commands_count
+        self.load_state()
+        results = {}
+        failed = set()
+        flushed = set()
+        ready = [task.order for task in tasks if waiting[task.order] == 0]
+        heapq.heapify(ready)
+        running = {}
+        groups = self.coalesce_groups(tasks) if self.coalesce else {}
+        
+        def finish(task_index, result):
+            """记录结果并释放依赖它的任务"""
+            action = tasks[task_index].action
+            results[(action.section, action.index)] = result
+            if result.status == "FAIL":
+                failed.add(task_index)
+            for dependent in dependents[task_index]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+                while ready or running:
+                    while ready and len(running) < max(1, jobs):
+                        task_index = heapq.heappop(ready)
+                        task = tasks[task_index]
+                        if (task.action.section, task.action.index) in results:
+                            # 已随合并组一起完成
+                            continue
+                        broken = [dep for dep in task.hard if dep in failed]
+                        if broken:
+                            dep = tasks[broken[0]].action
+                            finish(task_index, ActionResult(
+                                "FAIL", f"依赖未完成: [{dep.section}] {dep.id or dep.command}"))
+                            continue
+                        members = groups.get(task_index, [task_index])
+                        future = pool.submit(self.run_group, [tasks[index].action for index in members])
+                        running[future] = members
+                    
+                    if not running:
+                        continue
+                    
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        members = running.pop(future)
+                        for task_index, result in zip(members, future.result()):
+                            self.record_result(tasks[task_index].action, result)
+                            finish(task_index, result)
+                    if self.output_lock is None:
+                        self.flush_sections(results, flushed)
+        finally:
+            # 中断时也保留已完成命令的指纹
+            self.save_state()
+            self.close_workers()
+        
+        if self.output_lock is None:
+            return self.report_results(results, flushed, len(tasks))
+        # 多目标模式下每个目标的输出集中打印，不与其他目标交错
+        with self.output_lock:
+            return self.report_results(results, flushed, len(tasks))
+    
+    def report_results(self, results, flushed, total_commands):
+        """输出剩余的节和总体结果"""
+        self.flush_sections(results, flushed)
+        
+        if self.explain:
+            section_header("命令合并")
+            for explanation in self.explanations:
+                info(explanation)
+            if not self.explanations:
+                info("没有合并任何命令")
         
-        info(f"总体完成: {total_success}/{total_commands}")
+        total_success = sum(1 for result in results.values() if result.status != "FAIL")
+        info(f"总体完成: {total_success}/{total_commands}" + (f" ({self.label})" if self.label else ""))
         
         if total_success == total_commands:
             success("所有服务配置完成!")
@@ -144,18 +841,513 @@ class ServiceConfigurator:
             return False
 
 
+class ConfigCapture:
+    """把 ~/.config 中 BACKUP_FILES 列出的配置同步回仓库，只写入变化的文件"""
+    
+    def __init__(self, pairs, jobs=4, dry_run=False):
+        self.pairs = pairs  # [(源路径, 仓库中的路径)]
+        self.jobs = jobs
+        self.dry_run = dry_run
+        self.manifest_file = os.path.expanduser("~/.cache/dotfiles/capture.json")
+        self.manifest = {}
+        self.changes = []    # [(动作, 仓库中的路径, 字节数)]
+        self.failed = []
+        self.linked = []
+        self.missing = []
+        self.unchanged = 0
+        self.hashed = 0
+    
+    @staticmethod
+    def read_backup_list(script):
+        """读取 update_dotfiles.sh 中的 BACKUP_FILES 数组"""
+        with open(script, 'r', encoding='utf-8') as f:
+            match = re.search(r'^BACKUP_FILES=\((.*?)^\)', f.read(), re.S | re.M)
+        if not match:
+            return []
+        entries = []
+        for line in match.group(1).splitlines():
+            entries.extend(shlex.split(line.split('#', 1)[0]))
+        return entries
+    
+    def load_manifest(self):
+        """读取上次捕获的清单"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+    
+    def save_manifest(self):
+        """原子写入清单"""
+        os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_file, self.manifest_file)
+    
+    @staticmethod
+    def stat_key(st):
+        """清单中记录的 stat 信息"""
+        return [st.st_size, st.st_mtime_ns] if st else None
+    
+    def scan_pair(self, source, dest):
+        """比较一对路径，返回 (需要哈希比较的文件, 仓库中多出的文件)"""
+        if os.path.isdir(source):
+            src_files = scan_tree(source)
+            dst_files = scan_tree(dest) if os.path.isdir(dest) and not os.path.islink(dest) else {}
+        else:
+            src_files = {"": os.lstat(source)}
+            dst_files = {"": os.lstat(dest)} if os.path.lexists(dest) else {}
+        
+        pending = []
+        for relpath, src_st in src_files.items():
+            src = os.path.join(source, relpath) if relpath else source
+            dst = os.path.join(dest, relpath) if relpath else dest
+            dst_st = dst_files.get(relpath)
+            record = self.manifest.get(dst)
+            if record and dst_st and record['src'] == self.stat_key(src_st) \
+                    and record['dst'] == self.stat_key(dst_st):
+                self.unchanged += 1
+                continue
+            pending.append((src, dst, src_st, dst_st))
+        
+        extra = [os.path.join(dest, relpath) if relpath else dest
+                 for relpath in sorted(set(dst_files) - set(src_files))]
+        return pending, extra
+    
+    def compare(self, item):
+        """并行执行的哈希比较，返回 (源哈希, 仓库文件哈希)"""
+        src, dst, src_st, dst_st = item
+        src_digest = content_hash(src, src_st)
+        dst_digest = content_hash(dst, dst_st) if dst_st else None
+        return src_digest, dst_digest
+    
+    def capture(self):
+        """执行捕获"""
+        self.load_manifest()
+        pending, extra = [], []
+        for source, dest in self.pairs:
+            if not os.path.lexists(source):
+                self.missing.append(source)
+                continue
+            if os.path.realpath(source) == os.path.realpath(dest):
+                # 链接模式部署的配置本身就在仓库中
+                self.linked.append(source)
+                continue
+            try:
+                pair_pending, pair_extra = self.scan_pair(source, dest)
+            except OSError as e:
+                self.failed.append((source, str(e)))
+                continue
+            pending.extend(pair_pending)
+            extra.extend(pair_extra)
+        
+        with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as pool:
+            digests = list(pool.map(self.safe_compare, pending))
+        self.hashed = len(pending)
+        
+        for item, digest in zip(pending, digests):
+            src, dst, src_st, dst_st = item
+            if digest is None:
+                continue
+            src_digest, dst_digest = digest
+            if src_digest != dst_digest:
+                self.changes.append(("更新" if dst_st else "新增", dst, src_st.st_size))
+                if self.dry_run:
+                    continue
+                try:
+                    install_copy(src, dst, src_st)
+                    dst_st = os.lstat(dst)
+                except OSError as e:
+                    self.failed.append((dst, str(e)))
+                    continue
+            else:
+                self.unchanged += 1
+            self.manifest[dst] = {'src': self.stat_key(src_st), 'dst': self.stat_key(dst_st)}
+        
+        for dst in extra:
+            self.changes.append(("删除", dst, 0))
+            self.manifest.pop(dst, None)
+            if not self.dry_run:
+                try:
+                    os.remove(dst)
+                except OSError as e:
+                    self.failed.append((dst, str(e)))
+        
+        if not self.dry_run:
+            self.prune_empty_dirs()
+            self.save_manifest()
+        return not self.failed
+    
+    def safe_compare(self, item):
+        """compare 的包装，读取失败时记录错误并返回 None"""
+        try:
+            return self.compare(item)
+        except OSError as e:
+            self.failed.append((item[0], str(e)))
+            return None
+    
+    def prune_empty_dirs(self):
+        """删除仓库中因删除文件而变空的目录"""
+        for _, dest in self.pairs:
+            if not os.path.isdir(dest) or os.path.islink(dest):
+                continue
+            for current, _, _ in os.walk(dest, topdown=False):
+                if current != dest and not os.listdir(current):
+                    os.rmdir(current)
+    
+    def print_summary(self):
+        """输出变化的文件和统计"""
+        for source in self.missing:
+            warning(f"跳过 (源文件不存在): {source}")
+        for source in self.linked:
+            info(f"跳过 (已链接到仓库): {source}")
+        for action, path, size in self.changes:
+            info(f"{action} {os.path.relpath(path)}" + (f" ({format_size(size)})" if size else ""))
+        for path, message in self.failed:
+            error(f"{path}: {message}")
+        
+        written = sum(size for action, _, size in self.changes if action != "删除")
+        removed = sum(1 for action, _, _ in self.changes if action == "删除")
+        info(f"变化 {len(self.changes) - removed} 个文件 ({format_size(written)})，删除 {removed}，"
+             f"未变化 {self.unchanged}，哈希比较 {self.hashed}")
+
+
+def capture_config(source=None, target=None, jobs=4, dry_run=False):
+    """把本机修改过的配置同步回仓库 (update_dotfiles.sh 的增量版本)"""
+    script = os.path.join("lib", ".config", "self", "script", "update_dotfiles.sh")
+    try:
+        entries = ConfigCapture.read_backup_list(script)
+    except OSError as e:
+        error(f"无法读取备份列表: {e}")
+        return False
+    if not entries:
+        error(f"{script} 中没有 BACKUP_FILES")
+        return False
+    
+    source_root = os.path.expanduser(source or "~/.config")
+    target_root = os.path.abspath(target or os.path.join("lib", ".config"))
+    pairs = [(os.path.join(source_root, entry), os.path.join(target_root, entry)) for entry in entries]
+    grub_theme = "/boot/grub/themes/simple"
+    if source is None and os.path.isdir(grub_theme):
+        pairs.append((grub_theme, os.path.abspath(os.path.join("lib", "grub"))))
+    
+    section_header(f"捕获配置 {source_root} -> {os.path.relpath(target_root)}")
+    capture = ConfigCapture(pairs, jobs=jobs, dry_run=dry_run)
+    ok = capture.capture()
+    capture.print_summary()
+    if not ok:
+        warning("部分文件捕获失败")
+        return False
+    success("预览完成，未修改仓库" if dry_run else "配置捕获完成!")
+    return True
+
+
+def deploy_config(source, target, dry_run=False):
+    """增量部署配置目录并输出统计"""
+    if not os.path.isdir(source):
+        error(f"源目录不存在: {source}")
+        return False
+    
+    engine = DeployEngine(source, target, dry_run=dry_run)
+    section_header(f"部署 {source} -> {engine.target}")
+    report = engine.deploy()
+    return print_deploy_report(report, dry_run)
+
+
+def print_deploy_report(report, dry_run=False):
+    """输出一个目标的部署统计，返回是否全部成功"""
+    for relpath, message in report.failed:
+        error(f"{relpath}: {message}")
+    for relpath in report.kept:
+        warning(f"源文件已删除但目标被修改过，保留: {relpath}")
+    
+    methods = ", ".join(f"{name} {count}" for name, count in sorted(report.methods.items()))
+    info(f"扫描 {report.scanned} 个文件 (哈希 {report.hashed})，"
+         f"复制 {report.copied}，未变化 {report.unchanged}，删除 {report.removed}")
+    info(f"写入 {format_size(report.bytes_written)}"
+         + (f" ({methods})" if methods else "") + f"，用时 {report.elapsed:.2f}s")
+    
+    if report.failed:
+        warning("部分文件部署失败")
+        return False
+    success("预览完成，未写入任何文件" if dry_run else "配置部署完成!")
+    return True
+
+
+def deploy_targets(source, roots, jobs=4, dry_run=False):
+    """把同一源目录并行部署到多个根目录 (目标为 根目录/源目录名)，源目录只扫描和哈希一次"""
+    if not os.path.isdir(source):
+        error(f"源目录不存在: {source}")
+        return False
+    
+    index = SourceIndex(source)
+    name = os.path.basename(os.path.normpath(source))
+    engines = [DeployEngine(source, os.path.join(root, name), dry_run=dry_run, index=index)
+               for root in roots]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        reports = list(pool.map(lambda engine: engine.deploy(), engines))
+    
+    ok = True
+    for engine, report in zip(engines, reports):
+        section_header(f"部署 {source} -> {engine.target}")
+        ok = print_deploy_report(report, dry_run) and ok
+    
+    info(f"{len(engines)} 个目标共扫描 {len(index.files)} 个文件一次，"
+         f"实际哈希 {sum(report.hashed for report in reports)} 个")
+    return ok
+
+
+def run_targets(args, roots):
+    """对多个根目录 (作为 $HOME) 并行执行动作配置，--jobs 为全部目标共享的命令并发上限"""
+    limit = threading.Semaphore(max(1, args.jobs))
+    output_lock = threading.Lock()
+    fingerprints = ({}, threading.Lock())
+    shared_actions = ({}, threading.Lock())
+    source_indexes = ({}, threading.Lock())
+    
+    configurators = []
+    for root in roots:
+        configurator = ServiceConfigurator(args.config)
+        configurator.force = args.force
+        configurator.persistent = args.persistent
+        configurator.command_timeout = args.timeout
+        configurator.coalesce = args.coalesce or args.explain
+        configurator.explain = args.explain
+        configurator.use_root(root)
+        configurator.limit = limit
+        configurator.output_lock = output_lock
+        configurator.fingerprints = fingerprints
+        configurator.shared_actions = shared_actions
+        configurator.source_indexes = source_indexes
+        if not configurator.parse_config():
+            return False
+        configurators.append(configurator)
+    
+    with ThreadPoolExecutor(max_workers=len(configurators)) as pool:
+        results = list(pool.map(lambda configurator: configurator.execute_all(args.jobs),
+                                configurators))
+    
+    section_header("多目标结果")
+    for configurator, ok in zip(configurators, results):
+        if ok:
+            success(f"{configurator.label}: 全部完成")
+        else:
+            warning(f"{configurator.label}: 部分失败")
+    return all(results)
+
+
+def link_config(source, target, dry_run=False, remove=False):
+    """链接模式部署 (remove 为 True 时删除链接)"""
+    if not os.path.isdir(source):
+        error(f"源目录不存在: {source}")
+        return False
+    
+    farm = LinkFarm(source, target, dry_run=dry_run)
+    if remove:
+        section_header(f"删除链接 {farm.target} -> {source}")
+        report = farm.unlink()
+        info(f"删除 {report.removed} 个链接，用时 {report.elapsed:.2f}s")
+        success("预览完成，未修改任何文件" if dry_run else "链接已删除!")
+        return True
+    
+    section_header(f"链接 {source} -> {farm.target}")
+    report = farm.link()
+    if report.conflicts:
+        for conflict in report.conflicts:
+            error(conflict)
+        warning(f"存在 {len(report.conflicts)} 处冲突，未做任何修改")
+        return False
+    
+    info(f"整体链接目录 {report.folded}，链接文件 {report.linked}，"
+         f"替换副本 {report.replaced}，已是链接 {report.existing}，用时 {report.elapsed:.2f}s")
+    success("预览完成，未修改任何文件" if dry_run else "配置链接完成!")
+    return True
+
+
+def watch_config(source=None, target=None, reload=False, debounce=30):
+    """监视配置目录并实时同步"""
+    from watcher import ConfigWatcher
+    
+    if source or target:
+        pairs = [(source or os.path.join("lib", ".config"), target or os.path.expanduser("~/.config"))]
+    else:
+        pairs = [(os.path.join("lib", ".config"), os.path.expanduser("~/.config"))]
+        if os.access("/etc", os.W_OK):
+            pairs.append((os.path.join("lib", "etc"), "/etc"))
+        else:
+            warning("没有 /etc 的写入权限，不监视 lib/etc (以 root 运行以同时监视)")
+    
+    for pair_source, _ in pairs:
+        if not os.path.isdir(pair_source):
+            error(f"源目录不存在: {pair_source}")
+            return False
+    
+    section_header("监视配置")
+    try:
+        watcher = ConfigWatcher(pairs, reload=reload, debounce=debounce / 1000)
+    except OSError as e:
+        error(f"无法使用 inotify: {e}")
+        return False
+    watcher.run()
+    return True
+
+
+def backup_config(source):
+    """为配置目录创建快照"""
+    if not os.path.isdir(source):
+        error(f"源目录不存在: {source}")
+        return False
+    
+    section_header(f"备份 {source}")
+    report = SnapshotStore().backup(source)
+    for relpath, message in report.failed:
+        warning(f"{relpath}: {message}")
+    info(f"快照 {report.name}: {report.files} 个文件 ({format_size(report.bytes_total)})，"
+         f"哈希 {report.hashed}，新增对象 {report.stored} ({format_size(report.bytes_stored)})，"
+         f"用时 {report.elapsed:.2f}s")
+    success("配置备份完成!")
+    return True
+
+
+def restore_config(name, target=None):
+    """恢复配置快照"""
+    store = SnapshotStore()
+    resolved = store.resolve(name)
+    if resolved is None:
+        error(f"快照不存在: {name or 'latest'}")
+        return False
+    
+    section_header(f"恢复快照 {resolved}")
+    report = store.restore(resolved, target)
+    for relpath, message in report.failed:
+        error(f"{relpath}: {message}")
+    info(f"{report.files} 个文件，恢复 {report.stored} ({format_size(report.bytes_stored)})，"
+         f"用时 {report.elapsed:.2f}s")
+    if report.failed:
+        warning("部分文件恢复失败")
+        return False
+    success("快照恢复完成!")
+    return True
+
+
+def list_snapshots():
+    """列出全部快照"""
+    snapshots = SnapshotStore().snapshots()
+    if not snapshots:
+        info("没有快照")
+        return True
+    
+    section_header("配置快照")
+    for entry in snapshots:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry['created']))
+        info(f"{entry['name']}  {created}  {entry['source']}  {entry['files']} 个文件  "
+             f"{format_size(entry['size'])} (新增 {format_size(entry['bytes_stored'])})")
+    return True
+
+
+def prune_snapshots(days):
+    """删除过期快照"""
+    removed, freed = SnapshotStore().prune(days)
+    success(f"删除 {removed} 个早于 {days} 天的快照，释放 {format_size(freed)}")
+    return True
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="系统服务配置器")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "deploy", "unlink", "watch", "capture",
+                                 "backup", "restore", "snapshots", "prune"],
+                        help="run 执行动作配置 (默认)，deploy 增量部署配置目录，unlink 删除链接模式的链接，"
+                             "watch 监视并实时同步配置，capture 把本机配置同步回仓库，"
+                             "backup/restore/snapshots/prune 管理配置快照")
+    parser.add_argument("--config", default="lib/actions.conf", help="动作配置文件")
+    parser.add_argument("--jobs", type=int, default=4, metavar="N",
+                        help="同时执行的命令数上限 (capture: 哈希线程数)")
+    parser.add_argument("--force", action="store_true",
+                        help="忽略检查和指纹，重新执行全部命令")
+    parser.add_argument("--persistent", action="store_true",
+                        help="每节使用常驻 bash/fish 执行命令，环境修改在节内保留")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="合并相邻的同类命令 (systemctl、cp 到同一目录、fisher install)，失败时逐条执行")
+    parser.add_argument("--explain", action="store_true",
+                        help="输出合并了哪些命令 (隐含 --coalesce)")
+    parser.add_argument("--timeout", type=int, metavar="SEC",
+                        help="单条命令的超时 (秒)，默认不限制")
+    parser.add_argument("--root", action="append", metavar="DIR",
+                        help="多目标模式 (可重复): run 以 DIR 作为 $HOME 并行执行；"
+                             "deploy (复制模式) 并行部署到 DIR/<源目录名>；其他子命令不支持")
+    parser.add_argument("--source",
+                        help="deploy/unlink/watch: 源目录 (默认 lib/.config)；"
+                             "capture/backup: 本机配置目录 (默认 ~/.config)")
+    parser.add_argument("--target",
+                        help="deploy/unlink/watch: 目标目录 (默认 ~/.config)；capture: 仓库中的目录 (默认 lib/.config)；"
+                             "restore: 恢复到的目录 (默认原目录)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="deploy/unlink/capture: 只统计需要写入的文件，不修改目标目录")
+    parser.add_argument("--link", action="store_true",
+                        help="deploy: 链接模式，用符号链接代替复制")
+    parser.add_argument("--reload", action="store_true",
+                        help="watch: 同步后执行对应程序的重载命令 (如 hyprctl reload)")
+    parser.add_argument("--debounce", type=int, default=30, metavar="MS",
+                        help="watch: 事件安静多久后同步 (毫秒)")
+    parser.add_argument("--snapshot", default="latest",
+                        help="restore: 快照名 (默认最新)")
+    parser.add_argument("--days", type=int, default=30, metavar="N",
+                        help="prune: 删除早于 N 天的快照 (始终保留最新的一个)")
+    return parser.parse_args()
+
+
 def main():
     """主函数"""
-    configurator = ServiceConfigurator("lib/actions.conf")
+    args = parse_args()
+    
+    if args.root and not (args.command == "run" or (args.command == "deploy" and not args.link)):
+        error(f"--root 只支持 run 和 deploy (复制模式)，不支持 {args.command}"
+              + (" --link" if args.command == "deploy" else ""))
+        sys.exit(2)
+    
+    if args.command in ("deploy", "unlink"):
+        source = args.source or os.path.join("lib", ".config")
+        target = args.target or os.path.expanduser("~/.config")
+        if args.root and args.command == "deploy" and not args.link:
+            sys.exit(0 if deploy_targets(source, args.root, args.jobs, args.dry_run) else 1)
+        if args.link or args.command == "unlink":
+            ok = link_config(source, target, args.dry_run, remove=args.command == "unlink")
+        else:
+            ok = deploy_config(source, target, args.dry_run)
+        sys.exit(0 if ok else 1)
+    if args.command == "capture":
+        sys.exit(0 if capture_config(args.source, args.target, args.jobs, args.dry_run) else 1)
+    if args.command == "watch":
+        sys.exit(0 if watch_config(args.source, args.target, args.reload, args.debounce) else 1)
+    if args.command == "backup":
+        sys.exit(0 if backup_config(args.source or os.path.expanduser("~/.config")) else 1)
+    if args.command == "restore":
+        sys.exit(0 if restore_config(args.snapshot, args.target) else 1)
+    if args.command == "snapshots":
+        sys.exit(0 if list_snapshots() else 1)
+    if args.command == "prune":
+        sys.exit(0 if prune_snapshots(args.days) else 1)
+    
+    if args.root:
+        sys.exit(0 if run_targets(args, args.root) else 1)
+    
+    configurator = ServiceConfigurator(args.config)
+    configurator.force = args.force
+    configurator.persistent = args.persistent
+    configurator.command_timeout = args.timeout
+    configurator.coalesce = args.coalesce or args.explain
+    configurator.explain = args.explain
     
     if not configurator.parse_config():
         sys.exit(1)
     
-    if configurator.execute_all():
+    if configurator.execute_all(args.jobs):
         sys.exit(0)
     else:
         sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+常驻 shell 模块
+一个 bash (或 fish) 进程依次执行多条命令，省去每条命令启动 shell 的开销，
+cd、export、source 等对环境的修改会保留给之后的命令。
+
+每条命令通过 eval 执行，结束后向 stdout 和 stderr 各写一个随机分隔符，
+stdout 的分隔符后带退出码；超时时结束整个进程组，下一条命令使用新的进程。
+
+shell 以 --noprofile --norc (fish 为 --no-config) 启动，不读取 ~/.bashrc，
+nvm 这类在 rc 文件中定义的 shell 函数需要先显式 source，例如
+source $HOME/.nvm/nvm.sh，之后同一节的命令才能使用 nvm 和它修改的 PATH
+"""
+
+import os
+import time
+import uuid
+import shlex
+import selectors
+import subprocess
+from dataclasses import dataclass
+
+from stream_runner import LineTail, kill_tree
+
+# 各 shell 的启动参数和包装模板，{command} 已转义，{token} 为分隔符
+SHELLS = {
+    "bash": (["bash", "--noprofile", "--norc"],
+             "eval {command} < /dev/null\n"
+             "printf '\\n%s %d\\n' {token} $?\n"
+             "printf '\\n%s\\n' {token} >&2\n"),
+    "fish": (["fish", "--no-config"],
+             "eval {command} < /dev/null\n"
+             "printf '\\n%s %d\\n' {token} $status\n"
+             "printf '\\n%s\\n' {token} >&2\n"),
+}
+
+
+@dataclass
+class WorkerResult:
+    """单条命令的结果"""
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+
+
+class ShellWorker:
+    """常驻 shell 进程"""
+
+    def __init__(self, shell="bash", cwd=None, tail_lines=40, env=None):
+        self.shell = shell
+        self.cwd = cwd
+        self.env = env
+        self.tail_lines = tail_lines
+        self.process = None
+        self.restarts = 0
+
+    def start(self):
+        """启动 shell，使用独立的进程组便于超时后整体结束"""
+        argv, _ = SHELLS[self.shell]
+        self.process = subprocess.Popen(
+            argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=self.cwd, env=self.env, start_new_session=True
+        )
+
+    def alive(self):
+        """进程是否仍在运行"""
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """关闭 shell"""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                kill_tree(self.process)
+        for stream in (self.process.stdout, self.process.stderr):
+            stream.close()
+        self.process = None
+
+    def restart(self):
+        """结束当前进程 (含子进程) 并启动新的 shell"""
+        if self.process is not None and self.process.poll() is None:
+            kill_tree(self.process)
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def run(self, command, timeout=None):
+        """执行一条命令，返回 WorkerResult"""
+        if not self.alive():
+            if self.process is not None:
+                self.restart()
+            else:
+                self.start()
+
+        token = f"__dotfiles_{uuid.uuid4().hex}__"
+        _, template = SHELLS[self.shell]
+        script = template.format(command=shlex.quote(command), token=token)
+
+        try:
+            self.process.stdin.write(script.encode())
+            self.process.stdin.flush()
+        except OSError:
+            self.restart()
+            return WorkerResult(1, "", "shell 进程已退出")
+
+        return self.collect(token, timeout)
+
+    def collect(self, token, timeout):
+        """读取输出直到两个分隔符都出现"""
+        marker = token.encode()
+        buffers = {self.process.stdout.fileno(): b"", self.process.stderr.fileno(): b""}
+        finished = set()
+        stdout_fd = self.process.stdout.fileno()
+
+        selector = selectors.DefaultSelector()
+        for fd in buffers:
+            selector.register(fd, selectors.EVENT_READ)
+
+        deadline = time.monotonic() + timeout if timeout else None
+        timed_out = False
+        exited = False
+
+        try:
+            while len(finished) < len(buffers):
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    timed_out = True
+                    break
+
+                for key, _ in selector.select(timeout=remaining):
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        # 命令中的 exit 会结束 shell
+                        exited = True
+                        selector.unregister(key.fd)
+                        finished.add(key.fd)
+                        continue
+                    buffers[key.fd] += data
+                    if marker in buffers[key.fd]:
+                        finished.add(key.fd)
+                        selector.unregister(key.fd)
+        finally:
+            selector.close()
+
+        stdout, _, status = buffers[stdout_fd].partition(b"\n" + marker)
+        stderr = buffers[self.process.stderr.fileno()].partition(b"\n" + marker)[0]
+
+        if timed_out or exited:
+            returncode = -9
+            if exited:
+                # 管道关闭时 shell 可能尚未被回收，poll() 还拿不到退出码
+                try:
+                    returncode = self.process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    returncode = None
+            self.restart()
+            return WorkerResult(returncode if returncode is not None else 1,
+                                self.tail(stdout), self.tail(stderr), timed_out)
+
+        try:
+            returncode = int(status.split()[0])
+        except (IndexError, ValueError):
+            returncode = 1
+        return WorkerResult(returncode, self.tail(stdout), self.tail(stderr))
+
+    def tail(self, data):
+        """只保留末尾若干行"""
+        tail = LineTail(self.tail_lines)
+        tail.feed(data)
+        return tail.close()
+
+
+def split_fish_command(command):
+    """'fish -c "..."' 形式的命令返回内部的 fish 命令，否则返回 None"""
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        return None
+    if len(tokens) == 3 and tokens[0] == "fish" and tokens[1] == "-c":
+        return tokens[2]
+    return None
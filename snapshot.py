@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+快照模块
+按内容寻址保存配置目录的快照: 每个文件以 sha256 存入 objects/，内容相同的文件只存一份，
+每个快照只是一份清单 (相对路径 -> 哈希、权限、修改时间)。
+
+重复备份时大小和修改时间与上一个快照一致的文件直接沿用其哈希，不再读取内容，
+未变化的目录树几乎不占用额外空间
+"""
+
+import os
+import stat
+import json
+import time
+from dataclasses import dataclass, field
+
+from deploy import scan_tree, copy_data, hash_file
+
+SNAPSHOT_DIR = os.path.expanduser("~/.cache/dotfiles/snapshots")
+
+# 超过该时间 (秒) 的 .incoming-* 临时文件视为中断遗留，更新的无引用对象也暂不清理
+INCOMING_GRACE = 3600
+
+# 浏览器和应用的缓存目录不需要备份
+DEFAULT_EXCLUDES = [
+    "*/Cache", "*/cache", "*/Code Cache", "*/GPUCache", "*/CachedData",
+    "*/Service Worker/CacheStorage", "*/ShaderCache", "*/GrShaderCache",
+]
+
+
+@dataclass
+class SnapshotReport:
+    """备份或恢复的统计"""
+    name: str = ""
+    files: int = 0
+    hashed: int = 0
+    stored: int = 0
+    bytes_total: int = 0
+    bytes_stored: int = 0
+    failed: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+class SnapshotStore:
+    """内容寻址的快照仓库"""
+
+    def __init__(self, store_dir=SNAPSHOT_DIR):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.manifests_dir = os.path.join(store_dir, "manifests")
+
+    # ==================== 存储模块 ====================
+    def object_path(self, digest):
+        """对象文件路径，按哈希前两位分目录"""
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def store_object(self, path):
+        """复制文件到对象库，返回 (哈希, 是否新写入)；先复制再哈希副本，避免读取时文件被修改"""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        tmp = os.path.join(self.objects_dir, f".incoming-{os.getpid()}-{time.monotonic_ns()}")
+        try:
+            copy_data(path, tmp)
+            digest = hash_file(tmp)
+            target = self.object_path(digest)
+            if os.path.exists(target):
+                os.remove(tmp)
+                return digest, False
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, target)
+            return digest, True
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    # ==================== 清单模块 ====================
+    def manifest_path(self, name):
+        """快照清单路径"""
+        return os.path.join(self.manifests_dir, f"{name}.json")
+
+    def load(self, name):
+        """读取快照清单，不存在时返回 None"""
+        try:
+            with open(self.manifest_path(name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name, manifest):
+        """原子写入快照清单"""
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        path = self.manifest_path(name)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def manifests(self):
+        """全部可读的快照 [(快照名, 清单)]，按创建时间从旧到新
+
+        同一秒内的快照名带 -1、-2 后缀，按字符串排序会把 -10 排在 -2 之前，因此按 created 排序
+        """
+        try:
+            entries = [entry[:-5] for entry in os.listdir(self.manifests_dir) if entry.endswith(".json")]
+        except OSError:
+            return []
+        result = []
+        for name in entries:
+            manifest = self.load(name)
+            if manifest is not None:
+                result.append((name, manifest))
+        result.sort(key=lambda item: (item[1].get('created', 0), item[0]))
+        return result
+
+    def names(self):
+        """全部快照名，按创建时间从旧到新"""
+        return [name for name, _ in self.manifests()]
+
+    def latest(self, source):
+        """同一源目录最近的快照清单"""
+        for _, manifest in reversed(self.manifests()):
+            if manifest.get('source') == source:
+                return manifest
+        return None
+
+    def resolve(self, name):
+        """快照名或 'latest'，返回实际的快照名"""
+        names = self.names()
+        if name in (None, "", "latest"):
+            return names[-1] if names else None
+        return name if name in names else None
+
+    # ==================== 备份模块 ====================
+    def backup(self, source, exclude=DEFAULT_EXCLUDES):
+        """为 source 目录创建快照，返回 SnapshotReport"""
+        start = time.monotonic()
+        source = os.path.abspath(os.path.expanduser(source))
+        previous = (self.latest(source) or {}).get('files', {})
+        base = name = time.strftime("%Y%m%d-%H%M%S")
+        suffix = 1
+        while os.path.exists(self.manifest_path(name)):
+            name = f"{base}-{suffix}"
+            suffix += 1
+        report = SnapshotReport(name=name)
+        files = {}
+
+        for relpath, st in sorted(scan_tree(source, exclude).items()):
+            path = os.path.join(source, relpath)
+            if stat.S_ISLNK(st.st_mode):
+                files[relpath] = {'link': os.readlink(path)}
+                report.files += 1
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+
+            record = previous.get(relpath)
+            digest = None
+            if (record and 'sha256' in record and record['size'] == st.st_size
+                    and record['mtime'] == st.st_mtime_ns
+                    and os.path.exists(self.object_path(record['sha256']))):
+                digest = record['sha256']
+            else:
+                try:
+                    digest, created = self.store_object(path)
+                except OSError as e:
+                    report.failed.append((relpath, str(e)))
+                    continue
+                report.hashed += 1
+                if created:
+                    report.stored += 1
+                    report.bytes_stored += st.st_size
+
+            files[relpath] = {
+                'sha256': digest,
+                'size': st.st_size,
+                'mode': stat.S_IMODE(st.st_mode),
+                'mtime': st.st_mtime_ns,
+            }
+            report.files += 1
+            report.bytes_total += st.st_size
+
+        self.save(name, {
+            'source': source,
+            'created': time.time(),
+            'exclude': list(exclude),
+            'bytes_stored': report.bytes_stored,
+            'files': files,
+        })
+        report.elapsed = time.monotonic() - start
+        return report
+
+    # ==================== 恢复模块 ====================
+    def restore(self, name, target=None):
+        """恢复快照到 target (默认原目录)；内容未变的文件跳过，快照外的文件保留"""
+        start = time.monotonic()
+        manifest = self.load(name)
+        report = SnapshotReport(name=name)
+        target = os.path.abspath(os.path.expanduser(target or manifest['source']))
+
+        for relpath, record in sorted(manifest['files'].items()):
+            dst = os.path.join(target, relpath)
+            report.files += 1
+            try:
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                if 'link' in record:
+                    if os.path.islink(dst) and os.readlink(dst) == record['link']:
+                        continue
+                    tmp = dst + ".restore-tmp"
+                    os.symlink(record['link'], tmp)
+                    os.replace(tmp, dst)
+                    report.stored += 1
+                    continue
+
+                try:
+                    st = os.lstat(dst)
+                    if (stat.S_ISREG(st.st_mode) and st.st_size == record['size']
+                            and (st.st_mtime_ns == record['mtime'] or hash_file(dst) == record['sha256'])):
+                        continue
+                except OSError:
+                    pass
+
+                tmp = dst + ".restore-tmp"
+                copy_data(self.object_path(record['sha256']), tmp)
+                os.chmod(tmp, record['mode'])
+                os.utime(tmp, ns=(record['mtime'], record['mtime']))
+                os.replace(tmp, dst)
+                report.stored += 1
+                report.bytes_stored += record['size']
+            except OSError as e:
+                report.failed.append((relpath, str(e)))
+
+        report.elapsed = time.monotonic() - start
+        return report
+
+    # ==================== 管理模块 ====================
+    def snapshots(self):
+        """全部快照的概要，按时间从旧到新"""
+        result = []
+        for name, manifest in self.manifests():
+            files = manifest['files'].values()
+            result.append({
+                'name': name,
+                'source': manifest['source'],
+                'created': manifest['created'],
+                'files': len(files),
+                'size': sum(record.get('size', 0) for record in files),
+                'bytes_stored': manifest.get('bytes_stored', 0),
+            })
+        return result
+
+    def prune(self, days, keep=1, grace=INCOMING_GRACE):
+        """删除早于 days 天的快照 (每个源目录至少保留最新的 keep 个)，再清理无引用的对象；
+        返回 (删除的快照数, 释放的字节数)"""
+        cutoff = time.time() - days * 86400
+        by_source = {}
+        for name, manifest in self.manifests():
+            by_source.setdefault(manifest.get('source'), []).append((name, manifest))
+
+        removed = 0
+        for snapshots in by_source.values():
+            for name, manifest in snapshots[:max(0, len(snapshots) - keep)]:
+                if manifest['created'] < cutoff:
+                    os.remove(self.manifest_path(name))
+                    removed += 1
+
+        referenced = set()
+        for _, manifest in self.manifests():
+            for record in manifest.get('files', {}).values():
+                if 'sha256' in record:
+                    referenced.add(record['sha256'])
+
+        freed = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                directory = os.path.join(self.objects_dir, prefix)
+                if not os.path.isdir(directory):
+                    # 中断留下的临时文件；较新的可能属于正在进行的备份
+                    if prefix.startswith(".incoming-") and self.older_than(directory, grace):
+                        os.remove(directory)
+                    continue
+                for digest in os.listdir(directory):
+                    path = os.path.join(directory, digest)
+                    # 刚写入的对象可能属于清单尚未保存的备份
+                    if digest not in referenced and self.older_than(path, grace):
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                if not os.listdir(directory):
+                    try:
+                        os.rmdir(directory)
+                    except OSError:
+                        pass
+        return removed, freed
+
+    @staticmethod
+    def older_than(path, seconds):
+        """文件的修改时间是否早于 seconds 秒前"""
+        try:
+            return time.time() - os.path.getmtime(path) > seconds
+        except OSError:
+            return False
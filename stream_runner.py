@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+流式命令执行模块
+逐块读取 stdout/stderr，只保留末尾若干行用于错误报告，
+同时解析 pacman/paru 的进度行，超时后结束整个进程树
+"""
+
+import os
+import re
+import pty
+import time
+import signal
+import codecs
+import selectors
+import subprocess
+from collections import deque
+from dataclasses import dataclass
+
+# ANSI 控制序列
+ANSI_RE = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+PERCENT_RE = re.compile(r'(\d{1,3})%')
+RATE_RE = re.compile(r'(\d+(?:\.\d+)?\s?[KMG]?i?B/s)')
+SIZE_RE = re.compile(r'\d+(?:\.\d+)?\s?[KMG]?i?B\b|\d+:\d+(?::\d+)?')
+
+
+@dataclass
+class StreamResult:
+    """命令执行结果"""
+    returncode: int
+    stdout_tail: str
+    stderr_tail: str
+    timed_out: bool = False
+
+
+def parse_progress(line):
+    """解析进度行，返回 '标签 百分比 速率'，不是进度行时返回 None
+
+    pacman: ' git-2.45.0-1-x86_64   5.4 MiB  10.2 MiB/s 00:01 [####--]  56%'
+            '(1/3) installing git                      [####--]  40%'
+    git:    'Receiving objects:  45% (450/1000), 1.20 MiB | 3.40 MiB/s'
+    """
+    percent = PERCENT_RE.search(line)
+    if not percent:
+        return None
+
+    label = line[:percent.start()].split('[', 1)[0]
+    label = SIZE_RE.sub('', RATE_RE.sub('', label)).split(':', 1)[0].strip()
+    label = " ".join(label.split()[:3])[:40]
+
+    rate = RATE_RE.search(line)
+    parts = [label, f"{percent.group(1)}%"]
+    if rate:
+        parts.append(rate.group(1).replace(' ', ''))
+    return " ".join(part for part in parts if part)
+
+
+def child_pids(pid):
+    """通过 /proc 查找所有子孙进程"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # 第二列是可能包含空格的进程名，从最后一个 ')' 之后解析
+                fields = f.read().rsplit(')', 1)[1].split()
+            parents.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    result = []
+    stack = [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def kill_tree(process, grace=2.0):
+    """结束进程及其子孙进程 (先 SIGTERM，超时后 SIGKILL)"""
+    pids = [process.pid] + child_pids(process.pid)
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                pass
+        try:
+            process.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+class LineTail:
+    """按行切分输出，只保留最后 maxlen 行"""
+
+    def __init__(self, maxlen, on_line=None):
+        self.lines = deque(maxlen=maxlen)
+        self.partial = ""
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.on_line = on_line
+
+    def feed(self, data):
+        """输入一块原始输出，\\r 和 \\n 都视为行结束"""
+        text = self.partial + self.decoder.decode(data)
+        segments = re.split(r'(\r\n|\r|\n)', text)
+        self.partial = segments.pop()
+
+        for segment, sep in zip(segments[::2], segments[1::2]):
+            segment = ANSI_RE.sub('', segment)
+            if self.on_line:
+                self.on_line(segment)
+            # \r 结尾的是进度刷新，不计入末尾行
+            if sep != '\r' and segment.strip():
+                self.lines.append(segment)
+
+    def close(self):
+        """处理最后不完整的一行"""
+        self.feed(b"\n" if self.partial else b"")
+        return "\n".join(self.lines)
+
+
+def run_streaming(cmd, timeout=None, on_progress=None, tail_lines=40, shell=True, **popen_kwargs):
+    """流式执行命令
+
+    on_progress - 进度回调，参数为 parse_progress 的结果；提供时 stdout 接到伪终端，
+                  使 pacman 输出进度条
+    tail_lines  - stdout/stderr 各保留的末尾行数
+    """
+    def handle_line(line):
+        progress = parse_progress(line)
+        if progress:
+            on_progress(progress)
+
+    line_handler = handle_line if on_progress else None
+    stdout_tail = LineTail(tail_lines, line_handler)
+    stderr_tail = LineTail(tail_lines, line_handler)
+
+    master = None
+    if on_progress:
+        master, slave = pty.openpty()
+        stdout = slave
+    else:
+        stdout = subprocess.PIPE
+
+    try:
+        process = subprocess.Popen(cmd, shell=shell, stdin=subprocess.DEVNULL,
+                                   stdout=stdout, stderr=subprocess.PIPE, **popen_kwargs)
+    finally:
+        if master is not None:
+            os.close(slave)
+
+    stdout_fd = master if master is not None else process.stdout.fileno()
+    streams = {stdout_fd: stdout_tail, process.stderr.fileno(): stderr_tail}
+
+    selector = selectors.DefaultSelector()
+    for fd in streams:
+        selector.register(fd, selectors.EVENT_READ)
+
+    deadline = time.monotonic() + timeout if timeout else None
+    timed_out = False
+
+    try:
+        while selector.get_map():
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+
+            for key, _ in selector.select(timeout=remaining):
+                try:
+                    data = os.read(key.fd, 65536)
+                except OSError:
+                    # 伪终端的另一端关闭后读取会返回 EIO
+                    data = b""
+                if data:
+                    streams[key.fd].feed(data)
+                else:
+                    selector.unregister(key.fd)
+
+        if not timed_out:
+            try:
+                remaining = deadline - time.monotonic() if deadline else None
+                process.wait(timeout=max(0, remaining) if remaining is not None else None)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+
+        if timed_out:
+            kill_tree(process)
+    finally:
+        selector.close()
+        if master is not None:
+            os.close(master)
+        if process.stdout:
+            process.stdout.close()
+        process.stderr.close()
+
+    return StreamResult(
+        returncode=process.wait(),
+        stdout_tail=stdout_tail.close(),
+        stderr_tail=stderr_tail.close(),
+        timed_out=timed_out,
+    )
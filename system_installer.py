@@ -16,6 +16,7 @@ from pathlib import Path
 # 导入日志模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from log import info, success, warning, error, section_header, package_start, package_update
+from mirror_rank import rank_mirrors, render_mirrorlist, suggest_parallel_downloads, set_parallel_downloads, describe
 
 @dataclass
 class InstallConfig:
@@ -38,6 +39,12 @@ class InstallConfig:
     # 日志配置
     log_file: str = "/var/log/arch-install.log"
     
+    # 本地缓存镜像代理 (mirror_proxy.py)，例如 http://192.168.1.10:8080；
+    # 为空时读取环境变量 DOTFILES_MIRROR_PROXY
+    mirror_proxy: str = ""
+    # 镜像测速的时间预算 (秒)，为 0 时不测速，按内置顺序写入
+    mirror_rank_budget: float = 5.0
+    
     def __post_init__(self):
         """初始化默认值"""
         if self.base_packages is None:
@@ -45,6 +52,8 @@ class InstallConfig:
                 "base", "base-devel", "linux-lts", "linux-lts-headers", "linux-firmware",
                 "git", "neovim", "networkmanager", "grub", "efibootmgr", "intel-ucode"
             ]
+        if not self.mirror_proxy:
+            self.mirror_proxy = os.environ.get("DOTFILES_MIRROR_PROXY", "")
 
 class ArchInstaller:
     def __init__(self, config: InstallConfig = None):
@@ -302,14 +311,29 @@ w
         info("备份原有镜像列表...")
         self.run_command(["cp", "/etc/pacman.d/mirrorlist", "/etc/pacman.d/mirrorlist.backup"])
         
-        # 使用中国镜像源
-        mirrorlist_content = """Server = https://mirrors.ustc.edu.cn/archlinux/$repo/os/$arch
-Server = https://mirrors.tuna.tsinghua.edu.cn/archlinux/$repo/os/$arch
-Server = https://mirrors.bfsu.edu.cn/archlinux/$repo/os/$arch
-"""
+        # 并发测速，按实测速度排序中国镜像源；代理放在第一行，不可用时 pacman 自动尝试后面的镜像
+        if self.config.mirror_proxy:
+            info(f"使用本地缓存镜像代理: {self.config.mirror_proxy}")
+        if self.config.mirror_rank_budget > 0:
+            info(f"镜像测速 (最多 {self.config.mirror_rank_budget:g}s)...")
+        results = rank_mirrors(budget=self.config.mirror_rank_budget)
+        for result in results:
+            if result.error or result.usable:
+                (info if result.usable else warning)(f"  {result.url}  {describe(result)}")
+                logging.info(f"镜像测速 {result.url}: {describe(result)}")
+        
         info("配置中国镜像源...")
         with open("/etc/pacman.d/mirrorlist", "w") as f:
-            f.write(mirrorlist_content)
+            f.write(render_mirrorlist(results, self.config.mirror_proxy))
+        
+        # 单连接越慢，越需要更多并行下载
+        parallel = suggest_parallel_downloads(results)
+        if parallel:
+            info(f"设置 ParallelDownloads = {parallel}")
+            with open("/etc/pacman.conf", "r") as f:
+                pacman_conf = f.read()
+            with open("/etc/pacman.conf", "w") as f:
+                f.write(set_parallel_downloads(pacman_conf, parallel))
         
         # 更新包数据库
         info("更新包数据库...")
@@ -0,0 +1,6 @@
+"""测试公共设置: 仓库根目录下的模块直接导入"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,72 @@
+"""setup.py 依赖图测试: 执行顺序、失败传播，以及执行前报告的依赖错误"""
+
+import pytest
+
+from setup import ServiceConfigurator
+
+
+@pytest.fixture
+def configure(tmp_path, monkeypatch):
+    """由配置文本建立 ServiceConfigurator，状态文件放在临时目录"""
+    monkeypatch.chdir(tmp_path)
+
+    def configure(text):
+        config = tmp_path / "actions.conf"
+        config.write_text(text)
+        configurator = ServiceConfigurator(str(config))
+        configurator.state_file = str(tmp_path / "state.json")
+        assert configurator.parse_config()
+        return configurator
+    return configure
+
+
+def log_lines(tmp_path):
+    path = tmp_path / "order.log"
+    return path.read_text().split() if path.exists() else []
+
+
+def test_implicit_order_within_and_across_sections(configure, tmp_path):
+    configurator = configure(
+        "[A]\n"
+        "sleep 0.2; echo a1 >> order.log # a1\n"
+        "echo a2 >> order.log # a2\n"
+        "[B]\n"
+        "echo b1 >> order.log # 不写 after 时依赖上一节\n")
+    assert configurator.execute_all(jobs=4)
+    assert log_lines(tmp_path) == ["a1", "a2", "b1"]
+
+
+def test_independent_section_runs_in_parallel(configure, tmp_path):
+    configurator = configure(
+        "[慢]\n"
+        "sleep 0.3; echo slow >> order.log # 慢\n"
+        "[快 @ after=]\n"
+        "echo fast >> order.log # 没有依赖\n"
+        "[之后 @ after=慢,快]\n"
+        "echo last >> order.log # 依赖两节\n")
+    assert configurator.execute_all(jobs=4)
+    assert log_lines(tmp_path) == ["fast", "slow", "last"]
+
+
+def test_explicit_dependency_failure_blocks_dependents(configure, tmp_path):
+    configurator = configure(
+        "[A]\n"
+        "{id=first} false # 失败\n"
+        "{after=first} echo blocked >> order.log # 显式依赖\n"
+        "echo soft >> order.log # 隐式顺序，不受失败影响\n")
+    assert not configurator.execute_all(jobs=2)
+    assert log_lines(tmp_path) == ["soft"]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("[A]\n{after=nowhere} echo x >> order.log # x\n", "依赖 'nowhere' 不存在"),
+    ("[A @ after=B]\necho a >> order.log # a\n[B @ after=A]\necho b >> order.log # b\n", "循环依赖"),
+    ("[A]\n{id=x after=y} echo x >> order.log # x\n{id=y after=x} echo y >> order.log # y\n", "循环依赖"),
+])
+def test_dependency_errors_reported_before_running(configure, tmp_path, text, message):
+    configurator = configure("[先]\necho first >> order.log # 在错误之前\n" + text)
+    _, errors = configurator.build_graph()
+    assert any(message in error for error in errors), errors
+    assert not configurator.execute_all(jobs=2)
+    # 任何命令都没有执行
+    assert log_lines(tmp_path) == []
@@ -0,0 +1,104 @@
+"""setup.py 幂等检查测试: 廉价检查、自动指纹和状态文件"""
+
+import os
+
+import pytest
+
+from setup import ServiceConfigurator
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def configure(tmp_path, monkeypatch):
+    """由配置文本建立 ServiceConfigurator，状态文件放在临时目录"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "input.conf").write_text("v1\n")
+
+    def configure(text, force=False):
+        config = tmp_path / "actions.conf"
+        config.write_text(text)
+        configurator = ServiceConfigurator(str(config))
+        configurator.state_file = str(tmp_path / "state.json")
+        configurator.home_dir = str(tmp_path / "home")
+        configurator.force = force
+        assert configurator.parse_config()
+        return configurator
+    return configure
+
+
+def runs(tmp_path):
+    path = tmp_path / "runs.log"
+    return path.read_text().split() if path.exists() else []
+
+
+def test_unchanged_fingerprint_is_skipped(configure, tmp_path):
+    text = "[A]\ncat lib/input.conf > /dev/null && echo copy >> runs.log # 输入文件来自命令\n"
+    assert configure(text).execute_all()
+    assert configure(text).execute_all()
+    assert runs(tmp_path) == ["copy"]
+
+    # 输入文件变化后重新执行
+    (tmp_path / "lib" / "input.conf").write_text("v2\n")
+    assert configure(text).execute_all()
+    assert runs(tmp_path) == ["copy", "copy"]
+
+    # 命令文本变化也会重新执行
+    assert configure(text.replace("copy", "copy2")).execute_all()
+    assert runs(tmp_path) == ["copy", "copy", "copy2"]
+
+
+def test_force_and_always(configure, tmp_path):
+    text = ("[A]\n"
+            "echo once >> runs.log # 指纹\n"
+            "{always=true} echo always >> runs.log # 每次执行\n")
+    configure(text).execute_all()
+    configure(text).execute_all()
+    assert runs(tmp_path) == ["once", "always", "always"]
+    configure(text, force=True).execute_all()
+    assert runs(tmp_path)[-2:] == ["once", "always"]
+
+
+def test_failure_clears_fingerprint(configure, tmp_path):
+    marker = tmp_path / "ok"
+    text = "[A]\necho run >> runs.log; test -e ok # 第一次失败\n"
+    assert not configure(text).execute_all()
+    marker.write_text("")
+    assert configure(text).execute_all()
+    assert configure(text).execute_all()
+    assert runs(tmp_path) == ["run", "run"]
+
+
+def test_cheap_checks(configure, tmp_path):
+    (tmp_path / "home").mkdir()
+    (tmp_path / "home" / "done").write_text("")
+    digest = ServiceConfigurator().hash_file(str(tmp_path / "lib" / "input.conf"))
+    configurator = configure(
+        "[A]\n"
+        "{check=exists:$HOME/done} echo exists >> runs.log # 路径存在\n"
+        "{check=exists:$HOME/missing} echo missing >> runs.log # 路径不存在\n"
+        f"{{check=hash:lib/input.conf:{digest}}} echo hash >> runs.log # 哈希一致\n"
+        "{check=\"cmd:test -e runs.log\"} echo cmd >> runs.log # 检查命令\n")
+    assert configurator.execute_all(jobs=1)
+    assert runs(tmp_path) == ["missing"]
+
+
+def test_unknown_check_fails(configure, tmp_path):
+    assert not configure("[A]\n{check=bogus:x} echo x >> runs.log # 未知检查\n").execute_all()
+    assert runs(tmp_path) == []
+
+
+def test_shipped_yarn_check_does_not_need_path(tmp_path):
+    # yarn 在 nvm 的 node 目录中，检查不能依赖 PATH
+    configurator = ServiceConfigurator(os.path.join(REPO_ROOT, "lib", "actions.conf"))
+    assert configurator.parse_config()
+    yarn = next(action for action in configurator.sections["Node.js配置"]
+                if "yarn" in action.command)
+    configurator.home_dir = str(tmp_path)
+    assert not configurator.check_action(yarn.check)
+
+    bin_dir = tmp_path / ".nvm" / "versions" / "node" / "v22.16.0" / "bin"
+    bin_dir.mkdir(parents=True)
+    (bin_dir / "yarn").write_text("")
+    assert configurator.check_action(yarn.check)
@@ -0,0 +1,77 @@
+"""AUR 构建池调度测试: 获取、构建和安装都用替身代替"""
+
+import pytest
+
+from aur_builder import AurBuildPool
+from pkg_installer import PackageInstaller
+
+
+# 包名 -> 依赖；missing 既未安装也不在仓库中
+SRCINFO = {
+    "leaf": [],
+    "app": ["leaf"],
+    "broken": ["missing"],
+    "uses-broken": ["broken"],
+    "top": ["uses-broken"],
+}
+
+
+@pytest.fixture
+def installer(monkeypatch):
+    installer = PackageInstaller()
+    calls = {"built": [], "installed": [], "helper": []}
+
+    monkeypatch.setattr(AurBuildPool, "fetch", lambda self, name: (f"/build/{name}", ""))
+    monkeypatch.setattr(AurBuildPool, "read_srcinfo", lambda self, pkg_dir: {
+        "pkgbase": "", "pkgnames": [], "depends": SRCINFO[pkg_dir.rsplit('/', 1)[1]],
+        "makedepends": [], "checkdepends": []})
+
+    def build(self, name, pkg_dir):
+        calls["built"].append(name)
+        return True, "", [f"/build/{name}/{name}.pkg.tar.zst"]
+
+    def install_batch(names, manager=None):
+        calls["helper"].append(list(names))
+        return {name: (True, "") for name in names}
+
+    def install_built_package(name, files):
+        calls["installed"].append(name)
+        return True, ""
+
+    monkeypatch.setattr(AurBuildPool, "build", build)
+    monkeypatch.setattr(installer, "check_package_installed", lambda name: False)
+    monkeypatch.setattr(installer, "is_repo_package", lambda name: False)
+    monkeypatch.setattr(installer, "install_batch", install_batch)
+    monkeypatch.setattr(installer, "install_built_package", install_built_package)
+    monkeypatch.setattr(installer, "lookup_aur_cache", lambda plan: ({}, {name: "" for name in plan}))
+    return installer, calls
+
+
+def test_builds_in_dependency_order(installer):
+    installer, calls = installer
+    results = installer.install_aur_packages(["app", "leaf"])
+    assert results == {"app": (True, ""), "leaf": (True, "")}
+    assert calls["installed"] == ["leaf", "app"]
+    assert calls["helper"] == []
+
+
+def test_fallback_propagates_to_dependents(installer):
+    installer, calls = installer
+    results = installer.install_aur_packages(["top", "uses-broken", "broken", "leaf"])
+
+    # 依赖链上的包全部交给 AUR 助手，不会被误判为循环依赖
+    assert all(ok for ok, _ in results.values()), results
+    assert set(results) == {"top", "uses-broken", "broken", "leaf"}
+    assert sorted(calls["helper"][0]) == ["broken", "top", "uses-broken"]
+    assert calls["built"] == ["leaf"]
+
+
+def test_fetch_failure_sends_dependents_to_helper(installer, monkeypatch):
+    installer, calls = installer
+    fetch = AurBuildPool.fetch
+    monkeypatch.setattr(AurBuildPool, "fetch", lambda self, name: (None, "获取失败")
+                        if name == "leaf" else fetch(self, name))
+    results = installer.install_aur_packages(["app", "leaf"])
+    assert results["leaf"] == (False, "获取失败")
+    assert results["app"] == (True, "")
+    assert calls["helper"] == [["app"]]
@@ -0,0 +1,59 @@
+"""aur_cache.BinaryPackageCache 测试: 多个实例共用一个缓存目录，模拟共享挂载点上的多台机器"""
+
+import threading
+
+from aur_cache import BinaryPackageCache
+
+
+def build(tmp_path, name, size=1024):
+    """生成一个假的构建产物"""
+    path = tmp_path / "build" / f"{name}-1.0-1-x86_64.pkg.tar.zst"
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_store_and_lookup(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = BinaryPackageCache(cache_dir)
+    assert cache.lookup("foo", "k1") is None
+    assert cache.store("foo", "k1", [build(tmp_path, "foo")])
+
+    # 另一台机器上的实例看到同一条目
+    other = BinaryPackageCache(cache_dir)
+    assert other.lookup("foo", "k1") == [f"{cache_dir}/foo-1.0-1-x86_64.pkg.tar.zst"]
+    assert (other.summary()["hits"], cache.summary()["misses"]) == (["foo"], ["foo"])
+
+
+def test_concurrent_stores_keep_all_entries(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    names = [f"pkg{number}" for number in range(16)]
+    files = {name: build(tmp_path, name) for name in names}
+    # 每个实例在写入前都已读过 (空的) 索引
+    caches = {name: BinaryPackageCache(cache_dir) for name in names}
+    barrier = threading.Barrier(len(names))
+
+    def store(name):
+        barrier.wait()
+        caches[name].store(name, f"key-{name}", [files[name]])
+
+    threads = [threading.Thread(target=store, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    index = BinaryPackageCache(cache_dir).index
+    assert sorted(entry["pkgname"] for entry in index.values()) == sorted(names)
+
+
+def test_eviction_uses_merged_index(tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = BinaryPackageCache(str(cache_dir), max_size_mb=1)
+    second = BinaryPackageCache(str(cache_dir), max_size_mb=1)
+    first.store("old", "k-old", [build(tmp_path, "old", 600 * 1024)])
+    # second 的内存索引里没有 old，淘汰时仍应看到并删除它
+    second.store("new", "k-new", [build(tmp_path, "new", 600 * 1024)])
+
+    assert list(BinaryPackageCache(str(cache_dir)).index) == ["k-new"]
+    assert sorted(path.name for path in cache_dir.glob("*.pkg.tar.zst")) == ["new-1.0-1-x86_64.pkg.tar.zst"]
@@ -0,0 +1,105 @@
+"""setup.ConfigCapture 测试: 增量捕获、清单和删除"""
+
+import os
+
+import pytest
+
+from setup import ConfigCapture, capture_config
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """本机配置 home/.config 与仓库 repo/lib/.config，清单写在临时 HOME 下"""
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    config = tmp_path / "home" / ".config"
+    (config / "app" / "sub").mkdir(parents=True)
+    (config / "app" / "a.conf").write_text("a\n")
+    (config / "app" / "sub" / "b.conf").write_text("b\n")
+    (config / "single.conf").write_text("single\n")
+    (tmp_path / "repo" / "lib" / ".config").mkdir(parents=True)
+    return tmp_path
+
+
+def capture(root, dry_run=False):
+    pairs = [(str(root / "home" / ".config" / entry), str(root / "repo" / "lib" / ".config" / entry))
+             for entry in ("app", "single.conf", "absent")]
+    config_capture = ConfigCapture(pairs, dry_run=dry_run)
+    config_capture.capture()
+    return config_capture
+
+
+def actions(config_capture, root):
+    repo = root / "repo" / "lib" / ".config"
+    return sorted((action, os.path.relpath(path, repo)) for action, path, _ in config_capture.changes)
+
+
+def test_first_capture_copies_everything(tree):
+    result = capture(tree)
+    repo = tree / "repo" / "lib" / ".config"
+    assert actions(result, tree) == [("新增", "app/a.conf"), ("新增", "app/sub/b.conf"),
+                                     ("新增", "single.conf")]
+    assert result.missing == [str(tree / "home" / ".config" / "absent")]
+    assert (repo / "app" / "sub" / "b.conf").read_text() == "b\n"
+    assert (repo / "single.conf").read_text() == "single\n"
+
+
+def test_rerun_hashes_nothing(tree):
+    capture(tree)
+    result = capture(tree)
+    assert (result.changes, result.hashed, result.unchanged) == ([], 0, 3)
+
+
+def test_only_modified_file_is_written(tree):
+    capture(tree)
+    (tree / "home" / ".config" / "app" / "a.conf").write_text("changed\n")
+    result = capture(tree)
+    assert actions(result, tree) == [("更新", "app/a.conf")]
+    assert result.hashed == 1
+    assert (tree / "repo" / "lib" / ".config" / "app" / "a.conf").read_text() == "changed\n"
+
+
+def test_deleted_files_are_removed_from_repo(tree):
+    capture(tree)
+    (tree / "home" / ".config" / "app" / "sub" / "b.conf").unlink()
+    result = capture(tree)
+    repo = tree / "repo" / "lib" / ".config"
+    assert actions(result, tree) == [("删除", "app/sub/b.conf")]
+    assert not (repo / "app" / "sub").exists()
+    assert (repo / "app" / "a.conf").exists()
+
+    # 删除的文件也从清单中移除，再次运行没有变化
+    assert str(repo / "app" / "sub" / "b.conf") not in result.manifest
+    assert capture(tree).changes == []
+
+
+def test_dry_run_writes_nothing(tree):
+    result = capture(tree, dry_run=True)
+    assert len(result.changes) == 3
+    assert os.listdir(tree / "repo" / "lib" / ".config") == []
+    assert not os.path.exists(result.manifest_file)
+
+
+def test_linked_config_is_skipped(tree):
+    repo_app = tree / "repo" / "lib" / ".config" / "app"
+    os.rename(tree / "home" / ".config" / "app", repo_app)
+    os.symlink(repo_app, tree / "home" / ".config" / "app")
+    result = capture(tree)
+    assert result.linked == [str(tree / "home" / ".config" / "app")]
+    assert actions(result, tree) == [("新增", "single.conf")]
+
+
+def test_capture_config_reads_backup_list(tree, monkeypatch):
+    script = tree / "repo" / "lib" / ".config" / "self" / "script"
+    script.mkdir(parents=True)
+    (script / "update_dotfiles.sh").write_text(
+        "#!/bin/bash\n"
+        "BACKUP_FILES=(\n"
+        "    app # 应用\n"
+        '    "single.conf"\n'
+        ")\n")
+    monkeypatch.chdir(tree / "repo")
+    assert ConfigCapture.read_backup_list(str(script / "update_dotfiles.sh")) == ["app", "single.conf"]
+
+    capture_config(source=str(tree / "home" / ".config"))
+    assert (tree / "repo" / "lib" / ".config" / "app" / "sub" / "b.conf").read_text() == "b\n"
+    assert (tree / "repo" / "lib" / ".config" / "single.conf").read_text() == "single\n"
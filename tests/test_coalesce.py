@@ -0,0 +1,69 @@
+"""coalesce.merge_commands 测试"""
+
+import pytest
+
+from coalesce import merge_commands
+from setup import ServiceConfigurator
+
+
+def test_systemctl_enable_merged():
+    assert merge_commands(["sudo systemctl enable a.service", "sudo systemctl enable b.service"]) \
+        == "sudo systemctl enable a.service b.service"
+
+
+def test_enable_then_start_becomes_enable_now():
+    assert merge_commands(["sudo systemctl enable x.service", "sudo systemctl start x.service"]) \
+        == "sudo systemctl enable --now x.service"
+
+
+def test_cp_to_same_directory_merged():
+    assert merge_commands(["sudo cp -r a b /etc/", "sudo cp -r c /etc/"]) == "sudo cp -r a b c /etc/"
+    assert merge_commands(["sudo cp -r a /etc/", "sudo cp -r c /etc/systemd/"]) is None
+
+
+def test_fisher_install_merged():
+    assert merge_commands(['fish -c "fisher install a"', 'fish -c "fisher install b"']) \
+        == "fish -c 'fisher install a b'"
+
+
+def test_home_is_kept_for_textual_expansion():
+    # setup.py 在执行前把 $HOME 按文本替换，引用后仍然有效
+    assert merge_commands(["cp a $HOME/.config/", "cp b $HOME/.config/"]) \
+        == "cp a b '$HOME/.config/'"
+
+
+@pytest.mark.parametrize("commands", [
+    ["cp x $XDG_CONFIG_HOME/", "cp y $XDG_CONFIG_HOME/"],
+    ["cp x ${HOME}/", "cp y ${HOME}/"],
+    ["cp $FILE /etc/", "cp y /etc/"],
+    ["sudo systemctl enable $UNIT", "sudo systemctl enable b.service"],
+    ['fish -c "fisher install $PLUGIN"', 'fish -c "fisher install b"'],
+    ["cp $(ls) /etc/", "cp y /etc/"],
+])
+def test_other_variables_not_merged(commands):
+    assert merge_commands(commands) is None
+
+
+def test_shell_syntax_not_merged():
+    assert merge_commands(["sudo cp a /etc/ && true", "sudo cp b /etc/"]) is None
+    assert merge_commands(["sudo cp *.conf /etc/", "sudo cp b /etc/"]) is None
+
+
+def test_unparsable_fish_command_not_merged():
+    assert merge_commands(['fish -c "echo it\'s"', 'fish -c "fisher install b"']) is None
+    assert merge_commands(['fish -c "fisher install a*"', 'fish -c "fisher install b"']) is None
+
+
+def test_coalesce_groups_survive_unparsable_commands(tmp_path):
+    config = tmp_path / "actions.conf"
+    config.write_text(
+        "[fish]\n"
+        'fish -c "echo it\'s" # 引号不配对\n'
+        'fish -c "fisher install a" # a\n'
+        'fish -c "fisher install b" # b\n')
+    configurator = ServiceConfigurator(str(config))
+    assert configurator.parse_config()
+    tasks, errors = configurator.build_graph()
+    assert errors == []
+    groups = configurator.coalesce_groups(tasks)
+    assert [[tasks[index].action.index for index in group] for group in groups.values()] == [[2, 3]]
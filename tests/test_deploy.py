@@ -0,0 +1,94 @@
+"""deploy.DeployEngine 测试: 增量复制、清单和删除"""
+
+import os
+
+import pytest
+
+from deploy import DeployEngine, SourceIndex
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """源目录 src 和目标目录 dst，清单与哈希缓存放在临时目录"""
+    source = tmp_path / "src"
+    (source / "app" / "sub").mkdir(parents=True)
+    (source / "app" / "a.conf").write_text("a\n")
+    (source / "app" / "sub" / "b.conf").write_text("b\n")
+    (source / "top.conf").write_text("top\n")
+    os.symlink("top.conf", source / "alias.conf")
+    return tmp_path
+
+
+def deploy(root, dry_run=False):
+    """每次部署重新扫描源目录，与 setup.py deploy 相同"""
+    cache = str(root / "cache")
+    index = SourceIndex(str(root / "src"), cache_dir=cache)
+    engine = DeployEngine(str(root / "src"), str(root / "dst"), manifest_dir=cache,
+                          dry_run=dry_run, index=index)
+    return engine.deploy()
+
+
+def test_first_deploy_copies_everything(tree):
+    report = deploy(tree)
+    assert (report.scanned, report.copied, report.unchanged, report.failed) == (4, 4, 0, [])
+    assert (tree / "dst" / "app" / "sub" / "b.conf").read_text() == "b\n"
+    assert os.readlink(tree / "dst" / "alias.conf") == "top.conf"
+    assert report.methods.get("symlink") == 1
+
+
+def test_rerun_copies_and_hashes_nothing(tree):
+    deploy(tree)
+    report = deploy(tree)
+    assert (report.copied, report.unchanged, report.hashed) == (0, 4, 0)
+
+
+def test_only_changed_files_are_copied(tree):
+    deploy(tree)
+    (tree / "src" / "app" / "a.conf").write_text("a2\n")
+    report = deploy(tree)
+    assert (report.copied, report.unchanged) == (1, 3)
+    assert (tree / "dst" / "app" / "a.conf").read_text() == "a2\n"
+
+
+def test_target_modified_outside_is_restored(tree):
+    deploy(tree)
+    (tree / "dst" / "top.conf").write_text("edited\n")
+    report = deploy(tree)
+    assert report.copied == 1
+    assert (tree / "dst" / "top.conf").read_text() == "top\n"
+
+
+def test_deleted_source_files_are_removed(tree):
+    deploy(tree)
+    (tree / "src" / "app" / "sub" / "b.conf").unlink()
+    report = deploy(tree)
+    assert report.removed == 1
+    assert not (tree / "dst" / "app" / "sub").exists()
+    assert (tree / "dst" / "app" / "a.conf").exists()
+
+    # 已移出清单，再次部署不会重复删除
+    assert deploy(tree).removed == 0
+
+
+def test_modified_target_is_kept_when_source_deleted(tree):
+    deploy(tree)
+    (tree / "dst" / "top.conf").write_text("local changes\n")
+    (tree / "src" / "top.conf").unlink()
+    report = deploy(tree)
+    assert (report.removed, report.kept) == (0, ["top.conf"])
+    assert (tree / "dst" / "top.conf").read_text() == "local changes\n"
+
+
+def test_unmanaged_target_files_are_untouched(tree):
+    (tree / "dst").mkdir()
+    (tree / "dst" / "mine.conf").write_text("mine\n")
+    deploy(tree)
+    deploy(tree)
+    assert (tree / "dst" / "mine.conf").read_text() == "mine\n"
+
+
+def test_dry_run_writes_nothing(tree):
+    report = deploy(tree, dry_run=True)
+    assert report.copied == 4
+    assert not (tree / "dst").exists()
+    assert not (tree / "cache").exists()
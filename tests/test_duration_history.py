@@ -0,0 +1,61 @@
+"""按耗时历史计算超时的测试"""
+
+import json
+
+import pytest
+
+from duration_history import DurationHistory
+from pkg_installer import PackageInstaller
+
+
+class FakeSyncDb:
+    """只认识 repo-pkg 的同步数据库替身"""
+
+    def is_repo_target(self, name):
+        return name == "repo-pkg"
+
+
+@pytest.fixture
+def installer(tmp_path):
+    installer = PackageInstaller()
+    installer.history = DurationHistory(path=str(tmp_path / "history.json"))
+    return installer
+
+
+def test_timeout_for_unknown_packages(installer):
+    # 没有同步数据库时无法判断是否为 AUR 包，使用仓库包的默认超时
+    assert installer.package_timeout("anything") == 200
+    assert installer.package_timeout(["a", "b"]) == 400
+
+    installer.sync_db = FakeSyncDb()
+    assert installer.package_timeout("repo-pkg") == 200
+    assert installer.package_timeout("aur-pkg") == 1800
+
+
+def test_timeout_from_history(installer):
+    for duration in (10, 12, 11):
+        installer.history.record("slow", duration)
+    assert installer.package_timeout("slow") == 60
+    for duration in (100, 120, 110):
+        installer.history.record("slower", duration)
+    assert installer.package_timeout("slower") == 360
+
+
+def test_history_saved_per_section(installer, monkeypatch, tmp_path):
+    calls = []
+
+    def run_with_timeout(cmd, timeout=None, show_progress=True):
+        calls.append(cmd)
+        # 第二个包安装时用户中断
+        if len(calls) == 2:
+            installer.interrupted = True
+            return False, "操作被用户中断"
+        return True, ""
+
+    monkeypatch.setattr(installer, "run_with_timeout", run_with_timeout)
+    monkeypatch.setattr(installer, "check_package_finished", lambda name: False)
+    monkeypatch.setattr(installer, "refresh_package_index", lambda: None)
+    installer.process_section("Base", ["first # 第一个", "second # 第二个", "third # 第三个"])
+
+    saved = json.loads((tmp_path / "history.json").read_text())
+    assert list(saved) == ["first"]
@@ -0,0 +1,193 @@
+"""hardware 测试: 伪造的 sysfs/procfs 目录树"""
+
+import sys
+import json
+
+import pytest
+
+import pkg_installer
+from hardware import HardwareProbe, parse_overrides, split_section_header
+from pacman_db import LocalPackageIndex, SyncDatabase
+from pkg_installer import PackageInstaller
+from test_pacman_db import desc, write_db
+
+
+@pytest.fixture
+def fake_root(tmp_path):
+    """NVIDIA 显卡、AMD 处理器、有蓝牙、没有电池的台式机"""
+    gpu = tmp_path / "sys" / "bus" / "pci" / "devices" / "0000:01:00.0"
+    gpu.mkdir(parents=True)
+    (gpu / "vendor").write_text("0x10DE\n")
+    bridge = tmp_path / "sys" / "bus" / "pci" / "devices" / "0000:00:00.0"
+    bridge.mkdir()
+    (bridge / "vendor").write_text("0x1022\n")
+
+    (tmp_path / "proc").mkdir()
+    (tmp_path / "proc" / "cpuinfo").write_text(
+        "processor\t: 0\nvendor_id\t: AuthenticAMD\nmodel name\t: AMD Ryzen\n")
+
+    (tmp_path / "sys" / "class" / "bluetooth" / "hci0").mkdir(parents=True)
+    mains = tmp_path / "sys" / "class" / "power_supply" / "AC"
+    mains.mkdir(parents=True)
+    (mains / "type").write_text("Mains\n")
+    return tmp_path
+
+
+def test_pci(fake_root):
+    probe = HardwareProbe(str(fake_root))
+    assert probe.check("pci:nvidia")
+    assert probe.check("pci:10de")
+    assert probe.check("pci:0x1022")
+    assert not probe.check("pci:intel")
+
+
+def test_cpu(fake_root):
+    probe = HardwareProbe(str(fake_root))
+    assert probe.check("cpu:amd")
+    assert probe.check("cpu:AMD")
+    assert not probe.check("cpu:intel")
+
+
+def test_bluetooth_and_battery(fake_root):
+    probe = HardwareProbe(str(fake_root))
+    assert probe.check("bluetooth")
+    assert not probe.check("battery")
+
+    supply = fake_root / "sys" / "class" / "power_supply" / "BAT0"
+    supply.mkdir()
+    (supply / "type").write_text("Battery\n")
+    assert HardwareProbe(str(fake_root)).check("battery")
+
+
+def test_missing_tree(tmp_path):
+    probe = HardwareProbe(str(tmp_path))
+    assert not probe.check("pci:nvidia")
+    assert not probe.check("cpu:intel")
+    assert not probe.check("bluetooth")
+    assert not probe.check("battery")
+
+
+def test_negation_and_matches(fake_root):
+    probe = HardwareProbe(str(fake_root))
+    assert probe.check("!battery")
+    assert not probe.check("!bluetooth")
+    assert probe.matches(["pci:nvidia", "!battery"])
+    assert not probe.matches(["pci:nvidia", "battery"])
+    assert probe.matches([])
+
+
+def test_unknown_condition(fake_root):
+    probe = HardwareProbe(str(fake_root))
+    for condition in ("usb:logitech", "bluetooth:yes", "pci:", "!wifi"):
+        with pytest.raises(ValueError):
+            probe.check(condition)
+
+
+def test_detected_once(fake_root):
+    probe = HardwareProbe(str(fake_root))
+    assert probe.check("bluetooth")
+    (fake_root / "sys" / "class" / "bluetooth" / "hci0").rmdir()
+    assert probe.check("bluetooth")
+
+
+def test_split_section_header():
+    assert split_section_header("Graphics Drivers @ pci:nvidia !battery") == \
+        ("Graphics Drivers", ["pci:nvidia", "!battery"])
+    assert split_section_header("Base") == ("Base", [])
+
+
+def test_overrides(fake_root):
+    overrides = parse_overrides(["pci:intel", "!Bluetooth", "battery"])
+    assert overrides == {"pci:intel": True, "bluetooth": False, "battery": True}
+
+    probe = HardwareProbe(str(fake_root), overrides)
+    assert probe.check("pci:intel")
+    assert probe.check("pci:nvidia")
+    assert not probe.check("bluetooth")
+    assert probe.check("battery")
+    assert not probe.check("!battery")
+
+
+PKGS_CONF = """\
+[Base]
+git
+
+[Graphics Drivers @ pci:nvidia]
+nvidia-dkms
+
+[Intel Graphics @ pci:intel]
+intel-media-driver
+
+[Laptop @ battery]
+tlp
+
+[Future @ usb:something]
+future-pkg
+"""
+
+
+@pytest.fixture
+def installer(fake_root, tmp_path):
+    installer = PackageInstaller()
+    installer.hardware = HardwareProbe(str(fake_root))
+    installer.package_index = LocalPackageIndex(str(tmp_path / "db"))
+    (tmp_path / "db" / "local").mkdir(parents=True)
+    installer.package_index.load()
+    return installer
+
+
+def test_parse_config_skips_disabled_sections(installer, tmp_path):
+    config = tmp_path / "pkgs.conf"
+    config.write_text(PKGS_CONF)
+
+    sections = installer.parse_config_file(str(config))
+    # 未知条件按满足处理
+    assert sections == {
+        "Base": ["git"],
+        "Graphics Drivers": ["nvidia-dkms"],
+        "Future": ["future-pkg"],
+    }
+
+
+def test_disabled_sections_make_no_package_manager_calls(installer, tmp_path, monkeypatch):
+    config = tmp_path / "pkgs.conf"
+    config.write_text(PKGS_CONF)
+    commands = []
+    monkeypatch.setattr(installer, "run_with_timeout",
+                        lambda cmd, timeout=None, show_progress=True: commands.append(cmd) or (True, ""))
+
+    installer.install_sections(installer.parse_config_file(str(config)))
+    targets = [command.split()[-1] for command in commands]
+    assert targets == ["git", "nvidia-dkms", "future-pkg"]
+
+
+def test_hardware_option(installer, tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["pkg_installer.py", "plan",
+                                      "--hardware", "pci:intel", "--hardware", "!pci:nvidia"])
+    args = pkg_installer.parse_args()
+    installer.hardware = HardwareProbe(installer.hardware.root, parse_overrides(args.hardware))
+
+    config = tmp_path / "pkgs.conf"
+    config.write_text(PKGS_CONF)
+    assert list(installer.parse_config_file(str(config))) == ["Base", "Intel Graphics", "Future"]
+
+
+def test_plan_json_stdout_is_only_json(installer, tmp_path, monkeypatch, capsys):
+    db_path = tmp_path / "db"
+    (db_path / "sync").mkdir()
+    write_db(db_path / "sync" / "core.db", [(name, desc(name)) for name in
+                                            ("git", "nvidia-dkms", "intel-media-driver", "tlp")])
+    (tmp_path / "pacman.conf").write_text("[core]\n")
+    monkeypatch.setattr(pkg_installer, "SyncDatabase", lambda path: SyncDatabase(
+        path, cache_file=str(tmp_path / "syncdb.json"), pacman_conf=str(tmp_path / "pacman.conf")))
+    monkeypatch.setattr(installer, "load_history", lambda: None)
+    installer.db_path = str(db_path)
+    installer.config_file = str(tmp_path / "pkgs.conf")
+    (tmp_path / "pkgs.conf").write_text(PKGS_CONF)
+
+    installer.plan(as_json=True)
+    captured = capsys.readouterr()
+    plan = json.loads(captured.out)
+    assert [section["name"] for section in plan["sections"]] == ["Base", "Graphics Drivers", "Future"]
+    # 跳过部分的提示只出现在 stderr
+    assert "跳过部分 Intel Graphics" in captured.err
@@ -0,0 +1,48 @@
+"""journal.InstallJournal 测试: 中断后恢复、全部成功后不再恢复"""
+
+from journal import InstallJournal
+
+
+def test_resume_after_interrupted_run(tmp_path):
+    journal = InstallJournal(str(tmp_path / "journal.jsonl"))
+    journal.open("fp")
+    journal.record("base", "git", "DONE", 1.0)
+    journal.close()
+
+    journal = InstallJournal(str(tmp_path / "journal.jsonl"))
+    journal.open("fp")
+    assert journal.is_finished("git")
+    journal.close()
+
+
+def test_complete_run_is_not_resumed(tmp_path):
+    journal = InstallJournal(str(tmp_path / "journal.jsonl"))
+    journal.open("fp")
+    journal.record("base", "git", "DONE", 1.0)
+    journal.record("base", "vim", "SKIP")
+    assert journal.failures == 0
+    journal.complete()
+    journal.close()
+
+    journal = InstallJournal(str(tmp_path / "journal.jsonl"))
+    journal.open("fp")
+    assert not journal.is_finished("git")
+    assert not journal.is_finished("vim")
+    journal.close()
+
+
+def test_failures_are_counted(tmp_path):
+    journal = InstallJournal(str(tmp_path / "journal.jsonl"))
+    journal.open("fp")
+    journal.record("base", "git", "DONE", 1.0)
+    journal.record("base", "broken", "FAIL", 1.0)
+    assert journal.failures == 1
+    journal.close()
+
+    # 失败的运行不写完成标记，下次只重试未完成的包
+    journal = InstallJournal(str(tmp_path / "journal.jsonl"))
+    journal.open("fp")
+    assert journal.is_finished("git")
+    assert not journal.is_finished("broken")
+    assert journal.failures == 0
+    journal.close()
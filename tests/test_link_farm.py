@@ -0,0 +1,103 @@
+"""deploy.LinkFarm 测试: 折叠、拆分、冲突和删除链接"""
+
+import os
+
+import pytest
+
+from deploy import DeployEngine, LinkFarm, SourceIndex
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """源目录 src: nvim/ (含子目录)、fish/ 和一个顶层文件"""
+    source = tmp_path / "src"
+    (source / "nvim" / "lua").mkdir(parents=True)
+    (source / "nvim" / "init.lua").write_text("init\n")
+    (source / "nvim" / "lua" / "plugins.lua").write_text("plugins\n")
+    (source / "fish").mkdir()
+    (source / "fish" / "config.fish").write_text("fish\n")
+    (source / "starship.toml").write_text("starship\n")
+    return tmp_path
+
+
+def farm(root, dry_run=False):
+    return LinkFarm(str(root / "src"), str(root / "dst"), dry_run=dry_run)
+
+
+def points_to(path, target):
+    return os.path.islink(path) and os.path.realpath(path) == os.path.realpath(target)
+
+
+def test_missing_directories_are_folded(tree):
+    report = farm(tree).link()
+    assert (report.folded, report.linked, report.conflicts) == (2, 1, [])
+    # 每个目录只用一个相对链接
+    assert points_to(tree / "dst" / "nvim", tree / "src" / "nvim")
+    assert not os.path.isabs(os.readlink(tree / "dst" / "nvim"))
+    assert points_to(tree / "dst" / "starship.toml", tree / "src" / "starship.toml")
+
+    # 再次执行没有任何操作
+    report = farm(tree).link()
+    assert (report.folded, report.linked, report.replaced, report.existing) == (0, 0, 0, 3)
+
+
+def test_existing_directory_with_foreign_files_is_split(tree):
+    (tree / "dst" / "nvim").mkdir(parents=True)
+    (tree / "dst" / "nvim" / "local.lua").write_text("mine\n")
+
+    report = farm(tree).link()
+    assert report.conflicts == []
+    # nvim 中有外来文件，逐项链接而不是整体替换
+    assert not os.path.islink(tree / "dst" / "nvim")
+    assert points_to(tree / "dst" / "nvim" / "init.lua", tree / "src" / "nvim" / "init.lua")
+    assert points_to(tree / "dst" / "nvim" / "lua", tree / "src" / "nvim" / "lua")
+    assert (tree / "dst" / "nvim" / "local.lua").read_text() == "mine\n"
+    assert points_to(tree / "dst" / "fish", tree / "src" / "fish")
+
+
+def test_copy_mode_targets_are_folded(tree):
+    cache = str(tree / "cache")
+    DeployEngine(str(tree / "src"), str(tree / "dst"), manifest_dir=cache,
+                 index=SourceIndex(str(tree / "src"), cache_dir=cache)).deploy()
+
+    report = farm(tree).link()
+    # 目标是源文件的副本，可以安全替换为链接
+    assert (report.replaced, report.conflicts) == (3, [])
+    assert points_to(tree / "dst" / "nvim", tree / "src" / "nvim")
+
+
+def test_conflicts_abort_without_changes(tree):
+    (tree / "dst" / "fish").mkdir(parents=True)
+    (tree / "dst" / "fish" / "config.fish").write_text("different\n")
+
+    report = farm(tree).link()
+    assert len(report.conflicts) == 1 and "config.fish" in report.conflicts[0]
+    # 有冲突时其他路径也不做修改
+    assert sorted(os.listdir(tree / "dst")) == ["fish"]
+    assert (tree / "dst" / "fish" / "config.fish").read_text() == "different\n"
+
+
+def test_stale_link_is_replaced(tree):
+    # 指向源目录中已删除路径的失效链接
+    (tree / "dst").mkdir()
+    (tree / "dst" / "starship.toml").symlink_to("../src/deleted.toml")
+
+    report = farm(tree).link()
+    assert (report.replaced, report.conflicts) == (1, [])
+    assert (tree / "dst" / "starship.toml").read_text() == "starship\n"
+
+
+def test_dry_run_and_unlink(tree):
+    (tree / "dst" / "nvim").mkdir(parents=True)
+    (tree / "dst" / "nvim" / "local.lua").write_text("mine\n")
+
+    report = farm(tree, dry_run=True).link()
+    assert report.linked + report.folded == 4
+    assert sorted(os.listdir(tree / "dst")) == ["nvim"]
+
+    farm(tree).link()
+    report = farm(tree).unlink()
+    assert report.removed == 4
+    # 只剩外来文件，由链接组成的目录已删除
+    assert sorted(os.listdir(tree / "dst")) == ["nvim"]
+    assert os.listdir(tree / "dst" / "nvim") == ["local.lua"]
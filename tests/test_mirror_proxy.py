@@ -0,0 +1,168 @@
+"""mirror_proxy 测试: 本地 HTTP 替身作为上游，检查只下载一次、边下载边转发和数据库重新验证"""
+
+import time
+import threading
+import urllib.error
+import urllib.request
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mirror_proxy import MirrorCache, MirrorProxy
+
+PACKAGE = "core/os/x86_64/bash-5.2-1-x86_64.pkg.tar.zst"
+DATABASE = "core/os/x86_64/core.db"
+LAST_MODIFIED = formatdate(1700000000, usegmt=True)
+
+
+class Upstream(ThreadingHTTPServer):
+    """上游替身: files 为 {路径: 内容}，每块之间等待 chunk_delay 秒"""
+
+    daemon_threads = True
+
+    def __init__(self, files, chunk_delay=0.0):
+        self.files = files
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        super().__init__(("127.0.0.1", 0), UpstreamHandler)
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/archlinux"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path[len("/archlinux/"):]
+        self.server.requests.append((path, self.headers.get("If-Modified-Since")))
+        if path not in self.server.files:
+            self.send_error(404)
+            return
+        if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = self.server.files[path]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        for offset in range(0, len(data), 16384):
+            self.wfile.write(data[offset:offset + 16384])
+            self.wfile.flush()
+            time.sleep(self.server.chunk_delay)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def proxy_for(tmp_path):
+    """启动指向给定上游的代理"""
+    servers = []
+
+    def start(upstreams, **options):
+        cache = MirrorCache(str(tmp_path / "cache"), [upstream.url for upstream in upstreams], **options)
+        server = MirrorProxy(("127.0.0.1", 0), cache)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def get(url, headers=None):
+    """返回 (状态码, 内容)"""
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, b""
+
+
+def test_fetch_once_with_concurrent_clients(proxy_for):
+    data = bytes(range(256)) * 1024
+    upstream = Upstream({PACKAGE: data}, chunk_delay=0.01)
+    try:
+        proxy = proxy_for([upstream])
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: get(f"{proxy.url}/{PACKAGE}"), range(4)))
+        assert results == [(200, data)] * 4
+        assert get(f"{proxy.url}/{PACKAGE}") == (200, data)
+        assert [path for path, _ in upstream.requests] == [PACKAGE]
+    finally:
+        upstream.close()
+
+
+def test_miss_is_streamed(proxy_for):
+    # 上游约 1.6 秒才发完，首字节应远早于此到达
+    data = b"x" * (16384 * 32)
+    upstream = Upstream({PACKAGE: data}, chunk_delay=0.05)
+    try:
+        proxy = proxy_for([upstream])
+        start = time.monotonic()
+        with urllib.request.urlopen(f"{proxy.url}/{PACKAGE}", timeout=10) as response:
+            first = response.read(1)
+            first_byte = time.monotonic() - start
+            body = first + response.read()
+        assert first_byte < 0.5
+        assert body == data
+        assert time.monotonic() - start > 1.0
+    finally:
+        upstream.close()
+
+
+def test_range_and_fallback_upstream(proxy_for):
+    data = b"0123456789" * 1000
+    broken = Upstream({})
+    upstream = Upstream({PACKAGE: data})
+    try:
+        proxy = proxy_for([broken, upstream])
+        assert get(f"{proxy.url}/{PACKAGE}", {"Range": "bytes=10-19"}) == (206, data[10:20])
+        assert get(f"{proxy.url}/{PACKAGE}", {"Range": "bytes=-5"}) == (206, data[-5:])
+        assert get(f"{proxy.url}/core/os/x86_64/missing.pkg.tar.zst")[0] == 404
+    finally:
+        broken.close()
+        upstream.close()
+
+
+def test_database_revalidated_after_max_age(proxy_for):
+    upstream = Upstream({DATABASE: b"db", PACKAGE: b"pkg"})
+    try:
+        proxy = proxy_for([upstream], db_max_age=0)
+        for _ in range(2):
+            assert get(f"{proxy.url}/{DATABASE}") == (200, b"db")
+            assert get(f"{proxy.url}/{PACKAGE}") == (200, b"pkg")
+        # 数据库第二次带 If-Modified-Since 重新验证，包文件只下载一次
+        assert upstream.requests == [
+            (DATABASE, None), (PACKAGE, None), (DATABASE, LAST_MODIFIED),
+        ]
+        assert proxy.cache.stats['revalidated'] == 1
+    finally:
+        upstream.close()
+
+
+def test_lru_eviction(proxy_for):
+    files = {f"core/os/x86_64/p{i}.pkg.tar.zst": b"x" * 600 * 1024 for i in range(3)}
+    upstream = Upstream(files)
+    try:
+        proxy = proxy_for([upstream], max_size_mb=1)
+        for path in files:
+            assert get(f"{proxy.url}/{path}")[0] == 200
+            time.sleep(0.05)
+        time.sleep(0.2)
+        assert list(proxy.cache.index) == ["core/os/x86_64/p2.pkg.tar.zst"]
+        assert proxy.cache.stats['evicted'] == 2
+    finally:
+        upstream.close()
@@ -0,0 +1,211 @@
+"""mirror_rank 测试: 用本地替身模拟快、慢、出错、返回垃圾数据和不响应的镜像"""
+
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import mirror_rank
+from mirror_rank import (MirrorResult, probe_mirror, rank_mirrors, render_mirrorlist,
+                         set_parallel_downloads, suggest_parallel_downloads)
+
+DATABASE = b"x" * (256 * 1024)
+
+
+class Mirror(ThreadingHTTPServer):
+    """HTTP 镜像替身: 首字节前等待 first_byte_delay 秒，每 16 KiB 之间等待 chunk_delay 秒"""
+
+    daemon_threads = True
+
+    def __init__(self, status=200, first_byte_delay=0.0, chunk_delay=0.0):
+        self.status = status
+        self.first_byte_delay = first_byte_delay
+        self.chunk_delay = chunk_delay
+        self.paths = []
+        super().__init__(("127.0.0.1", 0), MirrorHandler)
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/archlinux"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        time.sleep(self.server.first_byte_delay)
+        if self.server.status != 200:
+            self.send_error(self.server.status)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(DATABASE)))
+        self.end_headers()
+        try:
+            for offset in range(0, len(DATABASE), 16384):
+                self.wfile.write(DATABASE[offset:offset + 16384])
+                self.wfile.flush()
+                time.sleep(self.server.chunk_delay)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RawServer:
+    """非 HTTP 的替身: reply 为 None 时接受连接但从不响应，否则发送 reply 后关闭"""
+
+    def __init__(self, reply=None):
+        self.reply = reply
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.connections = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.sock.getsockname()[1]}/archlinux"
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            if self.reply is not None:
+                try:
+                    conn.recv(65536)
+                    conn.sendall(self.reply)
+                except OSError:
+                    pass
+                conn.close()
+
+    def close(self):
+        self.sock.close()
+        for conn in self.connections:
+            conn.close()
+
+
+def closed_port_url():
+    """一个没有监听的端口"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}/archlinux"
+
+
+@pytest.fixture
+def servers():
+    started = []
+    yield started
+    for server in started:
+        server.close()
+
+
+def test_probe_measures_database_download(servers):
+    mirror = Mirror()
+    servers.append(mirror)
+    result = probe_mirror(mirror.url, time.monotonic() + 5)
+    assert result.usable and not result.error
+    assert result.downloaded == len(DATABASE)
+    assert result.connect is not None and result.first_byte is not None
+    assert mirror.paths[-1] == "/archlinux/core/os/x86_64/core.db"
+
+
+def test_probe_garbage_reply_is_an_error(servers):
+    garbage = RawServer(b"SSH-2.0-OpenSSH_9.6\r\n\r\n")
+    servers.append(garbage)
+    result = probe_mirror(garbage.url, time.monotonic() + 5)
+    assert not result.usable and result.error
+
+
+def test_probe_http_error_and_refused_connection(servers):
+    failing = Mirror(status=500)
+    servers.append(failing)
+    assert probe_mirror(failing.url, time.monotonic() + 5).error
+    assert probe_mirror(closed_port_url(), time.monotonic() + 5).error
+
+
+def test_rank_orders_fast_before_slow_and_failures_last(servers):
+    fast = Mirror()
+    slow = Mirror(first_byte_delay=0.2, chunk_delay=0.02)
+    failing = Mirror(status=404)
+    garbage = RawServer(b"garbage\r\n\r\n")
+    servers.extend([fast, slow, failing, garbage])
+    refused = closed_port_url()
+
+    results = rank_mirrors([garbage.url, slow.url, refused, fast.url, failing.url], budget=5.0)
+
+    assert [result.url for result in results] == [fast.url, slow.url, garbage.url, refused, failing.url]
+    assert [result.usable for result in results] == [True, True, False, False, False]
+    assert all(result.error for result in results[2:])
+    assert suggest_parallel_downloads(results) is not None
+
+
+def test_rank_respects_budget(servers):
+    fast = Mirror()
+    hanging = RawServer()
+    slow = Mirror(chunk_delay=0.1)
+    servers.extend([fast, hanging, slow])
+
+    start = time.monotonic()
+    results = rank_mirrors([hanging.url, slow.url, fast.url], budget=1.0)
+    assert time.monotonic() - start < 1.6
+
+    by_url = {result.url: result for result in results}
+    assert results[0].url == fast.url
+    assert by_url[hanging.url].error
+    # 预算用完时按已下载的部分计算吞吐量
+    assert by_url[slow.url].usable and 0 < by_url[slow.url].downloaded < len(DATABASE)
+
+
+def test_rank_survives_unexpected_probe_error(servers, monkeypatch):
+    fast = Mirror()
+    servers.append(fast)
+    probe = mirror_rank.probe_mirror
+
+    def flaky_probe(url, *args):
+        if url.endswith("/broken"):
+            raise RuntimeError("意外错误")
+        return probe(url, *args)
+
+    monkeypatch.setattr(mirror_rank, "probe_mirror", flaky_probe)
+    results = rank_mirrors(["http://127.0.0.1:1/broken", fast.url], budget=2.0)
+    assert [result.url for result in results] == [fast.url, "http://127.0.0.1:1/broken"]
+    assert results[1].error == "意外错误"
+
+
+def test_zero_budget_skips_probing(servers):
+    mirror = Mirror()
+    servers.append(mirror)
+    results = rank_mirrors([mirror.url + "/"], budget=0)
+    assert [(result.url, result.usable, result.error) for result in results] == [(mirror.url, False, "")]
+    assert mirror.paths == []
+    assert suggest_parallel_downloads(results) is None
+
+
+def test_render_mirrorlist_puts_proxy_first():
+    results = [MirrorResult("https://a", connect=0.01, first_byte=0.02, throughput=2e6),
+               MirrorResult("https://b", error="超出时间预算")]
+    lines = render_mirrorlist(results, proxy="http://127.0.0.1:7878/").splitlines()
+    servers = [line for line in lines if line.startswith("Server")]
+    assert servers == ["Server = http://127.0.0.1:7878/$repo/os/$arch",
+                       "Server = https://a/$repo/os/$arch",
+                       "Server = https://b/$repo/os/$arch"]
+    assert "# 测速失败: 超出时间预算" in lines
+
+
+def test_set_parallel_downloads():
+    assert set_parallel_downloads("[options]\n#ParallelDownloads = 5\n", 6) \
+        == "[options]\nParallelDownloads = 6\n"
+    assert set_parallel_downloads("[options]\nHoldPkg = pacman\n", 4) \
+        == "[options]\nParallelDownloads = 4\nHoldPkg = pacman\n"
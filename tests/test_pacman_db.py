@@ -0,0 +1,161 @@
+"""pacman_db.SyncDatabase 测试: 用临时生成的 .db 压缩包代替 /var/lib/pacman/sync"""
+
+import io
+import os
+import json
+import tarfile
+
+import pytest
+
+from pacman_db import LocalPackageIndex, SyncDatabase
+from pkg_installer import PackageInstaller
+
+
+def desc(name, version="1.0-1", provides=(), groups=()):
+    """生成 desc 文件内容"""
+    lines = ["%NAME%", name, "", "%VERSION%", version, "", "%CSIZE%", "100", "", "%ISIZE%", "200", ""]
+    if provides:
+        lines += ["%PROVIDES%", *provides, ""]
+    if groups:
+        lines += ["%GROUPS%", *groups, ""]
+    return "\n".join(lines) + "\n"
+
+
+def write_db(path, packages):
+    """写入仓库数据库: packages 为 [(包名, desc 内容)]"""
+    with tarfile.open(path, "w:gz") as archive:
+        for name, text in packages:
+            data = text.encode()
+            member = tarfile.TarInfo(f"{name}-1.0-1/desc")
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+
+
+@pytest.fixture
+def pacman_root(tmp_path):
+    """包含 core、extra 两个仓库的假数据库目录"""
+    sync_dir = tmp_path / "sync"
+    sync_dir.mkdir()
+    write_db(sync_dir / "core.db", [
+        ("glibc", desc("glibc")),
+        ("bash", desc("bash", provides=["sh"])),
+        ("shared", desc("shared", version="1.0-core")),
+    ])
+    write_db(sync_dir / "extra.db", [
+        ("xorg-server", desc("xorg-server", groups=["xorg"])),
+        ("xorg-xinit", desc("xorg-xinit", groups=["xorg"])),
+        ("shared", desc("shared", version="2.0-extra")),
+    ])
+    (tmp_path / "pacman.conf").write_text("[options]\nParallelDownloads = 5\n\n[core]\n\n[extra]\n")
+    return tmp_path
+
+
+def new_db(root):
+    """指向假目录的 SyncDatabase"""
+    return SyncDatabase(db_path=str(root), cache_file=str(root / "cache" / "syncdb.json"),
+                        pacman_conf=str(root / "pacman.conf"))
+
+
+def test_classify(pacman_root):
+    db = new_db(pacman_root)
+    assert db.load()
+    assert db.classify("glibc") == "repo"
+    assert db.classify("xorg") == "group"
+    assert db.classify("sh") == "provide"
+    assert db.classify("sh>=1") == "provide"
+    assert db.classify("yay-bin") == "aur"
+    assert sorted(db.resolve("xorg")) == ["xorg-server", "xorg-xinit"]
+    assert db.resolve("sh") == ["bash"]
+    assert db.resolve("yay-bin") == []
+
+
+def test_repo_order_precedence(pacman_root):
+    db = new_db(pacman_root)
+    db.load()
+    assert db.packages["shared"]["repo"] == "core"
+    assert db.packages["shared"]["version"] == "1.0-core"
+
+    # pacman.conf 中 extra 在前时以 extra 为准
+    (pacman_root / "pacman.conf").write_text("[options]\n[extra]\n[core]\n")
+    db = new_db(pacman_root)
+    db.load()
+    assert db.packages["shared"]["repo"] == "extra"
+    assert db.packages["shared"]["version"] == "2.0-extra"
+
+
+def test_cache_reused_when_unchanged(pacman_root, monkeypatch):
+    new_db(pacman_root).load()
+    assert os.path.exists(pacman_root / "cache" / "syncdb.json")
+
+    def fail(*args):
+        raise AssertionError("缓存有效时不应重新解析数据库")
+
+    db = new_db(pacman_root)
+    monkeypatch.setattr(db, "load_repo", fail)
+    assert db.load()
+    assert db.classify("bash") == "repo"
+
+
+def test_cache_invalidated_by_size(pacman_root):
+    new_db(pacman_root).load()
+    write_db(pacman_root / "sync" / "core.db", [
+        ("glibc", desc("glibc")),
+        ("zsh", desc("zsh")),
+    ])
+    db = new_db(pacman_root)
+    db.load()
+    assert db.classify("zsh") == "repo"
+    assert db.classify("bash") == "aur"
+
+
+def test_cache_invalidated_by_mtime(pacman_root):
+    new_db(pacman_root).load()
+
+    # 在缓存里加入一个假包，指纹不变时应直接使用缓存
+    cache_file = pacman_root / "cache" / "syncdb.json"
+    cache = json.loads(cache_file.read_text())
+    cache["packages"]["ghost"] = dict(cache["packages"]["glibc"])
+    cache_file.write_text(json.dumps(cache))
+    db = new_db(pacman_root)
+    db.load()
+    assert db.classify("ghost") == "repo"
+
+    # 只修改时间变化 (大小不变) 也应重新解析
+    path = pacman_root / "sync" / "core.db"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    db = new_db(pacman_root)
+    db.load()
+    assert db.classify("ghost") == "aur"
+    assert db.classify("glibc") == "repo"
+
+
+def write_local(root, packages):
+    """写入本地数据库: packages 为 [(包名, desc 内容)]"""
+    for name, text in packages:
+        entry = root / "local" / f"{name}-1.0-1"
+        entry.mkdir(parents=True)
+        (entry / "desc").write_text(text)
+
+
+def test_partial_group_not_installed(pacman_root):
+    write_local(pacman_root, [("xorg-server", desc("xorg-server", groups=["xorg"])),
+                              ("bash", desc("bash", provides=["sh"]))])
+    index = LocalPackageIndex(str(pacman_root))
+    assert index.load()
+    assert index.is_installed("bash") and index.is_installed("sh")
+    # 只装了组中的一个成员: 没有完整成员列表时不判断，交给 --needed
+    assert not index.is_installed("xorg")
+    assert not index.is_installed("xorg", ["xorg-server", "xorg-xinit"])
+    assert index.is_installed("xorg", ["xorg-server"])
+
+    installer = PackageInstaller()
+    installer.db_path = str(pacman_root)
+    installer.package_index = index
+    installer.sync_db = new_db(pacman_root)
+    installer.sync_db.load()
+    assert not installer.check_package_installed("xorg")
+
+    write_local(pacman_root, [("xorg-xinit", desc("xorg-xinit", groups=["xorg"]))])
+    index.refresh()
+    assert installer.check_package_installed("xorg")
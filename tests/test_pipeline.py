@@ -0,0 +1,77 @@
+"""流水线预取测试: pacman 调用用替身记录，不实际下载"""
+
+import sys
+
+import pytest
+
+import pkg_installer
+from pkg_installer import PackageInstaller
+
+
+@pytest.fixture
+def installer(monkeypatch):
+    installer = PackageInstaller()
+    installer.run_as_root = True
+    installer.sync_db = object()
+    commands = []
+
+    def run_with_timeout(cmd, timeout=None, show_progress=True):
+        commands.append(cmd)
+        return True, ""
+
+    monkeypatch.setattr(installer, "run_with_timeout", run_with_timeout)
+    monkeypatch.setattr(installer, "section_repo_targets", lambda lines: list(lines))
+    monkeypatch.setattr(installer, "check_cache_space", lambda targets: True)
+    monkeypatch.setattr(installer, "package_timeout", lambda targets: 60)
+    return installer, commands
+
+
+def test_prefetch_uses_separate_cache_dir(installer, monkeypatch):
+    installer, commands = installer
+    foreground = []
+    monkeypatch.setattr(installer, "process_section", lambda name, lines: foreground.append(
+        installer.build_batch_command(lines, "pacman")))
+
+    installer.pipeline = True
+    installer.install_sections({"A": ["a"], "B": ["b"], "C": ["c"]})
+
+    prefetch_dir = "/var/cache/pacman/pkg/prefetch"
+    assert commands[0] == f"install -d {prefetch_dir}"
+    prefetches = [cmd for cmd in commands if cmd.startswith("pacman -Sw")]
+    assert len(prefetches) == 2
+    # 预取写入预取目录，主缓存只用于查找
+    assert all(f"--cachedir {prefetch_dir} --cachedir /var/cache/pacman/pkg " in cmd for cmd in prefetches)
+    # 安装事务下载到主缓存，同时查找预取目录
+    assert foreground == [
+        f"pacman -S --needed --cachedir /var/cache/pacman/pkg --cachedir {prefetch_dir} --noconfirm {name}"
+        for name in "abc"]
+    # 结束后把预取的包移入主缓存，之后的命令不再带预取目录
+    assert commands[-1].startswith("sh -c ") and "rm -rf" in commands[-1]
+    assert installer.prefetch_cache_dir is None
+    assert installer.build_batch_command(["a"], "pacman") == "pacman -S --needed --noconfirm a"
+
+
+def test_prefetch_depth(installer, monkeypatch):
+    installer, commands = installer
+    monkeypatch.setattr(installer, "process_section", lambda name, lines: None)
+    installer.pipeline = True
+    installer.prefetch_depth = 1
+    installer.install_sections({name: [name.lower()] for name in "ABCD"})
+    assert len([cmd for cmd in commands if cmd.startswith("pacman -Sw")]) == 3
+
+
+def test_falls_back_when_prefetch_dir_fails(installer, monkeypatch):
+    installer, _ = installer
+    sections = []
+    monkeypatch.setattr(installer, "run_with_timeout", lambda cmd, timeout=None, show_progress=True:
+                        (False, "权限不足"))
+    monkeypatch.setattr(installer, "process_section", lambda name, lines: sections.append(name))
+    installer.pipeline = True
+    installer.install_sections({"A": ["a"], "B": ["b"]})
+    assert sections == ["A", "B"]
+
+
+def test_prefetch_depth_option(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["pkg_installer.py", "--pipeline", "--prefetch-depth", "4"])
+    args = pkg_installer.parse_args()
+    assert (args.pipeline, args.prefetch_depth) == (True, 4)
@@ -0,0 +1,67 @@
+"""pkg_reconcile 测试: 被注释的包只在是已知包名且所在部分启用时才移除"""
+
+import pytest
+
+from hardware import HardwareProbe
+from pacman_db import LocalPackageIndex
+from pkg_installer import PackageInstaller
+from pkg_reconcile import PackageReconciler
+
+PKGS_CONF = """\
+[Base]
+git             # 版本控制
+# vim           # 换用 neovim
+# fonts
+# optional
+
+[Laptop @ battery]
+# tlp           # 电源管理
+"""
+
+
+def install(local_dir, name, groups=(), reason="0"):
+    """在伪造的本地数据库中加入一个包"""
+    entry = local_dir / f"{name}-1.0-1"
+    entry.mkdir(parents=True)
+    lines = ["%NAME%", name, "", "%VERSION%", "1.0-1", "", "%REASON%", reason, ""]
+    if groups:
+        lines += ["%GROUPS%", *groups, ""]
+    (entry / "desc").write_text("\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def reconciler(tmp_path):
+    local_dir = tmp_path / "db" / "local"
+    for name in ("git", "vim", "tlp"):
+        install(local_dir, name)
+    # 名为 fonts 的包组，"# fonts" 这样的说明不能把组成员删掉
+    install(local_dir, "noto-fonts", groups=["fonts"])
+
+    installer = PackageInstaller()
+    installer.hardware = HardwareProbe(root=str(tmp_path / "hw"))
+    installer.package_index = LocalPackageIndex(str(tmp_path / "db"))
+    installer.package_index.load()
+    return PackageReconciler(installer)
+
+
+def test_only_known_packages_in_enabled_sections_are_removed(reconciler, tmp_path):
+    config = tmp_path / "pkgs.conf"
+    config.write_text(PKGS_CONF)
+
+    wanted, commented = reconciler.read_intentions(str(config))
+    assert wanted == ["git"]
+    assert commented == {"vim"}
+
+    diff = reconciler.diff(str(config))
+    assert diff["remove"] == ["vim"]
+    assert diff["install_repo"] == diff["install_aur"] == []
+
+
+def test_enabled_section_removals(reconciler, tmp_path):
+    supply = tmp_path / "hw" / "sys" / "class" / "power_supply" / "BAT0"
+    supply.mkdir(parents=True)
+    (supply / "type").write_text("Battery\n")
+    config = tmp_path / "pkgs.conf"
+    config.write_text(PKGS_CONF)
+
+    assert reconciler.diff(str(config))["remove"] == ["tlp", "vim"]
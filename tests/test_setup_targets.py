@@ -0,0 +1,106 @@
+"""setup.py 多目标模式 (--root) 测试"""
+
+import argparse
+import os
+import sys
+
+import pytest
+
+import deploy
+import setup
+from setup import Action, ServiceConfigurator, run_targets
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """隔离状态文件和部署缓存，源目录 src 中有两个文件"""
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src" / "app").mkdir(parents=True)
+    (tmp_path / "src" / "app" / "a.conf").write_text("a\n")
+    (tmp_path / "src" / "b.conf").write_text("b\n")
+
+    cache_dir = str(tmp_path / "cache")
+    indexes = []
+
+    class CountingIndex(setup.SourceIndex):
+        def __init__(self, source):
+            super().__init__(source, cache_dir=cache_dir)
+            indexes.append(self)
+
+    monkeypatch.setattr(setup, "SourceIndex", CountingIndex)
+    monkeypatch.setattr(setup, "DeployEngine", lambda source, target, **kwargs: deploy.DeployEngine(
+        source, target, manifest_dir=cache_dir, **kwargs))
+    return tmp_path, indexes
+
+
+def make_args(config, jobs=4, coalesce=False):
+    return argparse.Namespace(config=str(config), jobs=jobs, force=False, persistent=False,
+                              timeout=None, coalesce=coalesce, explain=False)
+
+
+def test_host_actions_run_once(workspace):
+    tmp_path, _ = workspace
+    config = tmp_path / "actions.conf"
+    config.write_text(
+        "[主机]\n"
+        f"{{scope=host}} echo host >> {tmp_path}/host.log # 主机级\n"
+        "mkdir -p $HOME && echo target >> $HOME/target.log # 每个目标\n")
+    roots = [tmp_path / "r1", tmp_path / "r2", tmp_path / "r3"]
+
+    assert run_targets(make_args(config), [str(root) for root in roots])
+    assert (tmp_path / "host.log").read_text() == "host\n"
+    for root in roots:
+        assert (root / "target.log").read_text() == "target\n"
+
+
+def test_host_action_detection():
+    configurator = ServiceConfigurator()
+    host = Action("s", 1, "sudo systemctl enable a.service", "")
+    user = Action("s", 2, "systemctl --user enable b.service", "")
+    copy = Action("s", 3, "sudo cp lib/x $HOME/.config/", "")
+    assert configurator.is_host_action(host)
+    assert not configurator.is_host_action(user)
+    assert not configurator.is_host_action(copy)
+    assert configurator.is_host_action(Action("s", 4, "echo", "", scope="host"))
+    assert not configurator.is_host_action(Action("s", 5, "sudo true", "", scope="target"))
+
+
+def test_deploy_action_runs_in_process_with_shared_index(workspace, monkeypatch):
+    tmp_path, indexes = workspace
+    config = tmp_path / "actions.conf"
+    config.write_text(
+        "[部署]\n"
+        "python3 setup.py deploy --source src --target $HOME/.config # 部署\n")
+    roots = [tmp_path / "r1", tmp_path / "r2"]
+
+    def no_subprocess(*args, **kwargs):
+        raise AssertionError("不应启动子进程")
+
+    monkeypatch.setattr(setup.subprocess, "run", no_subprocess)
+    assert run_targets(make_args(config), [str(root) for root in roots])
+
+    # 两个目标共用一次扫描，每个源文件只哈希一次
+    assert len(indexes) == 1
+    assert sorted(indexes[0].digests) == ["app/a.conf", "b.conf"]
+    for root in roots:
+        assert (root / ".config" / "app" / "a.conf").read_text() == "a\n"
+        assert (root / ".config" / "b.conf").read_text() == "b\n"
+
+
+def test_parse_deploy_falls_back_for_other_forms(workspace):
+    tmp_path, _ = workspace
+    configurator = ServiceConfigurator()
+    configurator.use_root(str(tmp_path / "r1"))
+    assert configurator.parse_deploy("python3 setup.py deploy") == (
+        os.path.join(str(tmp_path), "lib", ".config"), str(tmp_path / "r1" / ".config"), False)
+    assert configurator.parse_deploy("python3 setup.py deploy --link") is None
+    assert configurator.parse_deploy("python3 setup.py backup --source $HOME/.config") is None
+
+
+@pytest.mark.parametrize("argv", [["unlink"], ["deploy", "--link"], ["watch"], ["capture"]])
+def test_root_rejected_for_unsupported_commands(argv, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["setup.py", *argv, "--root", "/nonexistent"])
+    with pytest.raises(SystemExit) as exit_info:
+        setup.main()
+    assert exit_info.value.code == 2
@@ -0,0 +1,45 @@
+"""shell_worker.ShellWorker 测试"""
+
+import pytest
+
+from shell_worker import ShellWorker, split_fish_command
+
+
+@pytest.fixture
+def worker():
+    worker = ShellWorker()
+    yield worker
+    worker.stop()
+
+
+def test_exit_code_of_exit_command(worker):
+    assert worker.run("exit 3", timeout=5).returncode == 3
+    # exit 结束 shell 后自动启动新的进程
+    result = worker.run("echo ok", timeout=5)
+    assert (result.returncode, result.stdout) == (0, "ok")
+    assert worker.restarts == 1
+
+
+def test_environment_carries_over(worker):
+    assert worker.run("export DOTFILES_TEST=42; cd /tmp", timeout=5).returncode == 0
+    assert worker.run("echo $DOTFILES_TEST $PWD", timeout=5).stdout == "42 /tmp"
+
+
+def test_stderr_per_command(worker):
+    result = worker.run("echo out; echo err >&2; false", timeout=5)
+    assert (result.returncode, result.stdout, result.stderr) == (1, "out", "err")
+    assert worker.run("true", timeout=5).stderr == ""
+
+
+def test_timeout_restarts_worker(worker):
+    worker.run("export DOTFILES_TEST=1", timeout=5)
+    result = worker.run("sleep 5", timeout=0.3)
+    assert result.timed_out and result.returncode == -9
+    # 新的 shell 不保留之前的环境
+    assert worker.run("echo ${DOTFILES_TEST:-unset}", timeout=5).stdout == "unset"
+
+
+def test_split_fish_command():
+    assert split_fish_command('fish -c "fisher install jethrokuan/z"') == "fisher install jethrokuan/z"
+    assert split_fish_command("fish") is None
+    assert split_fish_command("echo 'unterminated") is None
@@ -0,0 +1,96 @@
+"""snapshot.SnapshotStore 测试: 去重、恢复、排序和清理"""
+
+import os
+import time
+
+import pytest
+
+from snapshot import SnapshotStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "store"))
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "config"
+    (root / "app").mkdir(parents=True)
+    (root / "app" / "a.conf").write_text("a = 1\n")
+    (root / "app" / "copy.conf").write_text("a = 1\n")
+    (root / "b.conf").write_text("b = 2\n")
+    os.symlink("app/a.conf", root / "link.conf")
+    return root
+
+
+def backdate(store, name, days):
+    """把快照的创建时间改到 days 天前"""
+    manifest = store.load(name)
+    manifest['created'] = time.time() - days * 86400
+    store.save(name, manifest)
+
+
+def test_backup_dedup_and_restore(store, source, tmp_path):
+    first = store.backup(str(source))
+    assert (first.files, first.stored) == (4, 2)
+
+    second = store.backup(str(source))
+    assert (second.hashed, second.stored) == (0, 0)
+    assert first.name != second.name
+
+    target = tmp_path / "restored"
+    report = store.restore(second.name, str(target))
+    assert not report.failed
+    assert (target / "app" / "copy.conf").read_text() == "a = 1\n"
+    assert os.readlink(target / "link.conf") == "app/a.conf"
+
+
+def test_order_by_created(store, source):
+    names = [store.backup(str(source)).name for _ in range(12)]
+    # 同一秒内的快照: 按字符串排序时 -10、-11 会排在 -2 之前
+    assert store.names() == names
+    assert store.resolve("latest") == names[-1]
+
+
+def test_prune_keeps_newest_per_source(store, source, tmp_path):
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "c.conf").write_text("c = 3\n")
+
+    old_other = store.backup(str(other)).name
+    old_source = store.backup(str(source)).name
+    new_source = store.backup(str(source)).name
+    for name in (old_other, old_source, new_source):
+        backdate(store, name, 30)
+
+    removed, _ = store.prune(days=7, keep=1, grace=0)
+    assert removed == 1
+    # other 只有一个快照，即使很旧也保留
+    assert set(store.names()) == {old_other, new_source}
+    assert store.restore(old_other, str(tmp_path / "check")).failed == []
+
+
+def test_prune_frees_unreferenced_objects(store, source):
+    name = store.backup(str(source)).name
+    (source / "b.conf").write_text("b = 3\n")
+    store.backup(str(source))
+    backdate(store, name, 30)
+
+    # 宽限期内的无引用对象不清理
+    assert store.prune(days=7, grace=3600) == (1, 0)
+    assert store.prune(days=7, grace=0) == (0, len("b = 2\n"))
+
+
+def test_prune_keeps_recent_incoming_files(store, source):
+    store.backup(str(source))
+    recent = os.path.join(store.objects_dir, ".incoming-1-1")
+    stale = os.path.join(store.objects_dir, ".incoming-2-2")
+    for path in (recent, stale):
+        with open(path, 'w') as f:
+            f.write("partial")
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+    store.prune(days=7)
+    assert os.path.exists(recent)
+    assert not os.path.exists(stale)
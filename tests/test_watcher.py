@@ -0,0 +1,110 @@
+"""watcher.ConfigWatcher 测试: 真实 inotify 事件到增量同步"""
+
+import errno
+import os
+
+import pytest
+
+import deploy
+import watcher
+from watcher import IN_ISDIR, IN_MOVED_FROM, IN_Q_OVERFLOW, ConfigWatcher
+
+
+@pytest.fixture
+def watch(tmp_path, monkeypatch):
+    """监视 src -> dst，清单放在临时目录；返回 (watcher, 源目录, 目标目录)"""
+    source = tmp_path / "src"
+    (source / "app").mkdir(parents=True)
+    (source / "app" / "a.conf").write_text("a\n")
+    monkeypatch.setattr(watcher, "DeployEngine", lambda source, target: deploy.DeployEngine(
+        source, target, manifest_dir=str(tmp_path / "cache")))
+
+    config_watcher = ConfigWatcher([(str(source), str(tmp_path / "dst"))])
+    engine = config_watcher.engines[0]
+    engine.index = deploy.SourceIndex(engine.source, cache_dir=str(tmp_path / "cache"))
+    engine.deploy()
+    config_watcher.start()
+    yield config_watcher, source, tmp_path / "dst"
+    config_watcher.inotify.close()
+
+
+def batch(config_watcher):
+    """等待并同步一批事件，返回待同步的相对路径"""
+    first, dirty, complete = config_watcher.wait_batch()
+    config_watcher.sync(first, dirty, complete)
+    return sorted(next(iter(dirty.values()), set())), complete
+
+
+def test_write_syncs_only_changed_file(watch):
+    config_watcher, source, target = watch
+    (source / "app" / "a.conf").write_text("changed\n")
+    assert batch(config_watcher) == (["app/a.conf"], True)
+    assert (target / "app" / "a.conf").read_text() == "changed\n"
+
+
+def test_editor_temp_files_ignored(watch):
+    config_watcher, source, target = watch
+    (source / "app" / ".a.conf.swp").write_text("swap")
+    (source / "app" / "a.conf").write_text("saved\n")
+    assert batch(config_watcher) == (["app/a.conf"], True)
+    assert not (target / "app" / ".a.conf.swp").exists()
+
+
+def test_new_directory_is_watched(watch):
+    config_watcher, source, target = watch
+    (source / "new").mkdir()
+    batch(config_watcher)
+    (source / "new" / "b.conf").write_text("b\n")
+    assert batch(config_watcher) == (["new/b.conf"], True)
+    assert (target / "new" / "b.conf").read_text() == "b\n"
+
+
+def test_moved_directory_uses_new_path(watch):
+    config_watcher, source, target = watch
+    os.rename(source / "app", source / "renamed")
+    batch(config_watcher)
+    assert not (target / "app").exists()
+    assert (target / "renamed" / "a.conf").read_text() == "a\n"
+
+    # 旧路径的监视已移除，之后的事件按新路径同步
+    assert not any(path.startswith(str(source / "app"))
+                   for path in config_watcher.inotify.paths.values())
+    (source / "renamed" / "c.conf").write_text("c\n")
+    assert batch(config_watcher) == (["renamed/c.conf"], True)
+    assert not (target / "app").exists()
+
+
+def test_directory_moved_out_is_unwatched(watch, tmp_path):
+    config_watcher, source, target = watch
+    os.rename(source / "app", tmp_path / "outside")
+    batch(config_watcher)
+    assert not (target / "app").exists()
+    assert list(config_watcher.inotify.paths.values()) == [str(source)]
+
+
+def test_watch_limit_falls_back_to_full_sync(watch, monkeypatch):
+    config_watcher, source, _ = watch
+
+    def add_tree(path):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+
+    monkeypatch.setattr(config_watcher.inotify, "add_tree", add_tree)
+    dirty = {}
+    assert not config_watcher.collect([(str(source), IN_ISDIR | watcher.IN_CREATE, "new")], dirty)
+
+
+def test_overflow_requests_full_sync(watch):
+    config_watcher, source, target = watch
+    assert not config_watcher.collect([(None, IN_Q_OVERFLOW, "")], {})
+
+    (source / "app" / "a.conf").write_text("full\n")
+    config_watcher.sync(0, {}, False)
+    assert (target / "app" / "a.conf").read_text() == "full\n"
+
+
+def test_moved_from_directory_is_marked_dirty(watch):
+    config_watcher, source, _ = watch
+    dirty = {}
+    assert config_watcher.collect([(str(source), IN_ISDIR | IN_MOVED_FROM, "app")], dirty)
+    assert dirty == {config_watcher.engines[0]: {"app"}}
+    assert list(config_watcher.inotify.paths.values()) == [str(source)]
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+配置监视模块
+通过 inotify (ctypes 调用 libc，无需额外依赖) 监视源目录，保存后只同步变化的路径。
+
+一批事件在安静 debounce 毫秒后 (最多等待 max_delay 毫秒) 统一处理，
+编辑器的交换文件、备份文件等临时文件被忽略；同步后可按目录触发重载命令
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import fnmatch
+import ctypes
+import ctypes.util
+import subprocess
+
+from log import info, success, warning, error
+from deploy import DeployEngine
+from pkg_plan import format_size
+
+# linux/inotify.h
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# 编辑器和工具产生的临时文件
+IGNORE_PATTERNS = [
+    "*.swp", "*.swo", "*.swx", "*~", ".#*", "#*#", "4913", "*.tmp",
+    "*.kate-swp", ".goutputstream-*", "*.part", "sed??????",
+    ".*.deploy-tmp", ".*.link-tmp",
+]
+
+# 源目录下第一级目录变化后执行的重载命令
+RELOAD_HOOKS = {
+    "hypr": "hyprctl reload",
+    "waybar": "pkill -SIGUSR2 waybar",
+    "kitty": "pkill -SIGUSR1 kitty",
+    "dunst": "dunstctl reload",
+    "fcitx5": "fcitx5-remote -r",
+    "swaync": "swaync-client -R",
+}
+
+
+def ignored(name):
+    """是否为编辑器临时文件"""
+    return any(fnmatch.fnmatch(name, pattern) for pattern in IGNORE_PATTERNS)
+
+
+class Inotify:
+    """inotify 的最小封装"""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self.paths = {}
+
+    def add_watch(self, path):
+        """监视一个目录，返回 watch 描述符"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        self.paths[wd] = path
+        return wd
+
+    def add_tree(self, root):
+        """监视目录及其全部子目录 (不跟随符号链接)"""
+        count = 0
+        for current, dirs, _ in os.walk(root):
+            dirs[:] = [name for name in dirs if not os.path.islink(os.path.join(current, name))]
+            try:
+                self.add_watch(current)
+                count += 1
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+        return count
+
+    def remove_tree(self, root):
+        """移除目录及其子目录的监视 (目录被移走后旧路径不再有效)"""
+        for wd, path in list(self.paths.items()):
+            if path == root or path.startswith(root + os.sep):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.paths[wd]
+
+    def read(self):
+        """读取当前全部事件，返回 [(目录, 掩码, 文件名)]"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+                offset += length
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                events.append((self.paths.get(wd), mask, name))
+
+    def close(self):
+        """关闭 inotify 描述符"""
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    """监视多个 (源目录, 目标目录)，只同步变化的路径"""
+
+    def __init__(self, pairs, reload=False, debounce=0.03, max_delay=0.08):
+        self.engines = [DeployEngine(source, target) for source, target in pairs]
+        self.reload = reload
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.inotify = Inotify()
+        self.hooks = []
+
+    def start(self):
+        """读取清单并建立监视"""
+        for engine in self.engines:
+            engine.load_manifest()
+            count = self.inotify.add_tree(engine.source)
+            info(f"监视 {engine.source} -> {engine.target} ({count} 个目录)")
+
+    def owner(self, path):
+        """路径所属的部署引擎和相对路径"""
+        for engine in self.engines:
+            if path == engine.source or path.startswith(engine.source + os.sep):
+                return engine, os.path.relpath(path, engine.source)
+        return None, None
+
+    def collect(self, events, dirty):
+        """把事件转换为待同步的路径；返回 False 表示事件不完整 (队列溢出或监视数达到上限)，
+        需要全量同步"""
+        for directory, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                return False
+            if directory is None or (name and ignored(name)):
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                # 移走的目录: 旧的监视会继续以旧路径报告事件，先移除，移入的位置另行监视
+                self.inotify.remove_tree(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # 新目录 (含移入的目录树) 也需要监视
+                try:
+                    self.inotify.add_tree(path)
+                except OSError as e:
+                    if e.errno != errno.ENOSPC:
+                        raise
+                    warning("inotify 监视数达到上限 (fs.inotify.max_user_watches)，新目录未被监视")
+                    return False
+            elif mask & IN_CREATE and not os.path.islink(path):
+                # 普通文件等 IN_CLOSE_WRITE 再同步，避免复制写了一半的文件
+                continue
+            engine, relpath = self.owner(path)
+            if engine is not None and relpath != ".":
+                dirty.setdefault(engine, set()).add(relpath)
+        return True
+
+    def wait_batch(self):
+        """等待一批事件: 第一个事件后安静 debounce 秒或累计 max_delay 秒为止"""
+        select.select([self.inotify.fd], [], [])
+        first = time.monotonic()
+        dirty = {}
+        complete = self.collect(self.inotify.read(), dirty)
+
+        while True:
+            remaining = min(self.debounce, first + self.max_delay - time.monotonic())
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([self.inotify.fd], [], [], remaining)
+            if not readable:
+                break
+            complete = self.collect(self.inotify.read(), dirty) and complete
+        return first, dirty, complete
+
+    def run_hooks(self, engine, relpaths):
+        """执行变化目录对应的重载命令 (不等待其结束)"""
+        self.hooks = [process for process in self.hooks if process.poll() is None]
+        if not self.reload:
+            return
+        for top in sorted({relpath.split(os.sep)[0] for relpath in relpaths}):
+            command = RELOAD_HOOKS.get(top)
+            if command:
+                self.hooks.append(subprocess.Popen(
+                    command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    start_new_session=True
+                ))
+                info(f"重载 {top}: {command}")
+
+    def sync(self, first, dirty, complete):
+        """同步一批变化并输出结果"""
+        for engine in self.engines:
+            if not complete:
+                warning("inotify 事件不完整，执行全量同步")
+                engine.index = None
+                report = engine.deploy()
+                relpaths = set(engine.manifest)
+            elif engine in dirty:
+                relpaths = dirty[engine]
+                report = engine.sync_paths(relpaths)
+            else:
+                continue
+
+            latency = (time.monotonic() - first) * 1000
+            for relpath, message in report.failed:
+                error(f"{relpath}: {message}")
+            for relpath in report.kept:
+                warning(f"目标已被修改，保留: {relpath}")
+            if report.copied or report.removed:
+                changed = ", ".join(sorted(relpaths)[:3]) + (" ..." if len(relpaths) > 3 else "")
+                success(f"{changed} -> 复制 {report.copied}，删除 {report.removed}，"
+                        f"写入 {format_size(report.bytes_written)}，{latency:.0f} ms")
+                self.run_hooks(engine, relpaths)
+
+    def run(self):
+        """持续监视，Ctrl+C 结束"""
+        self.start()
+        info("等待文件变化 (Ctrl+C 结束)")
+        try:
+            while True:
+                self.sync(*self.wait_batch())
+        except KeyboardInterrupt:
+            info("停止监视")
+        finally:
+            self.inotify.close()